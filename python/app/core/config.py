@@ -1,52 +1,101 @@
 import os
 import yaml
-import re
 import base64
 import hashlib
 import requests
-from Crypto.Cipher import DES
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, modes
+    try:  # pragma: no cover - only reached when cryptography is installed
+        from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+    except ImportError:  # pragma: no cover - cryptography < 43
+        from cryptography.hazmat.primitives.ciphers.algorithms import TripleDES
+except ImportError:  # pragma: no cover - PyCryptodome fallback below
+    Cipher = None
+
+try:
+    from yaml import CSafeLoader as _YamlLoader  # libyaml-backed parser
+except ImportError:  # pragma: no cover - PyYAML built without libyaml
+    from yaml import SafeLoader as _YamlLoader
+
+try:
+    from Crypto.Cipher import DES
+except ImportError:  # pragma: no cover - only needed without cryptography
+    DES = None
 
 # ============================================================================
 # JASYPT DECRYPTION
 # ============================================================================
 
+@lru_cache(maxsize=64)
+def _derive_key_iv(password_bytes: bytes, salt: bytes):
+    """PBEWithMD5AndDES key derivation (1000 MD5 rounds), memoized per (password, salt)"""
+    key_material = password_bytes + salt
+    for _ in range(1000):
+        key_material = hashlib.md5(key_material, usedforsecurity=False).digest()
+    return key_material[:8], key_material[8:16]
+
+def _des_cbc_decrypt(key: bytes, iv: bytes, ciphertext: bytes) -> bytes:
+    """Single-DES CBC decrypt (no unpadding); OpenSSL via cryptography when installed"""
+    if Cipher is not None:  # pragma: no cover - only reached when cryptography is installed
+        # 3DES with K1 = K2 = K3 is single DES; cryptography does not expose plain DES
+        decryptor = Cipher(TripleDES(key * 3), modes.CBC(iv)).decryptor()
+        return decryptor.update(ciphertext) + decryptor.finalize()
+    return DES.new(key, DES.MODE_CBC, iv).decrypt(ciphertext)
+
 def jasypt_decrypt(encrypted_value: str, password: str) -> str:
     """Decrypt Jasypt PBEWithMD5AndDES encrypted value"""
     encrypted_bytes = base64.b64decode(encrypted_value)
     salt = encrypted_bytes[:8]
     ciphertext = encrypted_bytes[8:]
     
-    password_bytes = password.encode('utf-8')
-    key_material = password_bytes + salt
-    
-    for _ in range(1000):
-        key_material = hashlib.md5(key_material).digest()
-    
-    key = key_material[:8]
-    iv = key_material[8:16]
+    key, iv = _derive_key_iv(password.encode('utf-8'), salt)
     
-    cipher = DES.new(key, DES.MODE_CBC, iv)
-    decrypted = cipher.decrypt(ciphertext)
+    decrypted = _des_cbc_decrypt(key, iv, ciphertext)
     
     pad_len = decrypted[-1]
     if isinstance(pad_len, int) and 1 <= pad_len <= 8:
         return decrypted[:-pad_len].decode('utf-8')
     return decrypted.decode('utf-8')
 
+_ENC_PREFIX = 'ENC('
+_ENC_SUFFIX = ')'
+_ENC_MIN_LEN = len(_ENC_PREFIX) + len(_ENC_SUFFIX)  # "ENC()" has nothing to decrypt
+
 def decrypt_config_value(value, password: str):
     """Decrypt value if it's ENC() wrapped, otherwise return as-is"""
-    if isinstance(value, str):
-        match = re.match(r'^ENC\((.+)\)$', value)
-        if match:
-            return jasypt_decrypt(match.group(1), password)
+    # Plain string checks instead of a regex: most config values are not encrypted
+    if isinstance(value, str) and len(value) > _ENC_MIN_LEN and value.startswith(_ENC_PREFIX) and value.endswith(_ENC_SUFFIX):
+        return jasypt_decrypt(value[len(_ENC_PREFIX):-len(_ENC_SUFFIX)], password)
     return value
 
+# ============================================================================
+# CONFIG LOADING
+# ============================================================================
+
+JAVA_SETTINGS_URL = 'http://localhost:16350/api/shioaji/settings'
+
+# Runs the Java settings request while application.yml is read and decrypted
+_IO_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="config-io")
+
+def _load_yaml(stream):
+    """yaml.safe_load semantics, parsed by libyaml when available"""
+    return yaml.load(stream, Loader=_YamlLoader)
+
+def _fetch_java_settings():
+    return requests.get(JAVA_SETTINGS_URL, timeout=5)
+
 def load_config_with_decryption(password: str):
     """Load application.yml and decrypt ENC() values, and fetch dynamic settings from Java"""
     # Assuming this is run from python/ directory or similar, adjust path as needed
     # The original code used __file__ relative path.
     # We will assume the app is run from the 'python' directory or we can find the project root.
     
+    # Issue the Java request first so its latency overlaps the disk reads and decryption below
+    java_settings_future = _IO_POOL.submit(_fetch_java_settings)
+    
     # Try to find project root
     current_dir = os.getcwd()
     project_root = None
@@ -68,7 +117,7 @@ def load_config_with_decryption(password: str):
     config_path = os.path.join(project_root, 'src/main/resources/application.yml')
     
     with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
+        config = _load_yaml(f)
     
     if 'shioaji' in config:
         # Decrypt common fields
@@ -97,7 +146,7 @@ def load_config_with_decryption(password: str):
         
         # Fetch dynamic simulation setting from Java
         try:
-            response = requests.get('http://localhost:16350/api/shioaji/settings', timeout=5)
+            response = java_settings_future.result()
             if response.status_code == 200:
                 java_settings = response.json()
                 config['shioaji']['simulation'] = java_settings.get('simulation', True)
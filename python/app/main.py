@@ -1,8 +1,11 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.exceptions import RequestValidationError
+import asyncio
+import importlib.util
 import json
 from contextlib import asynccontextmanager
+from dataclasses import asdict
 import sys
 import os
 import threading
@@ -10,14 +13,15 @@ import time
 import argparse
 from datetime import datetime
 from pydantic import BaseModel
-import feedparser
+import aiohttp
+from lxml import etree
 import yfinance as yf
 
 # Add parent directory to path to allow imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.core.config import load_config_with_decryption
-from app.services.shioaji_service import ShioajiWrapper, latest_tick, streaming_quotes, streaming_quotes_lock, order_book, order_book_lock
+from app.services.shioaji_service import ShioajiWrapper, latest_tick, streaming_quotes, order_book, order_book_lock, order_book_levels
 from app.services.ollama_service import OllamaService
 from app.services.ai_insights_service import AIInsightsService
 from app.services.earnings_service import scrape_earnings_dates
@@ -61,6 +65,7 @@ from app.services.quarterly_report_summary_service import (
     QuarterlyReportSummaryRequest,
     QuarterlyReportSummaryResponse,
     QuarterlyReportSummaryError,
+    shutdown_pdf_pool,
     summarize_quarterly_report,
 )
 from app.strategies.legacy_strategy import get_signal_legacy, notify_exit_order
@@ -76,6 +81,16 @@ ai_insights_service = None
 # News cache to avoid hammering Ollama
 news_cache = {"result": None, "timestamp": None, "ttl_seconds": 300}  # 5 minute cache
 
+# RSS feeds scanned for the news veto (MoneyDJ + UDN)
+NEWS_FEEDS = (
+    "https://www.moneydj.com/rss/RssNews.djhtm",
+    "https://udn.com/rssfeed/news/2/6638",
+)
+NEWS_FETCH_TIMEOUT_SECONDS = 3  # per attempt
+NEWS_FETCH_RETRIES = 1
+# Tolerant of malformed feeds; never fetches DTDs or expands external entities
+_RSS_PARSER = etree.XMLParser(recover=True, resolve_entities=False, no_network=True)
+
 # Lifespan event handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -91,8 +106,15 @@ async def lifespan(app: FastAPI):
     # Shutdown
     if shioaji:
         shioaji.logout()
+    shutdown_pdf_pool()
+
+try:
+    import orjson  # noqa: F401 - ORJSONResponse needs it at render time
+    _DefaultResponse = ORJSONResponse
+except ImportError:  # pragma: no cover - stdlib JSON fallback
+    _DefaultResponse = JSONResponse
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=_DefaultResponse)
 
 def init_trading_mode():
     """Initialize Shioaji and config"""
@@ -179,25 +201,55 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 # ENDPOINTS
 # ============================================================================
 
-def fetch_news_headlines():
-    """Scrape MoneyDJ + UDN RSS feeds - optimized for speed"""
-    feeds = [
-        "https://www.moneydj.com/rss/RssNews.djhtm",
-        "https://udn.com/rssfeed/news/2/6638"
-    ]
+async def _afetch_feed(session: aiohttp.ClientSession, url: str) -> bytes:
+    """GET one feed with a bounded timeout, retrying transient failures NEWS_FETCH_RETRIES times"""
+    timeout = aiohttp.ClientTimeout(total=NEWS_FETCH_TIMEOUT_SECONDS)
+    for attempt in range(NEWS_FETCH_RETRIES + 1):
+        try:
+            async with session.get(url, timeout=timeout) as response:
+                response.raise_for_status()
+                return await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == NEWS_FETCH_RETRIES:
+                raise
+
+
+def _feed_titles(content: bytes, limit: int = 3) -> list:
+    """First `limit` item titles of an RSS document, read with one XPath instead of a full feed parse"""
+    root = etree.fromstring(content, _RSS_PARSER)
+    if root is None:
+        return []
+    titles = (title.strip() for title in root.xpath("//item/title/text()"))
+    return [title for title in titles if title][:limit]
+
+
+async def _afetch_news_headlines() -> list:
+    async with aiohttp.ClientSession() as session:
+        contents = await asyncio.gather(
+            *(_afetch_feed(session, url) for url in NEWS_FEEDS), return_exceptions=True
+        )
     headlines = []
-    for feed_url in feeds:
+    for url, content in zip(NEWS_FEEDS, contents):
+        if isinstance(content, BaseException):
+            # One unreachable feed must not drop the other
+            print(f"⚠️ News feed {url} failed: {content!r}")
+            continue
         try:
-            # Add timeout to prevent hanging
-            feed = feedparser.parse(feed_url, timeout=5)
-            for entry in feed.entries[:3]:  # Reduced from 5 to 3 per feed
-                headlines.append(entry.title)
-        except:
-            pass
+            headlines.extend(_feed_titles(content))  # Reduced from 5 to 3 per feed
+        except etree.LxmlError as e:
+            print(f"⚠️ News feed {url} unparseable: {e}")
     return headlines[:8]  # Reduced from 15 to 8 total headlines
 
+
+def fetch_news_headlines():
+    """Scrape MoneyDJ + UDN RSS feeds concurrently; wall time is the slower feed, not the sum"""
+    return asyncio.run(_afetch_news_headlines())
+
+# Pure-CPU handlers are `async def` so they run on the event loop instead of taking a
+# threadpool slot; blocking broker calls are handed to the default executor explicitly.
+
 @app.get("/health")
-def health():
+async def health():
     return {
         "status": "ok",
         "shioaji_connected": shioaji.connected if shioaji else False,
@@ -227,9 +279,9 @@ def set_trading_mode(request: Request, mode_data: dict):
         return JSONResponse(status_code=500, content={"status": "error", "error": "Failed to connect in new mode", "mode": new_mode})
 
 @app.get("/account")
-def get_account():
+async def get_account():
     try:
-        account_info = shioaji.get_account_info()
+        account_info = await asyncio.get_running_loop().run_in_executor(None, shioaji.get_account_info)
         return {
             "equity": account_info.get("equity", 0),
             "available_margin": account_info.get("available_margin", 0),
@@ -240,9 +292,9 @@ def get_account():
         return {"equity": 0, "available_margin": 0, "status": "error", "error": str(e), "timestamp": datetime.now().isoformat()}
 
 @app.get("/account/profit-history")
-def get_profit_history(days: int = 30):
+async def get_profit_history(days: int = 30):
     try:
-        pnl_history = shioaji.get_profit_loss_history(days)
+        pnl_history = await asyncio.get_running_loop().run_in_executor(None, shioaji.get_profit_loss_history, days)
         return {
             "total_pnl": pnl_history.get("total_pnl", 0),
             "days": days,
@@ -265,8 +317,9 @@ def shutdown():
     return {"status": "shutting_down", "message": "Python bridge shutting down gracefully"}
 
 @app.get("/signal")
-def get_signal():
-    return get_signal_legacy()
+async def get_signal():
+    # The signal dict is already JSON-native; render it directly and skip jsonable_encoder
+    return _DefaultResponse(get_signal_legacy())
 
 @app.get("/signal/news")
 def get_news_veto():
@@ -443,13 +496,13 @@ def download_financial_quarterly_report_endpoint(request: QuarterlyReportRequest
 @app.post("/reports/financial/quarterly/summary", response_model=QuarterlyReportSummaryResponse)
 def summarize_financial_quarterly_report_endpoint(request: QuarterlyReportSummaryRequest):
     try:
-        return summarize_quarterly_report(
+        return asdict(summarize_quarterly_report(
             ticker=request.ticker,
             report_year=request.report_year,
             report_quarter=request.report_quarter,
             report_type=request.report_type,
             force=request.force,
-        )
+        ))
     except (QuarterlyReportDownloadError, QuarterlyReportSummaryError) as exc:
         raise HTTPException(status_code=exc.status_code, detail=exc.message)
 
@@ -457,8 +510,7 @@ def summarize_financial_quarterly_report_endpoint(request: QuarterlyReportSummar
 def get_streaming_quotes(limit: int = 50):
     try:
         limit = min(limit, 100)
-        with streaming_quotes_lock:
-            quotes_list = list(streaming_quotes)[-limit:]
+        quotes_list = [quote.as_dict() for quote in streaming_quotes.snapshot(limit)]
         
         return {
             "status": "ok",
@@ -487,8 +539,8 @@ def get_order_book(symbol: str):
         return {
             "status": "ok",
             "symbol": symbol,
-            "bids": current_book.get("bids", []),
-            "asks": current_book.get("asks", []),
+            "bids": order_book_levels(current_book["bid_px"], current_book["bid_vol"]),
+            "asks": order_book_levels(current_book["ask_px"], current_book["ask_vol"]),
             "last_update": current_book.get("timestamp"),
             "trading_mode": TRADING_MODE or "unknown",
             "timestamp": datetime.now().isoformat()
@@ -1588,7 +1640,18 @@ def get_calendar_summary(days: int = 30):
         )
 
 
+def uvicorn_options() -> dict:
+    """
+    Pin uvicorn to uvloop + httptools (installed by uvicorn[standard]) instead of relying on
+    its auto-detection; fall back to the pure-Python asyncio/h11 stack where the wheels are missing.
+    """
+    return {
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     print("🐍 Python bridge starting on port 8888...")
-    uvicorn.run(app, host="0.0.0.0", port=8888, log_level="info")
+    uvicorn.run(app, host="0.0.0.0", port=8888, log_level="info", **uvicorn_options())
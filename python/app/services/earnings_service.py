@@ -1,9 +1,39 @@
 import os
+import asyncio
 import json
-import time
+from bisect import bisect_left
 from datetime import datetime, timedelta
 import yfinance as yf
-from app.services.telegram_service import send_telegram_message
+from app.services.telegram_worker import send_telegram_message_nowait
+
+try:
+    import orjson
+
+    def _dump_json_bytes(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:  # pragma: no cover - stdlib fallback
+    def _dump_json_bytes(obj) -> bytes:
+        return json.dumps(obj, indent=2).encode('utf-8')
+
+# yfinance requests in flight at once, and the pause each one holds its slot for
+# afterwards so Yahoo's rate limiter (429s) never sees more than this burst
+SCRAPE_CONCURRENCY = 3
+SCRAPE_DELAY_SECONDS = 2
+
+
+async def _afetch_calendars(tickers):
+    """Fetch yfinance calendars concurrently; failed lookups come back as exceptions"""
+    semaphore = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+
+    async def fetch(ticker):
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(lambda: yf.Ticker(ticker).calendar)
+            finally:
+                await asyncio.sleep(SCRAPE_DELAY_SECONDS)
+
+    return await asyncio.gather(*(fetch(t) for t in tickers), return_exceptions=True)
+
 
 def scrape_earnings_dates(jasypt_password: str = None):
     """
@@ -19,7 +49,6 @@ def scrape_earnings_dates(jasypt_password: str = None):
     TICKERS = [
         'TSM',      # TSMC (ADR)
         '2454.TW',  # MediaTek (Taiwan)
-        '2454.TW',  # MediaTek
         '2317.TW',  # Hon Hai (Foxconn)
         'UMC',      # UMC (ADR)
         '2303.TW',  # UMC (Taiwan)
@@ -34,7 +63,7 @@ def scrape_earnings_dates(jasypt_password: str = None):
     
     print(f"📅 Scraping earnings dates for {len(TICKERS)} stocks (using yfinance)...")
     if jasypt_password:
-        send_telegram_message(f"📅 <b>Earnings Scraper Started</b>\nChecking {len(TICKERS)} tickers...", jasypt_password)
+        send_telegram_message_nowait(f"📅 <b>Earnings Scraper Started</b>\nChecking {len(TICKERS)} tickers...", jasypt_password)
     
     earnings_dates = set()
     today = datetime.now().date()
@@ -42,10 +71,12 @@ def scrape_earnings_dates(jasypt_password: str = None):
     
     new_dates_found = []
     
-    for ticker in TICKERS:
+    calendars = asyncio.run(_afetch_calendars(TICKERS))
+    
+    for ticker, calendar in zip(TICKERS, calendars):
         try:
-            stock = yf.Ticker(ticker)
-            calendar = stock.calendar
+            if isinstance(calendar, BaseException):
+                raise calendar
             
             if calendar is None or 'Earnings Date' not in calendar:
                 print(f"  ⚠️ {ticker}: No earnings date available")
@@ -64,9 +95,6 @@ def scrape_earnings_dates(jasypt_password: str = None):
                     new_dates_found.append(f"{ticker}: {date_str}")
                     print(f"  ✅ {ticker}: {date_str}")
             
-            # Rate limit: 15 seconds between requests to avoid 429 errors
-            time.sleep(5)
-            
         except Exception as e:
             print(f"  ❌ {ticker}: {e}")
             continue
@@ -82,10 +110,10 @@ def scrape_earnings_dates(jasypt_password: str = None):
             pass
     
     # Merge new dates with existing (never lose data)
-    all_dates = earnings_dates.union(existing_dates)
+    all_dates = sorted(earnings_dates | existing_dates)
     
-    # Filter to only future dates
-    future_dates = sorted([d for d in all_dates if d >= today.isoformat()])
+    # Filter to only future dates: ISO strings sort chronologically, so slice past today
+    future_dates = all_dates[bisect_left(all_dates, today.isoformat()):]
     
     # Save to JSON
     os.makedirs(config_dir, exist_ok=True)
@@ -96,8 +124,8 @@ def scrape_earnings_dates(jasypt_password: str = None):
         "dates": future_dates
     }
     
-    with open(output_file, 'w') as f:
-        json.dump(result, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(_dump_json_bytes(result))
     
     print(f"\n✅ Saved {len(future_dates)} blackout dates to {output_file}")
     print(f"   Next dates: {future_dates[:5]}...")
@@ -110,6 +138,6 @@ def scrape_earnings_dates(jasypt_password: str = None):
                 msg += f"\n...and {len(new_dates_found)-5} more"
         else:
             msg += "No new dates found."
-        send_telegram_message(msg, jasypt_password)
+        send_telegram_message_nowait(msg, jasypt_password)
     
     return future_dates
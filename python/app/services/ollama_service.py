@@ -1,7 +1,31 @@
 import requests
+from requests.adapters import HTTPAdapter
+import copy
 import json
 import re
-from typing import Dict, List, Optional
+import string
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover - stdlib fallback
+    _json_loads = json.loads
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - numba is an optional speedup
+    njit = None
+
+_NUMBA_AVAILABLE = njit is not None
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - regex alternation is used instead
+    ahocorasick = None
 
 # Weight constants for risk scoring
 DRAWDOWN_WEIGHT = 0.30
@@ -10,6 +34,12 @@ VOLATILITY_WEIGHT = 0.20
 STREAK_WEIGHT = 0.15
 SIZE_WEIGHT = 0.15
 
+# Same weights as a vector, ordered drawdown/news/volatility/streak/size, for batch scoring
+_RISK_WEIGHTS = np.array(
+    [DRAWDOWN_WEIGHT, NEWS_WEIGHT, VOLATILITY_WEIGHT, STREAK_WEIGHT, SIZE_WEIGHT],
+    dtype=np.float64,
+)
+
 # Thresholds
 DEFAULT_VETO_THRESHOLD = 70.0
 HIGH_CONVICTION_THRESHOLD = 80.0  # For signals with >0.9 confidence
@@ -22,6 +52,11 @@ MAX_TRADES_PER_DAY = 5
 MAX_SHARES = 200  # Relaxed from 100 shares
 LOSS_STREAK_DANGER = 3
 
+# LLM risk scores for an identical proposal fingerprint are reused for this long
+VETO_CACHE_TTL_SECONDS = 60.0
+# P&L values within the same bucket share a cache entry; the LLM does not react to 100 TWD
+PNL_CACHE_BUCKET_TWD = 100.0
+
 # Negative news keywords (Chinese and English)
 NEGATIVE_NEWS_KEYWORDS = [
     '下跌', '利空', '衰退', '地緣', '貿易戰', '地震', '颱風', '調查', '違規', '警告', '降評',
@@ -29,6 +64,29 @@ NEGATIVE_NEWS_KEYWORDS = [
     'tension', 'hawkish', 'miss', 'investigation', 'fraud'
 ]
 
+# Single alternation so each headline is scanned once instead of once per keyword
+NEGATIVE_NEWS_RE = re.compile("|".join(map(re.escape, NEGATIVE_NEWS_KEYWORDS)), re.IGNORECASE)
+
+
+def _build_negative_news_automaton():
+    """Aho-Corasick automaton over the lower-cased keywords: O(len(headline)) regardless of keyword count"""
+    if ahocorasick is None:  # pragma: no cover
+        return None
+    automaton = ahocorasick.Automaton()
+    for keyword in NEGATIVE_NEWS_KEYWORDS:
+        automaton.add_word(keyword.lower(), keyword)
+    automaton.make_automaton()
+    return automaton
+
+
+_NEGATIVE_NEWS_AC = _build_negative_news_automaton()
+
+
+def _has_negative_keyword(headline: str) -> bool:
+    if _NEGATIVE_NEWS_AC is None:
+        return NEGATIVE_NEWS_RE.search(headline) is not None
+    return next(_NEGATIVE_NEWS_AC.iter(headline.lower()), None) is not None
+
 # Centralized risk-aware system prompt for trade veto decisions
 # Changed from binary APPROVE/VETO to calibrated risk scoring
 TRADE_VETO_SYSTEM_PROMPT = """You are a professional risk manager for a Taiwan stock trading system. 
@@ -63,6 +121,68 @@ Examples:
 {"drawdown_risk": 20, "news_risk": 0, "volatility_risk": 30, "streak_risk": 10, "size_risk": 15, "total_score": 18.5, "recommendation": "APPROVE", "reason": "Low risk across all factors"}
 {"drawdown_risk": 80, "news_risk": 75, "volatility_risk": 60, "streak_risk": 70, "size_risk": 40, "total_score": 68.5, "recommendation": "VETO", "reason": "High drawdown and negative news"}"""
 
+# Trade proposal prompt shared by call_trade_veto and call_trade_risk_score.
+# Compiled once; each call only fills a dict and substitutes.
+_TRADE_PROMPT_TMPL = string.Template("""Trade Proposal:
+- Symbol: $symbol
+- Direction: $direction
+- Shares: $shares
+- Entry Logic: $entry_logic
+- Strategy: $strategy_name
+- Signal Confidence: $signal_confidence
+
+System State:
+- Daily P&L: $daily_pnl TWD
+- Weekly P&L: $weekly_pnl TWD
+- Current Drawdown: $drawdown_percent%
+- Trades Today: $trades_today
+- Win Streak: $win_streak
+- Loss Streak: $loss_streak
+
+Market Context:
+- Volatility: $volatility_level
+- Time: $time_of_day
+- Session Phase: $session_phase
+
+News Headlines:
+$news_block
+
+Strategy Context:
+- Days Active: $strategy_days_active
+- Recent Backtest Stats: $recent_backtest_stats""")
+
+_RISK_SCORE_PROMPT_TMPL = string.Template(
+    _TRADE_PROMPT_TMPL.template + "\n\nProvide risk assessment as JSON with scores 0-100 for each factor."
+)
+
+_PROMPT_DEFAULTS = {
+    field: 'N/A' for field in (
+        'symbol', 'direction', 'shares', 'entry_logic', 'strategy_name', 'signal_confidence',
+        'daily_pnl', 'weekly_pnl', 'drawdown_percent', 'trades_today', 'win_streak', 'loss_streak',
+        'volatility_level', 'time_of_day', 'session_phase',
+        'strategy_days_active', 'recent_backtest_stats',
+    )
+}
+
+
+# (round digits, step) applied to numeric prompt fields before they enter the cache key
+_FINGERPRINT_BUCKETS = {
+    'drawdown_percent': (1, 1.0),
+    'signal_confidence': (2, 1.0),
+    'daily_pnl': (0, PNL_CACHE_BUCKET_TWD),
+    'weekly_pnl': (0, PNL_CACHE_BUCKET_TWD),
+}
+
+
+def _build_trade_prompt(trade_proposal: dict, template: string.Template = _TRADE_PROMPT_TMPL) -> str:
+    fields = dict(_PROMPT_DEFAULTS)
+    fields.update(trade_proposal)
+    if fields['signal_confidence'] is None:
+        fields['signal_confidence'] = 'N/A'
+    fields['news_block'] = "\n".join(f"- {h}" for h in trade_proposal.get('news_headlines', []))
+    return template.substitute(fields)
+
+
 # Legacy system prompt for backward compatibility
 LEGACY_VETO_SYSTEM_PROMPT = """You are an extremely paranoid, professional risk manager for a fully automated Taiwan stock trading system. Your ONLY goal is capital preservation.
 
@@ -79,48 +199,340 @@ Default to VETO. Only APPROVE if ALL conditions are clearly safe:
 Respond ONLY with: APPROVE or VETO: <short reason>"""
 
 
+# ============================================================================
+# LOCAL RISK-SCORING KERNEL
+# Scalar-only functions so they can be JIT-compiled by numba when available.
+# Strings and unparseable values are encoded in Python before the call:
+# volatility_level -> _VOLATILITY_CODES (-1 = unknown), bad ints/confidence -> NaN.
+# ============================================================================
+
+def _jit(fn):
+    return njit(cache=True)(fn) if _NUMBA_AVAILABLE else fn
+
+
+_VOLATILITY_CODES = {'low': 0, 'normal': 1, 'high': 2, 'extreme': 3, 'choppy': 3}
+
+
+@_jit
+def _drawdown_risk(drawdown):
+    if drawdown <= 0:
+        return 0.0
+    return min(100.0, (drawdown / DAILY_DRAWDOWN_DANGER) * 100)
+
+
+@_jit
+def _news_risk(negative_count):
+    return min(100.0, negative_count * 25.0)
+
+
+@_jit
+def _volatility_risk(vol_code):
+    if vol_code == 0:
+        return 0.0
+    if vol_code == 1:
+        return 20.0
+    if vol_code == 2:
+        return 60.0
+    if vol_code == 3:
+        return 100.0
+    return 30.0  # Unknown = moderate risk
+
+
+@_jit
+def _streak_risk(win_streak, loss_streak):
+    if win_streak != win_streak or loss_streak != loss_streak:
+        return 25.0
+    if loss_streak >= LOSS_STREAK_DANGER:
+        return 100.0
+    if loss_streak >= 2:
+        return 70.0
+    if loss_streak == 1:
+        return 40.0
+    if win_streak >= 3:
+        return 10.0
+    return 25.0
+
+
+@_jit
+def _size_risk(shares, trades_today):
+    if shares != shares or trades_today != trades_today:
+        return 25.0
+
+    if shares > MAX_SHARES:
+        size_score = 100.0
+    elif shares > 100:
+        size_score = ((shares - 100) / (MAX_SHARES - 100)) * 50 + 25
+    else:
+        size_score = (shares / 100) * 25
+
+    if trades_today >= MAX_TRADES_PER_DAY:
+        freq_score = 100.0
+    elif trades_today >= 3:
+        freq_score = 60.0
+    else:
+        freq_score = trades_today * 15.0
+
+    return (size_score + freq_score) / 2
+
+
+@_jit
+def _score_kernel(drawdown, vol_code, win_streak, loss_streak, shares, trades_today, neg_news_count, confidence):
+    """
+    Returns (drawdown, news, volatility, streak, size, raw_score,
+    adjusted_score, threshold, confidence_adjustment, veto).
+    A NaN confidence means "not provided".
+    """
+    drawdown_risk = _drawdown_risk(drawdown)
+    news_risk = _news_risk(neg_news_count)
+    volatility_risk = _volatility_risk(vol_code)
+    streak_risk = _streak_risk(win_streak, loss_streak)
+    size_risk = _size_risk(shares, trades_today)
+
+    total_score = (
+        drawdown_risk * DRAWDOWN_WEIGHT +
+        news_risk * NEWS_WEIGHT +
+        volatility_risk * VOLATILITY_WEIGHT +
+        streak_risk * STREAK_WEIGHT +
+        size_risk * SIZE_WEIGHT
+    )
+
+    threshold = DEFAULT_VETO_THRESHOLD
+    confidence_adjustment = 1.0
+    if confidence >= 0.9:
+        threshold = HIGH_CONVICTION_THRESHOLD
+        confidence_adjustment = 0.8
+    elif confidence < 0.5:
+        threshold = LOW_CONVICTION_THRESHOLD
+        confidence_adjustment = 1.2
+
+    adjusted_score = total_score * confidence_adjustment
+    return (drawdown_risk, news_risk, volatility_risk, streak_risk, size_risk,
+            total_score, adjusted_score, threshold, confidence_adjustment,
+            adjusted_score >= threshold)
+
+
+# (threshold, confidence_adjustment) per signal-confidence tier
+_CONFIDENCE_TIERS = {
+    'high': (HIGH_CONVICTION_THRESHOLD, 0.8),
+    'normal': (DEFAULT_VETO_THRESHOLD, 1.0),
+    'low': (LOW_CONVICTION_THRESHOLD, 1.2),
+}
+
+
+def make_specialized_scorer(tier: str):
+    """
+    Build a local scorer for a fixed confidence tier ('high', 'normal', 'low').
+    Threshold and adjustment are bound once, so the returned
+    scorer(components) -> (adjusted_score, veto) does no lookups or
+    confidence branching per call. components is the
+    (drawdown, news, volatility, streak, size) risk tuple. The score is
+    computed in the same order as _score_kernel so veto decisions at the
+    threshold match it exactly.
+    """
+    try:
+        threshold, adjustment = _CONFIDENCE_TIERS[tier]
+    except KeyError:
+        raise ValueError(f"Unknown confidence tier: {tier}") from None
+
+    def scorer(components) -> Tuple[float, bool]:
+        drawdown, news, volatility, streak, size = components
+        total_score = (
+            drawdown * DRAWDOWN_WEIGHT +
+            news * NEWS_WEIGHT +
+            volatility * VOLATILITY_WEIGHT +
+            streak * STREAK_WEIGHT +
+            size * SIZE_WEIGHT
+        )
+        score = total_score * adjustment
+        return score, score >= threshold
+
+    scorer.tier = tier
+    scorer.threshold = threshold
+    return scorer
+
+
+def _parse_drawdown(value) -> float:
+    try:
+        return float(str(value).replace('%', ''))
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _parse_int_pair(first, second) -> Tuple[float, float]:
+    """int() both values like the original helpers did; NaN for both if either fails"""
+    try:
+        return float(int(first)), float(int(second))
+    except (ValueError, TypeError):
+        return np.nan, np.nan
+
+
+def _volatility_code(volatility_level) -> int:
+    if not volatility_level:
+        return -1
+    return _VOLATILITY_CODES.get(volatility_level.lower(), -1)
+
+
+def _count_negative_headlines(headlines) -> int:
+    if not headlines:
+        return 0
+    return sum(1 for h in headlines if h and _has_negative_keyword(h))
+
+
+# Compile (or load the on-disk cache) at import so the first live proposal doesn't pay JIT cost
+_score_kernel(0.0, 1, 0.0, 0.0, 0.0, 0.0, 0, np.nan)
+
+
 class OllamaService:
     def __init__(self, url: str, model: str):
         self.url = url
         self.model = model
-
-    def generate(self, prompt: str, options: dict = None, system: str = None) -> dict:
-        """Generic generation method with optional system prompt"""
+        self.session = self._build_session()
+        self._veto_cache: Dict[tuple, tuple] = {}
+
+    @staticmethod
+    def _build_session() -> requests.Session:
+        """Keep-alive session so repeated /api/generate calls skip the TCP handshake"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"Connection": "keep-alive", "Accept-Encoding": "gzip, deflate"})
+        return session
+
+    def _build_payload(self, prompt: str, options: dict, system: str, stream: bool, json_mode: bool = False) -> dict:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+        }
+        if json_mode:
+            # Ollama constrains the output to valid JSON
+            payload["format"] = "json"
+        if system:
+            payload["system"] = system
+        if options:
+            payload["options"] = options
+        return payload
+
+    def generate(self, prompt: str, options: dict = None, system: str = None, json_mode: bool = False) -> dict:
+        """Generic generation method with optional system prompt; json_mode asks Ollama for a JSON-only answer"""
         if not self.url or not self.model:
             return {"error": "Ollama not configured"}
             
         try:
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-            }
-            if system:
-                payload["system"] = system
-            if options:
-                payload["options"] = options
-
-            response = requests.post(
+            response = self.session.post(
                 f"{self.url}/api/generate",
-                json=payload,
+                json=self._build_payload(prompt, options, system, stream=False, json_mode=json_mode),
                 timeout=15  # Reduced from 120s to 15s for production performance
             )
-            result = response.json().get('response', '')
+            result = _json_loads(response.content).get('response', '')
             return {"response": result}
         except Exception as e:
             return {"error": str(e)}
 
+    def generate_json(self, prompt: str, options: dict = None, system: str = None) -> dict:
+        """
+        Streaming variant of generate() for prompts whose answer is a single JSON object.
+        Stops reading (and closes the stream) as soon as the first top-level {...}
+        is balanced; if no object appears the full text is returned.
+        """
+        if not self.url or not self.model:
+            return {"error": "Ollama not configured"}
+
+        try:
+            response = self.session.post(
+                f"{self.url}/api/generate",
+                json=self._build_payload(prompt, options, system, stream=True),
+                timeout=15,
+                stream=True,
+            )
+            try:
+                text = ""
+                start = -1
+                depth = 0
+                in_string = False
+                escaped = False
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = _json_loads(line)
+                    offset = len(text)
+                    text += chunk.get('response', '')
+                    for i in range(offset, len(text)):
+                        ch = text[i]
+                        if in_string:
+                            if escaped:
+                                escaped = False
+                            elif ch == '\\':
+                                escaped = True
+                            elif ch == '"':
+                                in_string = False
+                        elif ch == '"' and start >= 0:
+                            in_string = True
+                        elif ch == '{':
+                            if start < 0:
+                                start = i
+                            depth += 1
+                        elif ch == '}' and start >= 0:
+                            depth -= 1
+                            if depth == 0:
+                                return {"response": text[start:i + 1]}
+                    if chunk.get('done'):
+                        break
+                return {"response": text}
+            finally:
+                response.close()
+        except Exception as e:
+            return {"error": str(e)}
+
+    @staticmethod
+    def _fingerprint(trade_proposal: dict) -> tuple:
+        """
+        Hashable key over every field the trade prompt renders, in _PROMPT_DEFAULTS order
+        followed by the headline set. Drawdown, confidence and P&L are bucketed so
+        near-identical proposals share an entry; unparseable numbers bucket to None.
+        """
+        key = []
+        for field in _PROMPT_DEFAULTS:
+            value = trade_proposal.get(field)
+            if value is not None and field in _FINGERPRINT_BUCKETS:
+                digits, step = _FINGERPRINT_BUCKETS[field]
+                try:
+                    value = round(float(str(value).replace('%', '')) / step, digits)
+                except (ValueError, TypeError):
+                    value = None
+            elif not isinstance(value, (str, int, float, bool, type(None))):
+                value = repr(value)
+            key.append(value)
+        headlines = trade_proposal.get('news_headlines') or []
+        key.append(hash(tuple(sorted(str(h) for h in headlines))))
+        return tuple(key)
+
+    def _get_cached_veto(self, key: tuple) -> Optional[dict]:
+        """Return a private copy of a fresh cached result"""
+        now = time.monotonic()
+        entry = self._veto_cache.get(key)
+        if entry is None or now - entry[0] >= VETO_CACHE_TTL_SECONDS:
+            return None
+        return copy.deepcopy(entry[1])
+
+    def _store_veto(self, key: tuple, result: dict):
+        """Cache a copy of result, evicting expired entries (only on insert, never on lookup)"""
+        now = time.monotonic()
+        for stale in [k for k, (ts, _) in self._veto_cache.items() if now - ts >= VETO_CACHE_TTL_SECONDS]:
+            del self._veto_cache[stale]
+        self._veto_cache[key] = (now, copy.deepcopy(result))
+
     def _parse_veto_response(self, response_text: str) -> dict:
         """Parse APPROVE/VETO response strictly (legacy binary format)"""
         text = response_text.strip()
+        head = text[:7].upper()
         
-        if text == "APPROVE" or text.startswith("APPROVE"):
+        if head.startswith("APPROVE"):
             return {"veto": False, "score": 1.0, "reason": "APPROVED"}
         
-        veto_match = re.match(r'^VETO:\s*(.+)$', text, re.IGNORECASE)
-        if veto_match:
-            reason = veto_match.group(1).strip()
-            return {"veto": True, "score": 0.0, "reason": reason}
+        if head.startswith("VETO:"):
+            return {"veto": True, "score": 0.0, "reason": text[5:].strip().lstrip(":").strip()}
         
         return {"veto": True, "score": 0.0, "reason": "unexpected response format - defaulting to VETO"}
 
@@ -130,7 +542,7 @@ class OllamaService:
         
         try:
             # Try to parse as JSON
-            data = json.loads(text)
+            data = _json_loads(text)
             
             # Extract individual risk scores
             drawdown_risk = float(data.get('drawdown_risk', 50))
@@ -194,43 +606,28 @@ class OllamaService:
         Calculate risk score locally without LLM call.
         This is a fast fallback when LLM is unavailable or for quick checks.
         """
-        # Calculate individual risk components
-        drawdown_risk = self._calculate_drawdown_risk(trade_proposal)
-        news_risk = self._calculate_news_risk(trade_proposal.get('news_headlines', []))
-        volatility_risk = self._calculate_volatility_risk(trade_proposal.get('volatility_level', 'normal'))
-        streak_risk = self._calculate_streak_risk(
+        win_streak, loss_streak = _parse_int_pair(
             trade_proposal.get('win_streak', 0),
             trade_proposal.get('loss_streak', 0)
         )
-        size_risk = self._calculate_size_risk(
+        shares, trades_today = _parse_int_pair(
             trade_proposal.get('shares', 0),
             trade_proposal.get('trades_today', 0)
         )
-        
-        # Weighted total
-        total_score = (
-            drawdown_risk * DRAWDOWN_WEIGHT +
-            news_risk * NEWS_WEIGHT +
-            volatility_risk * VOLATILITY_WEIGHT +
-            streak_risk * STREAK_WEIGHT +
-            size_risk * SIZE_WEIGHT
-        )
-        
-        # Apply confidence adjustment
         signal_confidence = trade_proposal.get('signal_confidence')
-        threshold = DEFAULT_VETO_THRESHOLD
-        confidence_adjustment = 1.0
-        
-        if signal_confidence is not None:
-            if signal_confidence >= 0.9:
-                threshold = HIGH_CONVICTION_THRESHOLD
-                confidence_adjustment = 0.8
-            elif signal_confidence < 0.5:
-                threshold = LOW_CONVICTION_THRESHOLD
-                confidence_adjustment = 1.2
-        
-        adjusted_score = total_score * confidence_adjustment
-        should_veto = adjusted_score >= threshold
+
+        (drawdown_risk, news_risk, volatility_risk, streak_risk, size_risk,
+         total_score, adjusted_score, threshold, confidence_adjustment, should_veto) = _score_kernel(
+            _parse_drawdown(trade_proposal.get('drawdown_percent', 0)),
+            _volatility_code(trade_proposal.get('volatility_level', 'normal')),
+            win_streak,
+            loss_streak,
+            shares,
+            trades_today,
+            _count_negative_headlines(trade_proposal.get('news_headlines', [])),
+            np.nan if signal_confidence is None else float(signal_confidence),
+        )
+        should_veto = bool(should_veto)
         
         # Determine reason
         risk_factors = [
@@ -259,93 +656,86 @@ class OllamaService:
             }
         }
     
+    def score_many(self, proposals: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized local risk scoring for many proposals (e.g. a watchlist scan).
+        Proposal fields are parsed into columns once; every risk component, the
+        weighting and the confidence tiers are then array ops over the whole batch.
+        Returns (adjusted risk scores, veto mask), matching _calculate_local_risk_score
+        element-wise.
+        """
+        if not proposals:
+            return np.empty(0, dtype=np.float64), np.empty(0, dtype=bool)
+
+        n = len(proposals)
+        drawdown = np.empty(n)
+        vol_code = np.empty(n)
+        win = np.empty(n)
+        loss = np.empty(n)
+        shares = np.empty(n)
+        trades = np.empty(n)
+        neg_news = np.empty(n)
+        confidence = np.empty(n)
+        for i, p in enumerate(proposals):
+            drawdown[i] = _parse_drawdown(p.get('drawdown_percent', 0))
+            vol_code[i] = _volatility_code(p.get('volatility_level', 'normal'))
+            win[i], loss[i] = _parse_int_pair(p.get('win_streak', 0), p.get('loss_streak', 0))
+            shares[i], trades[i] = _parse_int_pair(p.get('shares', 0), p.get('trades_today', 0))
+            neg_news[i] = _count_negative_headlines(p.get('news_headlines', []))
+            c = p.get('signal_confidence')
+            confidence[i] = np.nan if c is None else float(c)
+
+        # Same ladders as the scalar kernels; fmin keeps their min(100, NaN) == 100 behaviour
+        drawdown_risk = np.where(drawdown <= 0, 0.0, np.fmin(100.0, drawdown / DAILY_DRAWDOWN_DANGER * 100))
+        news_risk = np.minimum(100.0, neg_news * 25.0)
+        volatility_risk = np.select(
+            [vol_code == 0, vol_code == 1, vol_code == 2, vol_code == 3], [0.0, 20.0, 60.0, 100.0], 30.0
+        )
+        streak_risk = np.select(
+            [np.isnan(win) | np.isnan(loss), loss >= LOSS_STREAK_DANGER, loss >= 2, loss == 1, win >= 3],
+            [25.0, 100.0, 70.0, 40.0, 10.0],
+            25.0,
+        )
+        size_score = np.select(
+            [shares > MAX_SHARES, shares > 100],
+            [100.0, (shares - 100) / (MAX_SHARES - 100) * 50 + 25],
+            shares / 100 * 25,
+        )
+        freq_score = np.select([trades >= MAX_TRADES_PER_DAY, trades >= 3], [100.0, 60.0], trades * 15.0)
+        size_risk = np.where(np.isnan(shares) | np.isnan(trades), 25.0, (size_score + freq_score) / 2)
+
+        components = np.column_stack((drawdown_risk, news_risk, volatility_risk, streak_risk, size_risk))
+        scores = components @ _RISK_WEIGHTS
+        high = confidence >= 0.9
+        low = confidence < 0.5
+        adjusted = scores * np.where(high, 0.8, np.where(low, 1.2, 1.0))
+        thresholds = np.where(
+            high, HIGH_CONVICTION_THRESHOLD,
+            np.where(low, LOW_CONVICTION_THRESHOLD, DEFAULT_VETO_THRESHOLD),
+        )
+        return adjusted, adjusted >= thresholds
+
     def _calculate_drawdown_risk(self, trade_proposal: dict) -> float:
         """Calculate drawdown risk (0-100)"""
-        drawdown = trade_proposal.get('drawdown_percent', 0)
-        try:
-            drawdown = float(str(drawdown).replace('%', ''))
-        except (ValueError, TypeError):
-            drawdown = 0
-        
-        if drawdown <= 0:
-            return 0
-        return min(100, (drawdown / DAILY_DRAWDOWN_DANGER) * 100)
+        return _drawdown_risk(_parse_drawdown(trade_proposal.get('drawdown_percent', 0)))
     
     def _calculate_news_risk(self, headlines: list) -> float:
         """Calculate news sentiment risk (0-100)"""
-        if not headlines:
-            return 0
-        
-        negative_count = 0
-        for headline in headlines:
-            if headline:
-                headline_lower = headline.lower()
-                for keyword in NEGATIVE_NEWS_KEYWORDS:
-                    if keyword.lower() in headline_lower:
-                        negative_count += 1
-                        break
-        
-        return min(100, negative_count * 25.0)
+        return _news_risk(_count_negative_headlines(headlines))
     
     def _calculate_volatility_risk(self, volatility_level: str) -> float:
         """Calculate volatility risk (0-100)"""
-        if not volatility_level:
-            return 30  # Unknown = moderate risk
-        
-        level = volatility_level.lower()
-        if level == 'low':
-            return 0
-        elif level == 'normal':
-            return 20
-        elif level == 'high':
-            return 60
-        elif level in ('extreme', 'choppy'):
-            return 100
-        return 30
+        return _volatility_risk(_volatility_code(volatility_level))
     
     def _calculate_streak_risk(self, win_streak: int, loss_streak: int) -> float:
         """Calculate streak risk (0-100)"""
-        try:
-            loss_streak = int(loss_streak)
-            win_streak = int(win_streak)
-        except (ValueError, TypeError):
-            return 25
-        
-        if loss_streak >= LOSS_STREAK_DANGER:
-            return 100
-        if loss_streak >= 2:
-            return 70
-        if loss_streak == 1:
-            return 40
-        if win_streak >= 3:
-            return 10
-        return 25
+        win_streak, loss_streak = _parse_int_pair(win_streak, loss_streak)
+        return _streak_risk(win_streak, loss_streak)
     
     def _calculate_size_risk(self, shares: int, trades_today: int) -> float:
         """Calculate size and frequency risk (0-100)"""
-        try:
-            shares = int(shares)
-            trades_today = int(trades_today)
-        except (ValueError, TypeError):
-            return 25
-        
-        # Size risk
-        if shares > MAX_SHARES:
-            size_score = 100
-        elif shares > 100:
-            size_score = ((shares - 100) / (MAX_SHARES - 100)) * 50 + 25
-        else:
-            size_score = (shares / 100) * 25
-        
-        # Frequency risk
-        if trades_today >= MAX_TRADES_PER_DAY:
-            freq_score = 100
-        elif trades_today >= 3:
-            freq_score = 60
-        else:
-            freq_score = trades_today * 15
-        
-        return (size_score + freq_score) / 2
+        shares, trades_today = _parse_int_pair(shares, trades_today)
+        return _size_risk(shares, trades_today)
 
     def call_trade_veto(self, trade_proposal: dict) -> dict:
         """
@@ -360,33 +750,7 @@ class OllamaService:
         - strategy_days_active, recent_backtest_stats
         - signal_confidence (optional, 0.0-1.0)
         """
-        user_prompt = f"""Trade Proposal:
-- Symbol: {trade_proposal.get('symbol', 'N/A')}
-- Direction: {trade_proposal.get('direction', 'N/A')}
-- Shares: {trade_proposal.get('shares', 'N/A')}
-- Entry Logic: {trade_proposal.get('entry_logic', 'N/A')}
-- Strategy: {trade_proposal.get('strategy_name', 'N/A')}
-- Signal Confidence: {trade_proposal.get('signal_confidence', 'N/A')}
-
-System State:
-- Daily P&L: {trade_proposal.get('daily_pnl', 'N/A')} TWD
-- Weekly P&L: {trade_proposal.get('weekly_pnl', 'N/A')} TWD
-- Current Drawdown: {trade_proposal.get('drawdown_percent', 'N/A')}%
-- Trades Today: {trade_proposal.get('trades_today', 'N/A')}
-- Win Streak: {trade_proposal.get('win_streak', 'N/A')}
-- Loss Streak: {trade_proposal.get('loss_streak', 'N/A')}
-
-Market Context:
-- Volatility: {trade_proposal.get('volatility_level', 'N/A')}
-- Time: {trade_proposal.get('time_of_day', 'N/A')}
-- Session Phase: {trade_proposal.get('session_phase', 'N/A')}
-
-News Headlines:
-{chr(10).join(f"- {h}" for h in trade_proposal.get('news_headlines', []))}
-
-Strategy Context:
-- Days Active: {trade_proposal.get('strategy_days_active', 'N/A')}
-- Recent Backtest Stats: {trade_proposal.get('recent_backtest_stats', 'N/A')}"""
+        user_prompt = _build_trade_prompt(trade_proposal)
 
         try:
             result = self.generate(
@@ -426,40 +790,17 @@ Strategy Context:
             # Use local calculation (fast, no LLM call)
             return self._calculate_local_risk_score(trade_proposal)
         
+        cache_key = self._fingerprint(trade_proposal)
+        cached = self._get_cached_veto(cache_key)
+        if cached is not None:
+            return cached
+        
         signal_confidence = trade_proposal.get('signal_confidence')
         
-        user_prompt = f"""Trade Proposal:
-- Symbol: {trade_proposal.get('symbol', 'N/A')}
-- Direction: {trade_proposal.get('direction', 'N/A')}
-- Shares: {trade_proposal.get('shares', 'N/A')}
-- Entry Logic: {trade_proposal.get('entry_logic', 'N/A')}
-- Strategy: {trade_proposal.get('strategy_name', 'N/A')}
-- Signal Confidence: {signal_confidence if signal_confidence is not None else 'N/A'}
-
-System State:
-- Daily P&L: {trade_proposal.get('daily_pnl', 'N/A')} TWD
-- Weekly P&L: {trade_proposal.get('weekly_pnl', 'N/A')} TWD
-- Current Drawdown: {trade_proposal.get('drawdown_percent', 'N/A')}%
-- Trades Today: {trade_proposal.get('trades_today', 'N/A')}
-- Win Streak: {trade_proposal.get('win_streak', 'N/A')}
-- Loss Streak: {trade_proposal.get('loss_streak', 'N/A')}
-
-Market Context:
-- Volatility: {trade_proposal.get('volatility_level', 'N/A')}
-- Time: {trade_proposal.get('time_of_day', 'N/A')}
-- Session Phase: {trade_proposal.get('session_phase', 'N/A')}
-
-News Headlines:
-{chr(10).join(f"- {h}" for h in trade_proposal.get('news_headlines', []))}
-
-Strategy Context:
-- Days Active: {trade_proposal.get('strategy_days_active', 'N/A')}
-- Recent Backtest Stats: {trade_proposal.get('recent_backtest_stats', 'N/A')}
-
-Provide risk assessment as JSON with scores 0-100 for each factor."""
+        user_prompt = _build_trade_prompt(trade_proposal, _RISK_SCORE_PROMPT_TMPL)
 
         try:
-            result = self.generate(
+            result = self.generate_json(
                 prompt=user_prompt,
                 system=TRADE_VETO_SYSTEM_PROMPT,  # Use new risk-scoring prompt
                 options={"temperature": 0.1}
@@ -468,10 +809,14 @@ Provide risk assessment as JSON with scores 0-100 for each factor."""
                 # Fall back to local calculation on LLM error
                 return self._calculate_local_risk_score(trade_proposal)
             
-            return self._parse_risk_score_response(
+            parsed = self._parse_risk_score_response(
                 result.get('response', ''),
                 signal_confidence
             )
+            # Only JSON-scored results carry a breakdown; legacy-format fallbacks are not cached
+            if "breakdown" in parsed:
+                self._store_veto(cache_key, parsed)
+            return parsed
         except Exception as e:
             # Fall back to local calculation on exception
             local_result = self._calculate_local_risk_score(trade_proposal)
@@ -480,34 +825,15 @@ Provide risk assessment as JSON with scores 0-100 for each factor."""
 
     def call_llama_news_veto(self, headlines: list) -> dict:
         """
-        Call Ollama for news-based veto decision.
-        Uses a simplified prompt for faster response.
+        News-based veto decision.
+        The veto rule is "any negative keyword -> VETO", which is deterministic,
+        so it is evaluated locally with the keyword matcher instead of paying an
+        Ollama round trip.
         """
-        # Simple, direct prompt without the massive system prompt
-        full_prompt = f"""Analyze these Taiwan stock market news headlines. Respond ONLY with "APPROVE" or "VETO: reason".
-
-Headlines:
-{chr(10).join(f"- {h}" for h in headlines)}
-
-Rules:
-- If ANY headline mentions: 下跌, 利空, 衰退, 地緣, 貿易戰, crash, decline, warning, negative → VETO
-- If neutral or mildly positive → APPROVE
-- If uncertain → VETO
-
-Response:"""
-
-        try:
-            result = self.generate(
-                prompt=full_prompt,
-                system=None,  # No system prompt for speed
-                options={"temperature": 0.1}
-            )
-            if "error" in result:
-                return {"veto": True, "score": 0.0, "reason": f"Analysis failed: {result['error']}"}
-            
-            return self._parse_veto_response(result.get('response', ''))
-        except Exception as e:
-            return {"veto": True, "score": 0.0, "reason": f"Analysis failed: {str(e)}"}
+        hits = [h for h in headlines if h and _has_negative_keyword(h)]
+        if not hits:
+            return {"veto": False, "score": 1.0, "reason": "No negative keywords detected (local fast path)"}
+        return {"veto": True, "score": 0.0, "reason": f"Negative keyword in: {hits[0][:80]}"}
 
     def call_llama_error_explanation(self, error_type: str, error_message: str, context: str = "") -> dict:
         """Call Ollama to generate human-readable error explanation"""
@@ -530,15 +856,19 @@ Respond ONLY with valid JSON:
 Be concise, friendly, and actionable. Focus on what the trader can do to resolve the issue."""
 
         try:
-            result = self.generate(prompt, options={"temperature": 0.3})
+            result = self.generate(prompt, options={"temperature": 0.3}, json_mode=True)
             if "error" in result:
                 return {
                     "explanation": error_message,
                     "suggestion": "Please check the logs or contact support",
                     "severity": "medium"
                 }
-            return json.loads(result['response'])
-        except:
+            explanation = _json_loads(result['response'])
+            if not isinstance(explanation, dict):
+                raise ValueError("explanation is not a JSON object")
+            return explanation
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Unparseable error explanation from Ollama: {e}")
             return {
                 "explanation": error_message,
                 "suggestion": "Please check the logs or contact support",
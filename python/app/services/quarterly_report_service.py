@@ -1,10 +1,14 @@
+import asyncio
 import os
+import re
+import time
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
+import aiohttp
 import requests
-from pydantic import BaseModel, Field, StrictBool, StrictInt, StrictStr, field_validator
+from pydantic import BaseModel, ConfigDict, Field, StrictBool, StrictInt, StrictStr, TypeAdapter, field_validator
 
 from app.services.annual_report_service import (
     _decode_twse_response,
@@ -16,6 +20,12 @@ from app.services.annual_report_service import (
 )
 
 TWSE_REPORTS_URL = "https://doc.twse.com.tw/server-java/t57sb01"
+# PDFs are several MB; 1 MiB chunks keep the write syscall count low
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+_READFILE_RE = re.compile(
+    r"readfile2?\(\"(?P<kind>[^\"]+)\",\"(?P<co_id>[^\"]+)\",\"(?P<filename>[^\"]+)\"\)",
+    re.ASCII,
+)
 TWSE_QUARTERLY_REPORT_TYPES = {
     "F01": "Consolidated financial statements",
     "F02": "Individual financial statements",
@@ -24,6 +34,9 @@ TWSE_QUARTERLY_REPORT_TYPES = {
 
 
 class QuarterlyReportRequest(BaseModel):
+    # Frozen so requests are hashable and can key caches
+    model_config = ConfigDict(frozen=True)
+
     ticker: StrictStr = Field(..., min_length=1, max_length=20)
     report_year: Optional[StrictInt] = Field(default=None, ge=1, le=2100)
     report_quarter: StrictInt = Field(..., ge=1, le=4)
@@ -49,6 +62,10 @@ class QuarterlyReportRequest(BaseModel):
         return normalized
 
 
+# Shared schema for validating a whole batch of requests in one call
+_REQ_ADAPTER = TypeAdapter(List[QuarterlyReportRequest])
+
+
 class QuarterlyReportResponse(BaseModel):
     status: StrictStr
     ticker: StrictStr
@@ -70,6 +87,20 @@ class QuarterlyReportDownloadError(Exception):
     status_code: int = 400
 
 
+_SESSION: Optional[requests.Session] = None
+
+# step=1 lookup results: (co_id, roc_year, quarter, report_type) -> (kind, co_id, filename, fetched_at)
+STEP1_CACHE_TTL_SECONDS = 86400
+_STEP1_CACHE: Dict[Tuple[str, int, int, str], Tuple[str, str, str, float]] = {}
+
+
+def _shared_session() -> requests.Session:
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = requests.Session()
+    return _SESSION
+
+
 def _project_root() -> str:
     script_dir = os.path.dirname(os.path.abspath(__file__))
     return os.path.abspath(os.path.join(script_dir, "..", ".."))
@@ -82,12 +113,7 @@ def _reports_base_dir(destination_dir: Optional[str]) -> str:
 
 
 def _parse_twse_result(html: str) -> Tuple[str, str, str]:
-    import re
-
-    match = re.search(
-        r"readfile2?\(\"(?P<kind>[^\"]+)\",\"(?P<co_id>[^\"]+)\",\"(?P<filename>[^\"]+)\"\)",
-        html,
-    )
+    match = _READFILE_RE.search(html)
     if not match:
         raise QuarterlyReportDownloadError("Quarterly report not found in TWSE response", status_code=404)
 
@@ -98,7 +124,34 @@ def _parse_twse_result(html: str) -> Tuple[str, str, str]:
     )
 
 
+def _open_for_write(path: str) -> int:
+    return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+
+def _write_all(fd: int, chunk: bytes) -> None:
+    view = memoryview(chunk)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _write_chunks(path: str, chunks) -> int:
+    """Write chunks straight to an fd (no BufferedWriter layer) and return the byte count"""
+    size_bytes = 0
+    fd = _open_for_write(path)
+    try:
+        for chunk in chunks:
+            if chunk:
+                _write_all(fd, chunk)
+                size_bytes += len(chunk)
+    finally:
+        os.close(fd)
+    return size_bytes
+
+
 def _normalize_co_id(ticker: str) -> str:
+    if ticker.isdigit():
+        return ticker
     normalized = ticker.strip().upper()
     if normalized.endswith(".TW"):
         normalized = normalized[:-3]
@@ -108,31 +161,23 @@ def _normalize_co_id(ticker: str) -> str:
     return normalized
 
 
-def download_quarterly_financial_report(
-    ticker: str,
-    report_year: Optional[int],
-    report_quarter: int,
-    report_type: str = "F01",
-    force: bool = False,
-    destination_dir: Optional[str] = None,
-    session: Optional[requests.Session] = None,
-) -> QuarterlyReportResponse:
-    normalized_ticker = _normalize_co_id(ticker)
-    base_dir = _reports_base_dir(destination_dir)
-    ticker_dir = os.path.join(base_dir, normalized_ticker)
-    latest_cache_path = os.path.join(ticker_dir, "latest.json")
-    year_cache_path = os.path.join(ticker_dir, f"report-{report_year}-Q{report_quarter}.json") if report_year else None
+def _now_iso() -> str:
+    """Local time as ISO-8601 (second precision) without building a datetime"""
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime())
 
-    if not force:
-        cached = None
-        if report_year and year_cache_path:
-            cached = _load_cached_metadata(year_cache_path)
-        if not cached:
-            cached = _load_cached_metadata(latest_cache_path)
-        if cached and os.path.exists(cached.get("file_path", "")):
-            return QuarterlyReportResponse(**cached)
-
-    session = session or requests.Session()
+
+def _load_cached_report(ticker_dir: str, report_year: Optional[int], report_quarter: int) -> Optional[QuarterlyReportResponse]:
+    cached = None
+    if report_year:
+        cached = _load_cached_metadata(os.path.join(ticker_dir, f"report-{report_year}-Q{report_quarter}.json"))
+    if not cached:
+        cached = _load_cached_metadata(os.path.join(ticker_dir, "latest.json"))
+    if cached and os.path.exists(cached.get("file_path", "")):
+        return QuarterlyReportResponse(**cached)
+    return None
+
+
+def _lookup_payload(normalized_ticker: str, report_year: Optional[int], report_quarter: int, report_type: str):
     requested_roc_year = _roc_year(report_year)
     if requested_roc_year is None:
         requested_roc_year = _roc_year(datetime.now().year)
@@ -149,7 +194,66 @@ def download_quarterly_financial_report(
         "dtype": report_type,
         "seamon": "",
     }
+    return requested_roc_year, report_type, payload
+
+
+def _cached_lookup(step1_key) -> Optional[Tuple[str, str, str]]:
+    cached_lookup = _STEP1_CACHE.get(step1_key)
+    if cached_lookup and time.time() - cached_lookup[3] < STEP1_CACHE_TTL_SECONDS:
+        return cached_lookup[:3]
+    return None
+
+
+def _report_file_path(
+    ticker_dir: str,
+    normalized_ticker: str,
+    report_year: Optional[int],
+    requested_roc_year: int,
+    report_quarter: int,
+    filename: str,
+) -> Tuple[str, Optional[int]]:
+    ext = os.path.splitext(filename)[1] or ".pdf"
+    report_year_value = _gregorian_year(report_year) or _gregorian_year(requested_roc_year)
+    safe_year = report_year_value or "latest"
+    file_name = f"{normalized_ticker}-{safe_year}-Q{report_quarter}{ext}"
+    os.makedirs(ticker_dir, exist_ok=True)
+    return os.path.join(ticker_dir, file_name), report_year_value
+
+
+def _store_report_metadata(
+    ticker_dir: str,
+    normalized_ticker: str,
+    report_year_value: Optional[int],
+    report_quarter: int,
+    requested_roc_year: int,
+    report_type: str,
+    file_path: str,
+    content_type: Optional[str],
+    size_bytes: int,
+) -> QuarterlyReportResponse:
+    metadata = {
+        "status": "success",
+        "ticker": normalized_ticker,
+        "report_year": report_year_value,
+        "report_quarter": report_quarter,
+        "roc_year": requested_roc_year,
+        "report_type": report_type,
+        "source": "TWSE",
+        "url": TWSE_REPORTS_URL,
+        "file_path": file_path,
+        "content_type": content_type,
+        "size_bytes": size_bytes,
+        "timestamp": _now_iso(),
+    }
+
+    if report_year_value:
+        _write_metadata(os.path.join(ticker_dir, f"report-{report_year_value}-Q{report_quarter}.json"), metadata)
+    _write_metadata(os.path.join(ticker_dir, "latest.json"), metadata)
 
+    return QuarterlyReportResponse(**metadata)
+
+
+def _query_report_file(session: requests.Session, payload: Dict[str, str]) -> Tuple[str, str, str]:
     try:
         response = session.post(TWSE_REPORTS_URL, headers=_twse_headers(), data=payload, timeout=30)
         response.raise_for_status()
@@ -157,8 +261,19 @@ def download_quarterly_financial_report(
         raise QuarterlyReportDownloadError(f"Failed to query TWSE: {exc}", status_code=502) from exc
 
     html = _decode_twse_response(response.content)
-    kind, co_id, filename = _parse_twse_result(html)
+    return _parse_twse_result(html)
 
+
+def _check_report_content_type(content_type: Optional[str]) -> None:
+    # TWSE answers an unknown or stale filename with HTTP 200 and an HTML error page
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if media_type.startswith("text/"):
+        raise QuarterlyReportDownloadError(
+            f"TWSE returned {media_type} instead of the report file", status_code=502
+        )
+
+
+def _request_report_file(session: requests.Session, kind: str, co_id: str, filename: str):
     download_payload = {
         "step": "9",
         "kind": kind,
@@ -177,41 +292,228 @@ def download_quarterly_financial_report(
         report_response.raise_for_status()
     except requests.RequestException as exc:
         raise QuarterlyReportDownloadError(f"Failed to download quarterly report: {exc}", status_code=502) from exc
+    try:
+        _check_report_content_type(report_response.headers.get("Content-Type"))
+    except QuarterlyReportDownloadError:
+        report_response.close()
+        raise
+    return report_response
 
-    ext = os.path.splitext(filename)[1] or ".pdf"
-    report_year_value = _gregorian_year(report_year) or _gregorian_year(requested_roc_year)
-    safe_year = report_year_value or "latest"
-    file_name = f"{normalized_ticker}-{safe_year}-Q{report_quarter}{ext}"
-    os.makedirs(ticker_dir, exist_ok=True)
-    file_path = os.path.join(ticker_dir, file_name)
+
+def download_quarterly_financial_report(
+    ticker: str,
+    report_year: Optional[int],
+    report_quarter: int,
+    report_type: str = "F01",
+    force: bool = False,
+    destination_dir: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+) -> QuarterlyReportResponse:
+    normalized_ticker = _normalize_co_id(ticker)
+    ticker_dir = os.path.join(_reports_base_dir(destination_dir), normalized_ticker)
+
+    if not force:
+        cached = _load_cached_report(ticker_dir, report_year, report_quarter)
+        if cached:
+            return cached
+
+    session = session or _shared_session()
+    requested_roc_year, report_type, payload = _lookup_payload(
+        normalized_ticker, report_year, report_quarter, report_type
+    )
+
+    step1_key = (normalized_ticker, requested_roc_year, report_quarter, report_type)
+    cached_lookup = _cached_lookup(step1_key)
+    if cached_lookup:
+        kind, co_id, filename = cached_lookup
+    else:
+        kind, co_id, filename = _query_report_file(session, payload)
+        _STEP1_CACHE[step1_key] = (kind, co_id, filename, time.time())
+
+    try:
+        report_response = _request_report_file(session, kind, co_id, filename)
+    except QuarterlyReportDownloadError:
+        if cached_lookup is None:
+            raise
+        # The cached filename may be stale; look it up again once
+        _STEP1_CACHE.pop(step1_key, None)
+        kind, co_id, filename = _query_report_file(session, payload)
+        _STEP1_CACHE[step1_key] = (kind, co_id, filename, time.time())
+        report_response = _request_report_file(session, kind, co_id, filename)
+
+    file_path, report_year_value = _report_file_path(
+        ticker_dir, normalized_ticker, report_year, requested_roc_year, report_quarter, filename
+    )
     temp_path = f"{file_path}.part"
 
-    size_bytes = 0
-    with open(temp_path, "wb") as handle:
-        for chunk in report_response.iter_content(chunk_size=8192):
-            if chunk:
-                handle.write(chunk)
-                size_bytes += len(chunk)
+    size_bytes = _write_chunks(temp_path, report_response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE))
 
     os.replace(temp_path, file_path)
 
-    metadata = {
-        "status": "success",
-        "ticker": normalized_ticker,
-        "report_year": report_year_value,
-        "report_quarter": report_quarter,
-        "roc_year": requested_roc_year,
-        "report_type": report_type,
-        "source": "TWSE",
-        "url": TWSE_REPORTS_URL,
-        "file_path": file_path,
-        "content_type": report_response.headers.get("Content-Type"),
-        "size_bytes": size_bytes,
-        "timestamp": datetime.now().isoformat(),
+    return _store_report_metadata(
+        ticker_dir,
+        normalized_ticker,
+        report_year_value,
+        report_quarter,
+        requested_roc_year,
+        report_type,
+        file_path,
+        report_response.headers.get("Content-Type"),
+        size_bytes,
+    )
+
+
+# ============================================================================
+# Async batch download (backfills over many tickers)
+# ============================================================================
+
+async def _aquery_report_file(session: aiohttp.ClientSession, payload: Dict[str, str]) -> Tuple[str, str, str]:
+    try:
+        async with session.post(
+            TWSE_REPORTS_URL, headers=_twse_headers(), data=payload, timeout=aiohttp.ClientTimeout(total=30)
+        ) as response:
+            response.raise_for_status()
+            content = await response.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        raise QuarterlyReportDownloadError(f"Failed to query TWSE: {exc}", status_code=502) from exc
+
+    return _parse_twse_result(_decode_twse_response(content))
+
+
+async def _adownload_report_file(
+    session: aiohttp.ClientSession, kind: str, co_id: str, filename: str, temp_path: str
+) -> Tuple[int, Optional[str]]:
+    download_payload = {
+        "step": "9",
+        "kind": kind,
+        "co_id": co_id,
+        "filename": filename,
     }
 
-    if report_year_value:
-        _write_metadata(os.path.join(ticker_dir, f"report-{report_year_value}-Q{report_quarter}.json"), metadata)
-    _write_metadata(latest_cache_path, metadata)
+    try:
+        async with session.post(
+            TWSE_REPORTS_URL,
+            headers=_twse_headers(),
+            data=download_payload,
+            timeout=aiohttp.ClientTimeout(total=60),
+        ) as response:
+            response.raise_for_status()
+            _check_report_content_type(response.headers.get("Content-Type"))
+            size_bytes = 0
+            fd = _open_for_write(temp_path)
+            try:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    if chunk:
+                        _write_all(fd, chunk)
+                        size_bytes += len(chunk)
+            finally:
+                os.close(fd)
+            return size_bytes, response.headers.get("Content-Type")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        raise QuarterlyReportDownloadError(f"Failed to download quarterly report: {exc}", status_code=502) from exc
 
-    return QuarterlyReportResponse(**metadata)
+
+async def _adownload_one(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    request: QuarterlyReportRequest,
+    destination_dir: Optional[str],
+    path_locks: Dict[str, asyncio.Lock],
+) -> QuarterlyReportResponse:
+    normalized_ticker = _normalize_co_id(request.ticker)
+    ticker_dir = os.path.join(_reports_base_dir(destination_dir), normalized_ticker)
+
+    if not request.force:
+        cached = _load_cached_report(ticker_dir, request.report_year, request.report_quarter)
+        if cached:
+            return cached
+
+    requested_roc_year, report_type, payload = _lookup_payload(
+        normalized_ticker, request.report_year, request.report_quarter, request.report_type
+    )
+    step1_key = (normalized_ticker, requested_roc_year, request.report_quarter, report_type)
+
+    async with semaphore:
+        cached_lookup = _cached_lookup(step1_key)
+        while True:
+            if cached_lookup:
+                kind, co_id, filename = cached_lookup
+            else:
+                kind, co_id, filename = await _aquery_report_file(session, payload)
+                _STEP1_CACHE[step1_key] = (kind, co_id, filename, time.time())
+
+            file_path, report_year_value = _report_file_path(
+                ticker_dir, normalized_ticker, request.report_year, requested_roc_year, request.report_quarter, filename
+            )
+            temp_path = f"{file_path}.part"
+            # Different rows (F01/F02, report_year None vs the current year) can share a file
+            # path; one writer at a time per path, or they truncate each other's .part file
+            lock = path_locks.setdefault(file_path, asyncio.Lock())
+            try:
+                async with lock:
+                    size_bytes, content_type = await _adownload_report_file(session, kind, co_id, filename, temp_path)
+                    os.replace(temp_path, file_path)
+                break
+            except QuarterlyReportDownloadError:
+                if cached_lookup is None:
+                    raise
+                # The cached filename may be stale; look it up again once
+                _STEP1_CACHE.pop(step1_key, None)
+                cached_lookup = None
+
+    return _store_report_metadata(
+        ticker_dir,
+        normalized_ticker,
+        report_year_value,
+        request.report_quarter,
+        requested_roc_year,
+        report_type,
+        file_path,
+        content_type,
+        size_bytes,
+    )
+
+
+async def adownload_quarterly_batch(
+    requests_list: Sequence[Union[QuarterlyReportRequest, Dict[str, Any]]],
+    concurrency: int = 8,
+    destination_dir: Optional[str] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+) -> List[Union[QuarterlyReportResponse, QuarterlyReportDownloadError]]:
+    """
+    Download many quarterly reports concurrently (at most `concurrency` TWSE requests in flight).
+    Results keep input order; a failed item yields its QuarterlyReportDownloadError instead of
+    aborting the whole batch. Rows may be QuarterlyReportRequest instances or plain dicts;
+    they are validated together up front, and repeated rows are downloaded once.
+    """
+    requests_list = _REQ_ADAPTER.validate_python(list(requests_list))
+    unique_requests = list(dict.fromkeys(requests_list))
+    semaphore = asyncio.Semaphore(concurrency)
+    path_locks: Dict[str, asyncio.Lock] = {}
+
+    async def run(client: aiohttp.ClientSession):
+        unique_results = await asyncio.gather(
+            *(_adownload_one(client, semaphore, request, destination_dir, path_locks) for request in unique_requests),
+            return_exceptions=True,
+        )
+        by_request = dict(zip(unique_requests, unique_results))
+        return [by_request[request] for request in requests_list]
+
+    if session is not None:
+        results = await run(session)
+    else:
+        async with aiohttp.ClientSession() as client:
+            results = await run(client)
+
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, QuarterlyReportDownloadError):
+            raise result
+    return list(results)
+
+
+def download_quarterly_batch(
+    requests_list: Sequence[Union[QuarterlyReportRequest, Dict[str, Any]]],
+    concurrency: int = 8,
+    destination_dir: Optional[str] = None,
+) -> List[Union[QuarterlyReportResponse, QuarterlyReportDownloadError]]:
+    return asyncio.run(adownload_quarterly_batch(requests_list, concurrency, destination_dir))
@@ -1,15 +1,22 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from functools import lru_cache
+from typing import List, Optional
 
-from pydantic import BaseModel, Field, StrictBool, StrictInt, StrictStr, field_validator
+from pydantic import BaseModel, ConfigDict, Field, StrictBool, StrictInt, StrictStr, field_validator
 
 from app.services.annual_report_summary_service import (
     _chunk_documents,
     _load_documents,
     _llm_from_env,
     DEFAULT_SUMMARY_MODEL,
-    load_summarize_chain,
 )
 from app.services.quarterly_report_service import (
     QuarterlyReportDownloadError,
@@ -17,12 +24,56 @@ from app.services.quarterly_report_service import (
     download_quarterly_financial_report,
 )
 
+try:
+    from langchain_core.prompts import PromptTemplate
+except ImportError:  # pragma: no cover - exercised via unit tests with mocks
+    PromptTemplate = None
+
+
+# Max LLM calls in flight during the map phase
+MAP_CONCURRENCY = 8
+# Combined map output above this many characters (~3000 tokens) is collapsed before reduce
+REDUCE_MAX_CHARS = 12000
+
+_MAP_TEMPLATE = """Write a concise summary of the following:
+
+
+"{text}"
+
+
+CONCISE SUMMARY:"""
+_REDUCE_TEMPLATE = _MAP_TEMPLATE
+# Compiled once at import rather than per summarize call
+_MAP_PROMPT = PromptTemplate.from_template(_MAP_TEMPLATE) if PromptTemplate else None
+_REDUCE_PROMPT = PromptTemplate.from_template(_REDUCE_TEMPLATE) if PromptTemplate else None
+
+# Map-output sentences at least this similar (Jaccard) to a kept sentence are dropped
+DEDUP_JACCARD_THRESHOLD = 0.75
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?。])\s+")
+_TOKEN_RE = re.compile(r"\w+")
+
+# Parsing these formats is CPU-bound (GIL-held), so it runs in worker processes
+_POOLED_EXTENSIONS = frozenset({".pdf", ".docx"})
+# Parsed chunks kept per SHA-256 of the report bytes
+CHUNK_CACHE_SIZE = 32
+_CHUNK_CACHE: "OrderedDict[str, list]" = OrderedDict()
+_PDF_POOL: Optional[ProcessPoolExecutor] = None
+PDF_POOL_MAX_WORKERS = min(4, os.cpu_count() or 1)
+# The bridge is multi-threaded by the time a report is parsed (uvicorn threadpool, tick
+# consumer, watchdog, log listener, Telegram loop); forking it can deadlock the child on
+# a lock some other thread held, so workers come from a clean forkserver/spawn parent.
+_PDF_POOL_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
 
 class QuarterlyReportSummaryRequest(BaseModel):
+    model_config = ConfigDict(defer_build=False, frozen=True)
+
     ticker: StrictStr = Field(..., min_length=1, max_length=20)
     report_year: Optional[StrictInt] = Field(default=None, ge=1, le=2100)
     report_quarter: StrictInt = Field(..., ge=1, le=4)
-    report_type: StrictStr = Field(default="F01")
+    report_type: str = Field(default="F01")
     force: StrictBool = False
 
     @field_validator("ticker")
@@ -42,18 +93,20 @@ class QuarterlyReportSummaryRequest(BaseModel):
         return normalized
 
 
-class QuarterlyReportSummaryResponse(BaseModel):
-    status: StrictStr
-    ticker: StrictStr
-    report_year: Optional[StrictInt]
-    report_quarter: StrictInt
-    roc_year: Optional[StrictInt]
-    report_type: StrictStr
-    summary: StrictStr
-    file_path: StrictStr
-    model: StrictStr
-    chunk_count: StrictInt
-    timestamp: StrictStr
+@dataclass(slots=True, frozen=True)
+class QuarterlyReportSummaryResponse:
+    # Built from trusted values only, so no per-field validation
+    status: str
+    ticker: str
+    report_year: Optional[int]
+    report_quarter: int
+    roc_year: Optional[int]
+    report_type: str
+    summary: str
+    file_path: str
+    model: str
+    chunk_count: int
+    timestamp: str
 
 
 @dataclass
@@ -62,6 +115,170 @@ class QuarterlyReportSummaryError(Exception):
     status_code: int = 400
 
 
+def _text_of(result) -> str:
+    # LLMs return str, chat models return a message with .content
+    return str(getattr(result, "content", result)).strip()
+
+
+async def _asummarize_texts(llm, prompt, texts: List[str], concurrency: int) -> List[str]:
+    # Runnable.abatch fans the prompts out concurrently, at most `concurrency` in flight
+    results = await llm.abatch(
+        [prompt.format(text=text) for text in texts],
+        config={"max_concurrency": concurrency},
+    )
+    return [_text_of(result) for result in results]
+
+
+def _group_by_size(texts: List[str], max_chars: int) -> List[List[str]]:
+    groups: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for text in texts:
+        if current and size + len(text) > max_chars:
+            groups.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += len(text)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _dedupe_sentences(summaries: List[str], threshold: float = DEDUP_JACCARD_THRESHOLD) -> List[str]:
+    """
+    Drop map-output sentences that near-duplicate an earlier kept sentence.
+    Overlapping chunks make neighbouring summaries repeat each other; removing the
+    repeats shrinks the reduce prompt. Candidates come from a token -> sentence index,
+    so each sentence is only compared with kept sentences it shares a token with.
+    """
+    kept_tokens: List[frozenset] = []
+    index: dict = {}
+    result: List[str] = []
+    for summary in summaries:
+        kept_sentences = []
+        for sentence in _SENTENCE_SPLIT_RE.split(summary.strip()):
+            tokens = frozenset(_TOKEN_RE.findall(sentence.lower()))
+            if not tokens:
+                continue
+            candidates = set()
+            for token in tokens:
+                candidates.update(index.get(token, ()))
+            if any(
+                len(tokens & kept_tokens[i]) / len(tokens | kept_tokens[i]) > threshold
+                for i in candidates
+            ):
+                continue
+            sentence_id = len(kept_tokens)
+            kept_tokens.append(tokens)
+            for token in tokens:
+                index.setdefault(token, []).append(sentence_id)
+            kept_sentences.append(sentence)
+        if kept_sentences:
+            result.append(" ".join(kept_sentences))
+    return result
+
+
+def _pdf_pool() -> ProcessPoolExecutor:
+    # Created on first use so importing the module never forks
+    global _PDF_POOL
+    if _PDF_POOL is None:
+        _PDF_POOL = ProcessPoolExecutor(
+            max_workers=PDF_POOL_MAX_WORKERS,
+            mp_context=multiprocessing.get_context(_PDF_POOL_START_METHOD),
+        )
+    return _PDF_POOL
+
+
+def shutdown_pdf_pool():
+    """Stop the PDF worker processes (called at app shutdown); the next parse recreates the pool"""
+    global _PDF_POOL
+    pool, _PDF_POOL = _PDF_POOL, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _load_and_chunk(file_path: str):
+    # Top-level so it can be pickled into a worker process
+    return _chunk_documents(_load_documents(file_path))
+
+
+def _file_digest(file_path: str) -> str:
+    with open(file_path, "rb") as handle:
+        return hashlib.file_digest(handle, "sha256").hexdigest()
+
+
+@lru_cache(maxsize=CHUNK_CACHE_SIZE)
+def _stat_digest(file_path: str, mtime_ns: int, size: int) -> str:
+    # An unchanged (mtime, size) means the file was not rewritten; skip re-hashing it
+    return _file_digest(file_path)
+
+
+def clear_chunk_cache():
+    """Forget parsed chunks and file digests (used when a report is force re-downloaded)"""
+    _stat_digest.cache_clear()
+    _CHUNK_CACHE.clear()
+
+
+async def _aload_chunks(file_path: str):
+    """
+    Load and chunk a report without blocking the event loop. PDF/DOCX parsing runs in
+    the process pool; results are cached by content hash so retries skip the parse.
+    """
+    stat = os.stat(file_path)
+    digest = _stat_digest(file_path, stat.st_mtime_ns, stat.st_size)
+    cached = _CHUNK_CACHE.get(digest)
+    if cached is not None:
+        _CHUNK_CACHE.move_to_end(digest)
+        return cached
+
+    if os.path.splitext(file_path)[1].lower() in _POOLED_EXTENSIONS:
+        loop = asyncio.get_running_loop()
+        chunks = await loop.run_in_executor(_pdf_pool(), _load_and_chunk, file_path)
+    else:
+        chunks = _load_and_chunk(file_path)
+
+    _CHUNK_CACHE[digest] = chunks
+    if len(_CHUNK_CACHE) > CHUNK_CACHE_SIZE:
+        _CHUNK_CACHE.popitem(last=False)
+    return chunks
+
+
+async def _amap_reduce(
+    llm,
+    chunks,
+    concurrency: int = MAP_CONCURRENCY,
+    max_chars: int = REDUCE_MAX_CHARS,
+    dedup: bool = True,
+) -> str:
+    """
+    Map every chunk concurrently (bounded by max_concurrency), optionally drop duplicate
+    sentences across map outputs, collapse them while they exceed the reduce budget,
+    then run a single reduce call.
+    """
+    summaries = await _asummarize_texts(llm, _MAP_PROMPT, [chunk.page_content for chunk in chunks], concurrency)
+    if dedup:
+        summaries = _dedupe_sentences(summaries) or summaries
+    while len(summaries) > 1 and sum(len(s) for s in summaries) > max_chars:
+        groups = _group_by_size(summaries, max_chars)
+        if len(groups) == len(summaries):
+            break  # each summary alone fills the budget; collapsing cannot shrink the count
+        summaries = await _asummarize_texts(
+            llm, _REDUCE_PROMPT, ["\n\n".join(group) for group in groups], concurrency
+        )
+
+    return _text_of(await llm.ainvoke(_REDUCE_PROMPT.format(text="\n\n".join(summaries))))
+
+
+async def _asummarize_file(file_path: str, llm_model: str, dedup: bool):
+    chunks = await _aload_chunks(file_path)
+
+    if PromptTemplate is None:
+        raise QuarterlyReportSummaryError("Summarize chain is not available", status_code=500)
+
+    llm = _llm_from_env(llm_model)
+    return chunks, await _amap_reduce(llm, chunks, dedup=dedup)
+
+
 def summarize_quarterly_report(
     ticker: str,
     report_year: Optional[int],
@@ -69,6 +286,7 @@ def summarize_quarterly_report(
     report_type: str = "F01",
     force: bool = False,
     llm_model: str = DEFAULT_SUMMARY_MODEL,
+    dedup: bool = True,
 ) -> QuarterlyReportSummaryResponse:
     try:
         report_info = download_quarterly_financial_report(
@@ -81,15 +299,9 @@ def summarize_quarterly_report(
     except QuarterlyReportDownloadError as exc:
         raise QuarterlyReportSummaryError(exc.message, exc.status_code) from exc
 
-    documents = _load_documents(report_info.file_path)
-    chunks = _chunk_documents(documents)
-
-    if load_summarize_chain is None:
-        raise QuarterlyReportSummaryError("Summarize chain is not available", status_code=500)
-
-    llm = _llm_from_env(llm_model)
-    chain = load_summarize_chain(llm, chain_type="map_reduce")
-    summary = chain.run(chunks)
+    if force:
+        clear_chunk_cache()
+    chunks, summary = asyncio.run(_asummarize_file(report_info.file_path, llm_model, dedup))
 
     return QuarterlyReportSummaryResponse(
         status="ok",
@@ -1,33 +1,372 @@
 import shioaji as sj
+import atexit
 import threading
 import time
 import sys
+import itertools
+import logging
+import logging.handlers
+import queue
+import random
+import re
 import os
-from datetime import datetime, timedelta
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, time as dtime
+
+import numpy as np
+
+from app.services.calendar_service import is_trading_day
+
+# Warnings raised on the broker callback / tick consumer threads. Records are queued and
+# written by a listener thread, so a slow or blocked stdout never stalls the quote feed.
+feed_logger = logging.getLogger(f"{__name__}.feed")
+feed_logger.setLevel(logging.WARNING)
+feed_logger.propagate = False
+_FEED_LOG_QUEUE = queue.SimpleQueue()
+feed_logger.addHandler(logging.handlers.QueueHandler(_FEED_LOG_QUEUE))
+
+
+class _PrintHandler(logging.Handler):
+    """Writes records to the current sys.stdout exactly like the print calls around them"""
+
+    def emit(self, record):
+        print(self.format(record))
+
+
+_FEED_LOG_LISTENER = logging.handlers.QueueListener(_FEED_LOG_QUEUE, _PrintHandler())
+_FEED_LOG_LISTENER.start()
+atexit.register(_FEED_LOG_LISTENER.stop)  # flush queued warnings on exit
+
+HISTORY_CAPACITY = 600
+# Tick windows whose volume totals the strategy reads every signal
+VOLUME_SUM_WINDOWS = (30, 60)
+
+
+class TickRing:
+    """
+    Fixed-capacity ring of ticks stored as parallel NumPy arrays (price, volume, time).
+    Appending writes slots in place instead of allocating a dict per tick;
+    readers get the newest n values oldest-first via last_prices/last_volumes.
+    Each array is twice the capacity and every tick is written to slot i and its
+    mirror i + capacity, so any window of up to `capacity` ticks is one contiguous
+    view, also across the wrap point.
+    Volume sums over the `sum_windows` tick counts are kept up to date on append
+    (add the new tick, drop the one leaving the window), so volume_sum(n) for those
+    windows is a lookup rather than a reduction.
+    """
+
+    __slots__ = ("capacity", "prices", "volumes", "timestamps", "write_idx", "generation", "_volume_sums")
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY, sum_windows=VOLUME_SUM_WINDOWS):
+        self.capacity = capacity
+        self.prices = np.zeros(2 * capacity, dtype=np.float64)
+        self.volumes = np.zeros(2 * capacity, dtype=np.int64)
+        self.timestamps = np.zeros(2 * capacity, dtype="datetime64[ns]")
+        self.write_idx = 0
+        self.generation = 0  # bumped by clear(), so (generation, write_idx) identifies the contents
+        self._volume_sums = {window: 0 for window in sum_windows if 0 < window < capacity}
+
+    def __len__(self) -> int:
+        return min(self.write_idx, self.capacity)
+
+    def append(self, price: float, volume: int, timestamp=None):
+        capacity = self.capacity
+        i = self.write_idx % capacity
+        j = i + capacity
+        self.prices[i] = self.prices[j] = price
+        self.volumes[i] = self.volumes[j] = volume
+        self.timestamps[i] = self.timestamps[j] = (
+            timestamp if isinstance(timestamp, datetime) else np.datetime64("NaT")
+        )
+        write_idx = self.write_idx
+        sums = self._volume_sums
+        for window in sums:
+            # Slot j - window holds the tick that just left this window (zeros before it fills)
+            evicted = int(self.volumes[j - window]) if write_idx >= window else 0
+            sums[window] += volume - evicted
+        self.write_idx = write_idx + 1
+
+    def clear(self):
+        self.write_idx = 0
+        self.generation += 1
+        for window in self._volume_sums:
+            self._volume_sums[window] = 0
+
+    def volume_sum(self, n: int) -> int:
+        """Total volume of the newest n ticks"""
+        total = self._volume_sums.get(n)
+        if total is not None and n <= len(self):
+            return total
+        return int(self.last_volumes(n).sum())
+
+    def _window(self, column: np.ndarray, n: int) -> np.ndarray:
+        n = min(n, len(self))
+        end = self.write_idx % self.capacity + self.capacity
+        return column[end - n:end]  # always a contiguous view, no copy
+
+    def price_at(self, k: int) -> float:
+        """Price k ticks back (k=1 is the newest); k must be in 1..len(self)"""
+        return float(self.prices[self.write_idx % self.capacity + self.capacity - k])
+
+    def prices_at(self, ks: np.ndarray) -> np.ndarray:
+        """Vectorized price_at: one gather for several look-back offsets"""
+        return self.prices[self.write_idx % self.capacity + self.capacity - ks]
+
+    def last_prices(self, n: int) -> np.ndarray:
+        return self._window(self.prices, n)
+
+    def last_volumes(self, n: int) -> np.ndarray:
+        return self._window(self.volumes, n)
+
+    def get_history(self, n: int = HISTORY_CAPACITY):
+        """Newest n ticks as (prices, volumes, timestamps), oldest first"""
+        return self.last_prices(n), self.last_volumes(n), self._window(self.timestamps, n)
+
+
+class SPSCRing:
+    """
+    Single-producer ring with drop-oldest semantics for the quote stream.
+    The tick thread is the only writer: it fills one slot and then publishes it by
+    bumping head, so it never takes a lock. Readers copy the newest slots and drop
+    any the producer overwrote while they were copying. One spare slot keeps the
+    slot being written outside the readable window.
+    """
+
+    __slots__ = ("maxlen", "_size", "_buf", "head")
+
+    def __init__(self, capacity: int = 100):
+        self.maxlen = capacity
+        self._size = capacity + 1
+        self._buf = [None] * self._size
+        self.head = 0
+
+    def push(self, item):
+        head = self.head
+        self._buf[head % self._size] = item
+        self.head = head + 1
+
+    append = push
+
+    def __len__(self) -> int:
+        return min(self.head, self.maxlen)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __getitem__(self, index):
+        return self.snapshot()[index]
+
+    def clear(self):
+        self.head = 0
+
+    def snapshot(self, limit: int = None) -> list:
+        """Newest `limit` items (default: all), oldest first, without blocking the producer"""
+        head = self.head
+        n = min(head, self.maxlen if limit is None else min(limit, self.maxlen))
+        start = head - n
+        buf, size = self._buf, self._size
+        items = [buf[i % size] for i in range(start, head)]
+        overwritten = (self.head - self.maxlen) - start
+        return items[overwritten:] if overwritten > 0 else items
+
+
+class Quote:
+    """One streamed tick; rendered to a dict only when /stream/quotes serves it"""
+
+    __slots__ = ("symbol", "price", "volume", "ts", "exchange")
+
+    def __init__(self, symbol, price, volume, ts, exchange):
+        self.symbol = symbol
+        self.price = price
+        self.volume = volume
+        self.ts = ts
+        self.exchange = exchange
+
+    def as_dict(self) -> dict:
+        ts = self.ts
+        return {
+            "symbol": self.symbol,
+            "price": self.price,
+            "volume": self.volume,
+            "timestamp": ts.isoformat() if hasattr(ts, 'isoformat') else str(ts),
+            "exchange": str(self.exchange) if self.exchange else "UNKNOWN"
+        }
+
+
+RSI_PERIOD = 14
+
+
+class WilderRSI:
+    """
+    RSI with Wilder smoothing, updated once per tick in O(1).
+    The first `period` changes seed the averages with a plain mean; after that
+    avg = (avg * (period - 1) + change) / period.
+    """
+
+    __slots__ = ("period", "avg_gain", "avg_loss", "prev_price", "count")
+
+    def __init__(self, period: int = RSI_PERIOD):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.prev_price = None
+        self.count = 0
+
+    def update(self, price: float):
+        prev = self.prev_price
+        self.prev_price = price
+        if prev is None:
+            return
+        change = price - prev
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        count = self.count + 1
+        self.count = count
+        n = count if count < self.period else self.period
+        self.avg_gain += (gain - self.avg_gain) / n
+        self.avg_loss += (loss - self.avg_loss) / n
+
+    def value(self) -> float:
+        if self.avg_loss == 0:
+            return 50.0 if self.avg_gain == 0 else 100.0
+        return 100 - (100 / (1 + self.avg_gain / self.avg_loss))
+
+
+class LatestTick:
+    """Most recent tick (price, volume, timestamp), overwritten in place by the tick handler"""
+    __slots__ = ("price", "volume", "timestamp")
+
+    def __init__(self, price: float = 0.0, volume: int = 0, timestamp=None):
+        self.price = price
+        self.volume = volume
+        self.timestamp = timestamp
+
+
+class SessionStats:
+    """Session open/high/low, updated in place by the tick handler"""
+    __slots__ = ("open", "high", "low")
+
+    def __init__(self, open=None, high=None, low=None):
+        self.open = open
+        self.high = high
+        self.low = low
+
+    def reset(self):
+        self.open = self.high = self.low = None
+
 
 # Global state for market data (shared with strategies)
 # In a cleaner architecture, this might be in a separate MarketDataService
-latest_tick = {"price": 0, "volume": 0, "timestamp": None}
-price_history = deque(maxlen=600)
-volume_history = deque(maxlen=600)
-session_open_price = None
-session_high = None
-session_low = None
-streaming_quotes = deque(maxlen=100)
-streaming_quotes_lock = threading.Lock()
+latest_tick = LatestTick()
+price_history = TickRing(HISTORY_CAPACITY)
+volume_history = price_history  # volumes are stored alongside prices in the same ring
+session_stats = SessionStats()
+rsi_state = WilderRSI(RSI_PERIOD)
+streaming_quotes = SPSCRing(100)
+ORDER_BOOK_DEPTH = 5
+_EMPTY_PX = np.empty(0, dtype=np.float64)
+_EMPTY_VOL = np.empty(0, dtype=np.int64)
+
+# Top-of-book levels kept as parallel price/volume arrays (best level first);
+# rendered to dicts only when served, see order_book_levels
 order_book = {
-    "bids": [],
-    "asks": [],
+    "bid_px": _EMPTY_PX,
+    "bid_vol": _EMPTY_VOL,
+    "ask_px": _EMPTY_PX,
+    "ask_vol": _EMPTY_VOL,
     "timestamp": None,
     "symbol": None
 }
 order_book_lock = threading.Lock()
 
+
+def _book_side(prices, volumes, descending: bool):
+    """Drop empty levels and return the best ORDER_BOOK_DEPTH (prices, volumes)"""
+    px = np.atleast_1d(np.asarray(prices, dtype=np.float64))
+    vol = np.atleast_1d(np.asarray(volumes, dtype=np.int64))
+    n = min(px.size, vol.size)
+    px, vol = px[:n], vol[:n]
+    mask = (px > 0) & (vol > 0)
+    px, vol = px[mask], vol[mask]
+    order = np.argsort(-px if descending else px, kind="stable")[:ORDER_BOOK_DEPTH]
+    return px[order], vol[order]
+
+
+def order_book_levels(prices, volumes) -> list:
+    """Render one side of the book as [{"price", "volume"}, ...] for API responses"""
+    return [{"price": p, "volume": v} for p, v in zip(prices.tolist(), volumes.tolist())]
+
+# Shioaji errors after which the API instance itself is suspect and must be recreated
+_AUTH_ERROR_NAMES = frozenset({"TokenError", "AccountError", "AccountNotSignError", "AccountNotProvideError", "CaError"})
+
+
+# Broker rejections show up in op_msg rather than as exceptions
+_ORDER_ERR_RE = re.compile(r"不足|error", re.IGNORECASE)
+
+
+def _parse_trade_result(trade, mode: str, unit: str) -> dict:
+    """Turn a Shioaji trade into the bridge order response, reading each attribute once"""
+    try:
+        status = trade.status
+        operation = trade.operation
+        op_msg = (operation.op_msg or "") if operation else ""
+        order_quantity = status.order_quantity
+        order_id = status.id
+    except AttributeError:
+        # Missing status (or status without fill fields) means the ack is unusable
+        return {"status": "error", "error": "Invalid order response"}
+
+    # Check for error messages in the operation
+    if op_msg and _ORDER_ERR_RE.search(op_msg):
+        print(f"❌ Order failed: {op_msg}")
+        return {"status": "error", "error": op_msg}
+
+    # Check if any quantity was actually filled
+    if order_quantity == 0:
+        print(f"❌ Order failed: No {unit} filled (order_quantity=0)")
+        return {"status": "error", "error": "Order not filled"}
+
+    return {"status": "filled", "order_id": order_id, "mode": mode}
+
+
+# Order enums resolved once at import instead of walking sj.constant on every order
+_ACTION_BUY = sj.constant.Action.Buy
+_ACTION_SELL = sj.constant.Action.Sell
+_STOCK_LMT = sj.constant.StockPriceType.LMT
+_FUTURES_LMT = sj.constant.FuturesPriceType.LMT
+_ROD = sj.constant.OrderType.ROD
+_LOT_COMMON = sj.constant.StockOrderLot.Common
+_LOT_ODD = sj.constant.StockOrderLot.Odd
+
+# Ticks buffered between the broker callback and the consumer thread; oldest dropped on overflow
+TICK_QUEUE_SIZE = 4096
+
+# Day-session hours (exchange local time) per mode; a silent feed inside them means a stalled connection
+_TICK_SESSIONS = {
+    "stock": (dtime(9, 0), dtime(13, 30)),
+    "futures": (dtime(8, 45), dtime(13, 45)),
+}
+
+# Upper bound on concurrent place_order calls for one batch
+BATCH_ORDER_WORKERS = 8
+
+# Simulated account returned by get_account_info in simulation mode
+_SIM_ACCT = {
+    "equity": 100000.0,  # Simulated equity
+    "available_margin": 50000.0,  # Simulated margin
+    "status": "ok"
+}
+
+
 class ShioajiWrapper:
     """
     Shioaji wrapper with auto-reconnect capability and dual-mode support.
-    Retries login + subscription up to 5 times with exponential backoff.
+    Retries login + subscription up to 5 times with jittered, capped exponential backoff.
+    Retry limits can be overridden under shioaji.reconnect in application.yml.
     
     Modes:
     - "stock": Uses api.Contracts.Stocks.TSE["2454"] for 2454.TW odd lots
@@ -36,6 +375,13 @@ class ShioajiWrapper:
     
     MAX_RETRIES = 5
     BASE_BACKOFF_SECONDS = 2
+    MAX_BACKOFF_SECONDS = 60
+    JITTER = (0.5, 1.5)
+    # A quiet but healthy feed can go a minute without a trade on a thin contract
+    WATCHDOG_STALE_SECONDS = 120
+    WATCHDOG_INTERVAL_SECONDS = 2
+    # Consecutive watchdog logins with no tick in between before it stops trying
+    WATCHDOG_MAX_RECONNECTS = 3
     
     def __init__(self, config, trading_mode="stock"):
         self.config = config
@@ -44,8 +390,32 @@ class ShioajiWrapper:
         self.contract = None  # Generic contract (stock or futures)
         self.mtxf_contract = None  # Legacy alias for backwards compat
         self.connected = False
-        self._lock = threading.Lock()
+        self._contracts_loaded = False  # True once a login on self.api has fetched contracts
+        self._reconnect_lock = threading.Lock()  # held by the one thread running a reconnect
         self._callback_ref = None  # Keep callback alive
+        # Broker thread appends tick snapshots, the consumer thread pops them (deque ops are atomic)
+        self._tick_q = deque(maxlen=TICK_QUEUE_SIZE)
+        self._tick_ready = threading.Event()
+        self._tick_thread = None
+        self._tick_stop = threading.Event()  # set by logout() to end the consumer thread
+        self._last_tick_mono = None  # monotonic time of the last tick (or of the last successful connect)
+        self._watchdog_thread = None
+        self._watchdog_stop = threading.Event()
+        # Simulation flag is fixed for the wrapper's lifetime; cache it for the order path
+        self._sim = bool(config['shioaji'].get('simulation', False))
+        self._sim_id_counter = itertools.count(1)
+        self._stats = session_stats
+        self._rsi = rsi_state
+        reconnect = config['shioaji'].get('reconnect') or {}
+        self.MAX_RETRIES = int(reconnect.get('max-retries', self.MAX_RETRIES))
+        self.BASE_BACKOFF_SECONDS = reconnect.get('base-backoff-seconds', self.BASE_BACKOFF_SECONDS)
+        self.MAX_BACKOFF_SECONDS = reconnect.get('max-backoff-seconds', self.MAX_BACKOFF_SECONDS)
+        self.JITTER = tuple(reconnect.get('jitter', self.JITTER))
+        watchdog = config['shioaji'].get('watchdog') or {}
+        self._watchdog_enabled = bool(watchdog.get('enabled', True))
+        self.WATCHDOG_STALE_SECONDS = watchdog.get('stale-seconds', self.WATCHDOG_STALE_SECONDS)
+        self.WATCHDOG_INTERVAL_SECONDS = watchdog.get('interval-seconds', self.WATCHDOG_INTERVAL_SECONDS)
+        self.WATCHDOG_MAX_RECONNECTS = int(watchdog.get('max-reconnects', self.WATCHDOG_MAX_RECONNECTS))
         print(f"📈 ShioajiWrapper initialized in {trading_mode.upper()} mode")
         
     def connect(self) -> bool:
@@ -54,8 +424,10 @@ class ShioajiWrapper:
             try:
                 print(f"🔄 Shioaji connection attempt {attempt}/{self.MAX_RETRIES}...")
                 
-                # Create fresh API instance
-                self.api = sj.Shioaji()
+                # Reuse the existing API instance (keeps loaded contracts); create one only when needed
+                if self.api is None:
+                    self.api = sj.Shioaji()
+                    self._contracts_loaded = False
                 
                 # Select credentials based on mode
                 if self.trading_mode == "stock":
@@ -63,12 +435,19 @@ class ShioajiWrapper:
                 else:
                     creds = self.config['shioaji'].get('future', {})
 
-                # Login
-                self.api.login(
-                    api_key=creds.get('api-key'),
-                    secret_key=creds.get('secret-key'),
-                    contracts_cb=lambda security_type: print(f"✅ Contracts loaded: {security_type}")
-                )
+                # Login; login() downloads contracts by default, which a reused instance already holds
+                if self._contracts_loaded:
+                    self.api.login(
+                        api_key=creds.get('api-key'),
+                        secret_key=creds.get('secret-key'),
+                        fetch_contract=False
+                    )
+                else:
+                    self.api.login(
+                        api_key=creds.get('api-key'),
+                        secret_key=creds.get('secret-key'),
+                        contracts_cb=lambda security_type: print(f"✅ Contracts loaded: {security_type}")
+                    )
                 
                 # Activate CA
                 self.api.activate_ca(
@@ -77,7 +456,7 @@ class ShioajiWrapper:
                     person_id=self.config['shioaji']['person-id']
                 )
                 
-                mode = "📄 Paper trading" if self.config['shioaji']['simulation'] else "💰 LIVE TRADING"
+                mode = "📄 Paper trading" if self._sim else "💰 LIVE TRADING"
                 print(f"{mode} mode activated")
                 
                 # Subscribe based on trading mode
@@ -87,13 +466,18 @@ class ShioajiWrapper:
                     self._subscribe_futures()
                 
                 self.connected = True
+                self._contracts_loaded = True
+                self._last_tick_mono = time.monotonic()
+                self._start_watchdog()
                 return True
                 
             except Exception as e:
                 print(f"❌ Connection attempt {attempt} failed: {e}")
+                if e.__class__.__name__ in _AUTH_ERROR_NAMES:
+                    self.api = None  # session/credentials rejected: start from a fresh instance
                 if attempt < self.MAX_RETRIES:
-                    backoff = self.BASE_BACKOFF_SECONDS ** attempt
-                    print(f"⏳ Waiting {backoff}s before retry...")
+                    backoff = self._backoff_delay(attempt)
+                    print(f"⏳ Waiting {backoff:.1f}s before retry...")
                     time.sleep(backoff)
                 else:
                     print("❌ All connection attempts failed!")
@@ -101,6 +485,118 @@ class ShioajiWrapper:
         
         return False
     
+    def _start_watchdog(self):
+        if not self._watchdog_enabled:
+            return
+        if self._watchdog_thread is None or not self._watchdog_thread.is_alive():
+            self._watchdog_stop.clear()
+            self._watchdog_thread = threading.Thread(target=self._watchdog_loop, name="tick-watchdog", daemon=True)
+            self._watchdog_thread.start()
+    
+    def _watchdog_loop(self):
+        """
+        Reconnect when the feed goes silent during the session without raising anything.
+        Each consecutive watchdog reconnect doubles the silence required before the next,
+        and after WATCHDOG_MAX_RECONNECTS it waits for a tick instead of logging in again,
+        so a long lull never turns into a login every few seconds.
+        """
+        stop = self._watchdog_stop
+        strikes = 0
+        reconnected_at = None  # _last_tick_mono right after our last reconnect
+        while not stop.wait(self.WATCHDOG_INTERVAL_SECONDS):
+            if reconnected_at is not None and self._last_tick_mono != reconnected_at:
+                strikes, reconnected_at = 0, None  # ticks are flowing again
+            if strikes >= self.WATCHDOG_MAX_RECONNECTS:
+                continue
+            stale = self.WATCHDOG_STALE_SECONDS * (2 ** strikes)
+            if self._feed_stalled(time.monotonic(), datetime.now(), stale):
+                strikes += 1
+                print(f"⚠️ No ticks for {stale}s during the session, reconnecting "
+                      f"({strikes}/{self.WATCHDOG_MAX_RECONNECTS})...")
+                self.reconnect()  # single-flight: coalesces with order-path reconnects
+                reconnected_at = self._last_tick_mono
+                if strikes >= self.WATCHDOG_MAX_RECONNECTS:
+                    print("⚠️ Feed still silent after watchdog reconnects; waiting for ticks to resume")
+    
+    def _feed_stalled(self, now_mono: float, now: datetime, stale_seconds: float = None) -> bool:
+        """
+        True when connected, at least WATCHDOG_STALE_SECONDS into the mode's day
+        session on a trading day, and no tick has arrived for stale_seconds
+        (default WATCHDOG_STALE_SECONDS).
+        """
+        if stale_seconds is None:
+            stale_seconds = self.WATCHDOG_STALE_SECONDS
+        last = self._last_tick_mono
+        if not self.connected or last is None or now_mono - last <= stale_seconds:
+            return False
+        start, end = _TICK_SESSIONS.get(self.trading_mode, _TICK_SESSIONS["stock"])
+        session_start = datetime.combine(now.date(), start)
+        if not (session_start + timedelta(seconds=self.WATCHDOG_STALE_SECONDS) <= now
+                and now.time() <= end):
+            return False
+        return is_trading_day(now.date())
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential delay capped at MAX_BACKOFF_SECONDS, jittered so restarted clients don't retry in lockstep"""
+        raw = self.BASE_BACKOFF_SECONDS * (2 ** (attempt - 1))
+        return min(self.MAX_BACKOFF_SECONDS, raw) * random.uniform(*self.JITTER)
+    
+    def _make_tick_callback(self):
+        """
+        Tick callback for the broker's network thread: snapshot the fields we use
+        into a tuple and queue it. Parsing, history, RSI and stats updates run on
+        the consumer thread, so a slow step never backs up the broker socket.
+        """
+        queue_append = self._tick_q.append
+        wake_consumer = self._tick_ready.set
+        self._start_tick_consumer()
+        
+        def enqueue_tick(exchange, tick):
+            try:
+                item = (exchange, tick.close, tick.volume, getattr(tick, 'datetime', None) or datetime.now())
+            except Exception:
+                # Malformed tick: drop it, never raise into the broker's thread
+                return
+            queue_append(item)
+            wake_consumer()
+        
+        return enqueue_tick
+    
+    def _start_tick_consumer(self):
+        if self._tick_thread is None or not self._tick_thread.is_alive():
+            self._tick_stop.clear()
+            self._tick_thread = threading.Thread(target=self._tick_consumer, name="tick-consumer", daemon=True)
+            self._tick_thread.start()
+    
+    def _tick_consumer(self):
+        """Drain queued ticks, then sleep until the callback signals new ones; exits after logout()"""
+        tick_q = self._tick_q
+        ready = self._tick_ready
+        stop = self._tick_stop
+        while not stop.is_set():
+            self.drain_ticks()
+            ready.clear()
+            # Re-check after clearing: a tick queued in between has already set the event
+            if not tick_q and not stop.is_set():
+                ready.wait()
+    
+    def drain_ticks(self) -> int:
+        """Process queued ticks in arrival order; returns how many were taken off the queue"""
+        pop = self._tick_q.popleft
+        process = self._process_tick
+        handled = 0
+        while True:
+            try:
+                item = pop()
+            except IndexError:
+                return handled
+            handled += 1
+            try:
+                process(*item)
+            except Exception as e:
+                # Log but keep consuming - one bad tick must not stop the stream
+                feed_logger.warning("⚠️ Tick processing failed (recovered): %s", e)
+    
     def _subscribe_stock(self):
         """Subscribe to 2454.TW (MediaTek) for stock mode"""
         self.contract = self.api.Contracts.Stocks.TSE["2454"]
@@ -111,13 +607,7 @@ class ShioajiWrapper:
         )
         
         # Register tick handler
-        def safe_tick_handler(exchange, tick):
-            try:
-                self._handle_tick(exchange, tick)
-            except Exception as e:
-                print(f"⚠️ Tick callback crashed (recovered): {e}")
-        
-        self._callback_ref = safe_tick_handler
+        self._callback_ref = self._make_tick_callback()
         self.api.quote.set_on_tick_stk_v1_callback(self._callback_ref)
         
         print(f"✅ Subscribed to {self.contract.symbol} (STOCK mode)")
@@ -133,13 +623,7 @@ class ShioajiWrapper:
         )
         
         # Register tick handler
-        def safe_tick_handler(exchange, tick):
-            try:
-                self._handle_tick(exchange, tick)
-            except Exception as e:
-                print(f"⚠️ Tick callback crashed (recovered): {e}")
-        
-        self._callback_ref = safe_tick_handler
+        self._callback_ref = self._make_tick_callback()
         self.api.quote.set_on_tick_fop_v1_callback(self._callback_ref)
         
         print(f"✅ Subscribed to {self.contract.symbol} (FUTURES mode)")
@@ -160,7 +644,7 @@ class ShioajiWrapper:
                     try:
                         self._handle_bidask(exchange, bidask)
                     except Exception as e:
-                        print(f"⚠️ BidAsk callback crashed (recovered): {e}")
+                        feed_logger.warning("⚠️ BidAsk callback crashed (recovered): %s", e)
                 
                 self._bidask_callback_ref = safe_bidask_handler
                 self.api.quote.set_on_bidask_stk_v1_callback(self._bidask_callback_ref)
@@ -169,7 +653,7 @@ class ShioajiWrapper:
                     try:
                         self._handle_bidask(exchange, bidask)
                     except Exception as e:
-                        print(f"⚠️ BidAsk callback crashed (recovered): {e}")
+                        feed_logger.warning("⚠️ BidAsk callback crashed (recovered): %s", e)
                 
                 self._bidask_callback_ref = safe_bidask_handler
                 self.api.quote.set_on_bidask_fop_v1_callback(self._bidask_callback_ref)
@@ -185,102 +669,97 @@ class ShioajiWrapper:
         global order_book, order_book_lock
         
         try:
-            # Extract bid/ask prices and volumes
-            bids = []
-            asks = []
-            
             # Shioaji returns bid/ask as lists of prices and volumes
             if hasattr(bidask, 'bid_price') and hasattr(bidask, 'bid_volume'):
-                bid_prices = bidask.bid_price if isinstance(bidask.bid_price, list) else [bidask.bid_price]
-                bid_volumes = bidask.bid_volume if isinstance(bidask.bid_volume, list) else [bidask.bid_volume]
-                
-                for price, vol in zip(bid_prices, bid_volumes):
-                    if price and vol:
-                        bids.append({"price": float(price), "volume": int(vol)})
+                bid_px, bid_vol = _book_side(bidask.bid_price, bidask.bid_volume, descending=True)
+            else:
+                bid_px, bid_vol = _EMPTY_PX, _EMPTY_VOL
             
             if hasattr(bidask, 'ask_price') and hasattr(bidask, 'ask_volume'):
-                ask_prices = bidask.ask_price if isinstance(bidask.ask_price, list) else [bidask.ask_price]
-                ask_volumes = bidask.ask_volume if isinstance(bidask.ask_volume, list) else [bidask.ask_volume]
-                
-                for price, vol in zip(ask_prices, ask_volumes):
-                    if price and vol:
-                        asks.append({"price": float(price), "volume": int(vol)})
+                ask_px, ask_vol = _book_side(bidask.ask_price, bidask.ask_volume, descending=False)
+            else:
+                ask_px, ask_vol = _EMPTY_PX, _EMPTY_VOL
             
             timestamp = getattr(bidask, 'datetime', datetime.now())
             
             # Thread-safe update of order book
             with order_book_lock:
-                order_book["bids"] = sorted(bids, key=lambda x: x["price"], reverse=True)[:5]
-                order_book["asks"] = sorted(asks, key=lambda x: x["price"])[:5]
+                order_book["bid_px"] = bid_px
+                order_book["bid_vol"] = bid_vol
+                order_book["ask_px"] = ask_px
+                order_book["ask_vol"] = ask_vol
                 order_book["timestamp"] = timestamp.isoformat() if hasattr(timestamp, 'isoformat') else str(timestamp)
                 order_book["symbol"] = self.contract.symbol
                 
         except Exception as e:
-            print(f"⚠️ Order book handler error (non-fatal): {e}")
+            feed_logger.warning("⚠️ Order book handler error (non-fatal): %s", e)
     
     def reconnect(self) -> bool:
-        """Force reconnect (called when connection is lost)"""
-        with self._lock:
+        """
+        Force reconnect (called when connection is lost).
+        Single-flight: if another thread is already reconnecting, wait for that
+        attempt and return its outcome instead of starting a second login.
+        """
+        lock = self._reconnect_lock
+        if not lock.acquire(blocking=False):
+            with lock:  # released when the in-flight attempt finishes
+                return self.connected
+        try:
             print("🔄 Reconnecting to Shioaji...")
             self.connected = False
-            try:
-                if self.api:
-                    self.api.logout()
-            except:
-                pass
+            # No logout: login on the existing instance reuses its session and contracts
             return self.connect()
+        finally:
+            lock.release()
     
     def _handle_tick(self, exchange, tick):
-        """Internal tick handler - updates global market data with crash protection"""
+        """
+        Process one tick synchronously on the calling thread.
+        The registered broker callback queues ticks for _process_tick instead, see _make_tick_callback.
+        """
+        # Defensive checks to prevent segfaults (None or malformed tick)
         try:
-            global session_open_price, session_high, session_low, streaming_quotes, streaming_quotes_lock
-            
-            # Defensive checks to prevent segfaults
-            if not tick or not hasattr(tick, 'close') or not hasattr(tick, 'volume'):
-                return
-            
-            price = float(tick.close) if tick.close is not None else 0.0
-            volume = tick.volume if tick.volume is not None else 0
-            timestamp = getattr(tick, 'datetime', datetime.now())
+            close = tick.close
+            volume = tick.volume
+        except AttributeError:
+            return
+        self._process_tick(exchange, close, volume, getattr(tick, 'datetime', None) or datetime.now())
+    
+    def _process_tick(self, exchange, close, volume, timestamp):
+        """Update global market data from one tick snapshot; straight-line, callers handle errors"""
+        self._last_tick_mono = time.monotonic()  # liveness for the watchdog
+        price = float(close) if close is not None else 0.0
+        if volume is None:
+            volume = 0
+        
+        latest = latest_tick
+        latest.price = price
+        latest.volume = volume
+        latest.timestamp = timestamp
+        
+        if price > 0:  # Only process valid prices
+            price_history.append(price, volume, timestamp)
+            self._rsi.update(price)
             
-            # Thread-safe updates with error handling
-            latest_tick["price"] = price
-            latest_tick["volume"] = volume
-            latest_tick["timestamp"] = timestamp
+            # Add to streaming quotes buffer (lock-free, this thread is the only writer)
+            contract = self.contract
+            streaming_quotes.push(Quote(contract.symbol if contract else "UNKNOWN", price, volume, timestamp, exchange))
             
-            if price > 0:  # Only process valid prices
-                price_history.append({"price": price, "time": timestamp, "volume": volume})
-                volume_history.append(volume)
-                
-                # Add to streaming quotes buffer
-                with streaming_quotes_lock:
-                    streaming_quotes.append({
-                        "symbol": self.contract.symbol if self.contract else "UNKNOWN",
-                        "price": price,
-                        "volume": volume,
-                        "timestamp": timestamp.isoformat() if hasattr(timestamp, 'isoformat') else str(timestamp),
-                        "exchange": str(exchange) if exchange else "UNKNOWN"
-                    })
-                
-                if session_open_price is None:
-                    session_open_price = price
-                    session_high = price
-                    session_low = price
-                else:
-                    session_high = max(session_high, price)
-                    session_low = min(session_low, price)
-        except Exception as e:
-            # Log but don't crash - this prevents segfaults from propagating
-            print(f"⚠️ Tick handler error (non-fatal): {e}")
+            stats = self._stats
+            if stats.open is None:
+                stats.open = stats.high = stats.low = price
+            elif price > stats.high:
+                stats.high = price
+            elif price < stats.low:
+                stats.low = price
     
     def place_order(self, action: str, quantity: int, price: float):
         """Place order with account validation and error handling - mode-aware"""
         # 🚨 CRITICAL: Check simulation mode first - NO REAL ORDERS IN SIMULATION
-        if self.config['shioaji']['simulation']:
+        if self._sim:
             print(f"🎭 SIMULATION MODE: Simulating {action} {quantity} shares @ {price}")
-            # Generate a fake order ID for simulation
-            import uuid
-            fake_order_id = str(uuid.uuid4())[:8]
+            # Generate a fake order ID for simulation (monotonic, unique per wrapper)
+            fake_order_id = f"{next(self._sim_id_counter):08x}"
             return {"status": "filled", "order_id": f"sim-{fake_order_id}", "mode": self.trading_mode}
 
         if not self.connected:
@@ -309,98 +788,143 @@ class ShioajiWrapper:
             print(f"❌ Order failed: {e}")
             return {"status": "error", "error": str(e)}
     
-    def _place_stock_order(self, action: str, quantity: int, price: float):
-        """Place stock order (2454.TW odd lots)"""
-        # Check stock account availability
-        if not hasattr(self.api, 'stock_account') or self.api.stock_account is None:
-            print("⚠️ Stock account not available, reconnecting...")
+    def place_orders_batch(self, orders):
+        """
+        Place several orders at once; returns one response per leg, aligned with `orders`.
+        Each order is a dict with action, quantity and price. Connection, account and
+        balance are checked once for the whole batch, all Order objects are built up
+        front, and the legs are submitted concurrently (Shioaji has no batch order
+        endpoint; place_order waits on the broker without holding the GIL, so threads
+        overlap the round trips).
+        """
+        if not orders:
+            return []
+        if self._sim:
+            return [self.place_order(o["action"], o["quantity"], o["price"]) for o in orders]
+
+        if not self.connected:
             if not self.reconnect():
-                return {"status": "error", "error": "Stock account unavailable"}
+                return [{"status": "error", "error": "Not connected"} for _ in orders]
+
+        try:
+            error = self._account_error()
+            if error is not None:
+                return [dict(error) for _ in orders]
+
+            # Pre-trade balance check once; BUY legs draw down the same available margin in order
+            available = None
+            if any(o["action"] == "BUY" for o in orders):
+                account_info = self.get_account_info()
+                if account_info.get("status") == "ok":
+                    available = account_info.get("available_margin", 0)
+
+            if self.trading_mode == "stock":
+                build, mode, unit = self._stock_order, "stock", "shares"
+            else:
+                build, mode, unit = self._futures_order, "futures", "contracts"
+
+            results = [None] * len(orders)
+            pending = []
+            for i, order in enumerate(orders):
+                action, quantity, price = order["action"], order["quantity"], order["price"]
+                if action == "BUY" and available is not None:
+                    if quantity * price > available:
+                        max_quantity = int(available // price)
+                        if max_quantity <= 0:
+                            results[i] = {"status": "error", "error": "Insufficient funds for purchase"}
+                            continue
+                        print(f"⚠️ Reducing quantity from {quantity} to {max_quantity} due to insufficient funds.")
+                        quantity = max_quantity
+                    available -= quantity * price
+                pending.append((i, build(action, quantity, price)))
+        except Exception as e:
+            print(f"❌ Batch order failed: {e}")
+            return [{"status": "error", "error": str(e)} for _ in orders]
+
+        api = self.api
+        contract = self.contract
 
-        # Determine lot type: round lot (1000 shares) or odd lot
-        if quantity % 1000 == 0:
-            order_lot = sj.constant.StockOrderLot.Common  # Round lot
+        def submit(order_obj):
+            try:
+                return _parse_trade_result(api.place_order(contract, order_obj), mode, unit)
+            except Exception as e:
+                print(f"❌ Order failed: {e}")
+                return {"status": "error", "error": str(e)}
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(BATCH_ORDER_WORKERS, len(pending))) as pool:
+                responses = pool.map(submit, [order_obj for _, order_obj in pending])
+                for (i, _), response in zip(pending, responses):
+                    results[i] = response
+        return results
+    
+    def _account_error(self):
+        """Error response if the trading account for the mode is missing and a reconnect doesn't restore it"""
+        if self.trading_mode == "stock":
+            attr, label = 'stock_account', "Stock"
         else:
-            order_lot = sj.constant.StockOrderLot.Odd    # Odd lot
-        order_obj = self.api.Order(
+            attr, label = 'futopt_account', "Futures"
+        if getattr(self.api, attr, None) is None:
+            print(f"⚠️ {label} account not available, reconnecting...")
+            if not self.reconnect():
+                return {"status": "error", "error": f"{label} account unavailable"}
+        return None
+    
+    def _stock_order(self, action: str, quantity: int, price: float):
+        """Order object for 2454.TW; round lot for multiples of 1000 shares, odd lot otherwise"""
+        api = self.api
+        return api.Order(
             price=price,
             quantity=quantity,  # Integer for stocks
-            action=sj.constant.Action.Buy if action == "BUY" else sj.constant.Action.Sell,
-            price_type=sj.constant.StockPriceType.LMT,
-            order_type=sj.constant.OrderType.ROD,
-            order_lot=order_lot,
-            account=self.api.stock_account
+            action=_ACTION_BUY if action == "BUY" else _ACTION_SELL,
+            price_type=_STOCK_LMT,
+            order_type=_ROD,
+            order_lot=_LOT_COMMON if quantity % 1000 == 0 else _LOT_ODD,
+            account=api.stock_account
         )
+    
+    def _futures_order(self, action: str, quantity: int, price: float):
+        """Order object for MTXF"""
+        api = self.api
+        return api.Order(
+            price=price,
+            quantity=quantity,  # Integer works for futures too
+            action=_ACTION_BUY if action == "BUY" else _ACTION_SELL,
+            price_type=_FUTURES_LMT,
+            order_type=_ROD,
+            account=api.futopt_account
+        )
+    
+    def _place_stock_order(self, action: str, quantity: int, price: float):
+        """Place stock order (2454.TW odd lots)"""
+        # Check stock account availability
+        error = self._account_error()
+        if error is not None:
+            return error
 
-        trade = self.api.place_order(self.contract, order_obj)
+        trade = self.api.place_order(self.contract, self._stock_order(action, quantity, price))
 
         # 🚨 CRITICAL: Check if order actually succeeded
-        if hasattr(trade, 'status') and trade.status:
-            # Check for error messages in the operation
-            if hasattr(trade, 'operation') and trade.operation:
-                op_msg = getattr(trade.operation, 'op_msg', '')
-                if op_msg and ('不足' in op_msg or 'error' in op_msg.lower()):
-                    print(f"❌ Order failed: {op_msg}")
-                    return {"status": "error", "error": op_msg}
-
-            # Check if any quantity was actually filled
-            order_quantity = getattr(trade.status, 'order_quantity', 0)
-            if order_quantity == 0:
-                print(f"❌ Order failed: No shares filled (order_quantity=0)")
-                return {"status": "error", "error": "Order not filled"}
-
-            return {"status": "filled", "order_id": trade.status.id, "mode": "stock"}
-        else:
-            return {"status": "error", "error": "Invalid order response"}
+        return _parse_trade_result(trade, "stock", "shares")
     
     def _place_futures_order(self, action: str, quantity: int, price: float):
         """Place futures order (MTXF)"""
         # Check futures account availability
-        if not hasattr(self.api, 'futopt_account') or self.api.futopt_account is None:
-            print("⚠️ Futures account not available, reconnecting...")
-            if not self.reconnect():
-                return {"status": "error", "error": "Futures account unavailable"}
+        error = self._account_error()
+        if error is not None:
+            return error
 
-        order_obj = self.api.Order(
-            price=price,
-            quantity=quantity,  # Integer works for futures too
-            action=sj.constant.Action.Buy if action == "BUY" else sj.constant.Action.Sell,
-            price_type=sj.constant.FuturesPriceType.LMT,
-            order_type=sj.constant.OrderType.ROD,
-            account=self.api.futopt_account
-        )
-
-        trade = self.api.place_order(self.contract, order_obj)
+        trade = self.api.place_order(self.contract, self._futures_order(action, quantity, price))
 
         # 🚨 CRITICAL: Check if order actually succeeded
-        if hasattr(trade, 'status') and trade.status:
-            # Check for error messages in the operation
-            if hasattr(trade, 'operation') and trade.operation:
-                op_msg = getattr(trade.operation, 'op_msg', '')
-                if op_msg and ('不足' in op_msg or 'error' in op_msg.lower()):
-                    print(f"❌ Order failed: {op_msg}")
-                    return {"status": "error", "error": op_msg}
-
-            # Check if any quantity was actually filled
-            order_quantity = getattr(trade.status, 'order_quantity', 0)
-            if order_quantity == 0:
-                print(f"❌ Order failed: No contracts filled (order_quantity=0)")
-                return {"status": "error", "error": "Order not filled"}
-
-            return {"status": "filled", "order_id": trade.status.id, "mode": "futures"}
-        else:
-            return {"status": "error", "error": "Invalid order response"}
+        return _parse_trade_result(trade, "futures", "contracts")
     
     def get_account_info(self):
         """Get account equity and margin info with error handling - mode-aware"""
         # 🚨 CRITICAL: Return simulated account data in simulation mode
-        if self.config['shioaji']['simulation']:
+        if self._sim:
             print("🎭 SIMULATION MODE: Returning simulated account info")
-            return {
-                "equity": 100000.0,  # Simulated equity
-                "available_margin": 50000.0,  # Simulated margin
-                "status": "ok"
-            }
+            return _SIM_ACCT.copy()
 
         if not self.connected:
             return {"equity": 0, "available_margin": 0, "status": "error", "error": "Not connected"}
@@ -525,7 +1049,7 @@ class ShioajiWrapper:
     
     def _get_stock_account_info(self):
         """Get stock account info"""
-        if not hasattr(self.api, 'stock_account') or self.api.stock_account is None:
+        if getattr(self.api, 'stock_account', None) is None:
             return {"equity": 0, "available_margin": 0, "status": "error", "error": "Stock account not available"}
         
         # For stock accounts, get balance
@@ -550,10 +1074,11 @@ class ShioajiWrapper:
     
     def _get_futures_account_info(self):
         """Get futures account info"""
-        if not hasattr(self.api, 'futopt_account') or self.api.futopt_account is None:
+        account = getattr(self.api, 'futopt_account', None)
+        if account is None:
             return {"equity": 0, "available_margin": 0, "status": "error", "error": "Futures account not available"}
         
-        margin = self.api.margin(self.api.futopt_account)
+        margin = self.api.margin(account)
         equity = float(margin.equity) if hasattr(margin, 'equity') else 0
         available_margin = float(margin.available_margin) if hasattr(margin, 'available_margin') else 0
         
@@ -591,22 +1116,23 @@ class ShioajiWrapper:
     
     def _get_futures_pnl_history(self, days):
         """Get futures P&L history"""
-        if not hasattr(self.api, 'futopt_account') or self.api.futopt_account is None:
+        account = getattr(self.api, 'futopt_account', None)
+        if account is None:
             return {"total_pnl": 0, "days": days, "record_count": 0, "status": "error", "error": "Futures account not available"}
         
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
         
         pnl_records = self.api.list_profit_loss(
-            self.api.futopt_account,
+            account,
             start_date.strftime("%Y-%m-%d"),
             end_date.strftime("%Y-%m-%d")
         )
         
-        total_pnl = 0.0
-        for record in pnl_records:
-            if hasattr(record, 'pnl'):
-                total_pnl += float(record.pnl)
+        total_pnl = float(np.fromiter(
+            (float(record.pnl) for record in pnl_records if hasattr(record, 'pnl')),
+            dtype=np.float64,
+        ).sum())
         
         return {
             "total_pnl": total_pnl,
@@ -618,6 +1144,10 @@ class ShioajiWrapper:
     
     def logout(self):
         """Graceful logout"""
+        self._watchdog_stop.set()
+        # Wake the parked consumer so it sees the stop flag and releases this wrapper
+        self._tick_stop.set()
+        self._tick_ready.set()
         try:
             if self.api:
                 self.api.logout()
@@ -1,47 +1,107 @@
 import os
+from functools import lru_cache
+from typing import Optional, Tuple
+
 import requests
 from app.core.config import decrypt_config_value, load_config_with_decryption
 
+# Reused across messages so the TCP+TLS connection to api.telegram.org stays open
+_SESSION = requests.Session()
+
+# CI never sends Telegram messages; the environment is read once at import
+_TELEGRAM_DISABLED = os.environ.get('CI') == 'true'
+
+
+@lru_cache(maxsize=16)
+def _decrypt_cached(value: str, password: str) -> str:
+    return decrypt_config_value(value, password)
+
+
+def _maybe_decrypt(value, password: str):
+    """Return plaintext values untouched; only ENC(...) values pay for Jasypt key derivation"""
+    if isinstance(value, str) and value.startswith('ENC('):
+        return _decrypt_cached(value, password)
+    return value
+
+
+@lru_cache(maxsize=4)
+def _resolve_telegram(password: str) -> Optional[Tuple[Optional[str], Optional[str], bool]]:
+    """
+    Load application.yml and decrypt the Telegram credentials once per password.
+    Returns (bot_token, chat_id, enabled), or None when there is no telegram section.
+    """
+    config = load_config_with_decryption(password)
+    if 'telegram' not in config:
+        return None
+
+    telegram_config = config['telegram']
+    enabled = telegram_config.get('enabled', True)
+    if not enabled:
+        return None, None, False
+
+    bot_token = _maybe_decrypt(telegram_config.get('bot-token'), password)
+    chat_id = _maybe_decrypt(telegram_config.get('chat-id'), password)
+    return bot_token, chat_id, True
+
+
+def reload_telegram_config():
+    """Drop cached Telegram credentials so the next message re-reads application.yml and CI"""
+    global _TELEGRAM_DISABLED
+    _TELEGRAM_DISABLED = os.environ.get('CI') == 'true'
+    _resolve_telegram.cache_clear()
+    _decrypt_cached.cache_clear()
+
+
+def _build_request(message: str, password: str) -> Optional[Tuple[str, dict]]:
+    """
+    Apply the CI / enabled / credential checks and return (url, payload),
+    or None when the message should not be sent.
+    """
+    # Check if running in CI environment - skip Telegram in CI
+    if _TELEGRAM_DISABLED:
+        print(f"[Telegram disabled in CI] {message[:50]}...")
+        return None
+
+    resolved = _resolve_telegram(password)
+
+    if resolved is None:
+        print("⚠️ Telegram config not found")
+        return None
+
+    # Check if Telegram is enabled in config
+    bot_token, chat_id, enabled = resolved
+    if not enabled:
+        print(f"[Telegram disabled] {message[:50]}...")
+        return None
+
+    if not bot_token or not chat_id:
+        print("⚠️ Telegram credentials missing")
+        return None
+
+    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    payload = {
+        "chat_id": chat_id,
+        "text": message,
+        "parse_mode": "HTML"
+    }
+    return url, payload
+
+
 def send_telegram_message(message: str, password: str):
     """
     Send a Telegram message using credentials from application.yml
     Requires Jasypt password to decrypt bot-token and chat-id
     Respects telegram.enabled flag and CI environment variable
+    Blocks for the HTTP round trip; latency-sensitive callers should use
+    telegram_worker.send_telegram_message_nowait instead.
     """
     try:
-        # Check if running in CI environment - skip Telegram in CI
-        if os.environ.get('CI') == 'true':
-            print(f"[Telegram disabled in CI] {message[:50]}...")
-            return False
-        
-        config = load_config_with_decryption(password)
-        
-        if 'telegram' not in config:
-            print("⚠️ Telegram config not found")
+        request = _build_request(message, password)
+        if request is None:
             return False
-        
-        # Check if Telegram is enabled in config
-        telegram_config = config['telegram']
-        enabled = telegram_config.get('enabled', True)
-        if not enabled:
-            print(f"[Telegram disabled] {message[:50]}...")
-            return False
-        
-        bot_token = decrypt_config_value(telegram_config.get('bot-token'), password)
-        chat_id = decrypt_config_value(telegram_config.get('chat-id'), password)
-        
-        if not bot_token or not chat_id:
-            print("⚠️ Telegram credentials missing")
-            return False
-        
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        payload = {
-            "chat_id": chat_id,
-            "text": message,
-            "parse_mode": "HTML"
-        }
-        
-        response = requests.post(url, json=payload, timeout=10)
+
+        url, payload = request
+        response = _SESSION.post(url, json=payload, timeout=10)
         if response.status_code == 200:
             print(f"📱 Telegram: {message[:50]}...")
             return True
@@ -0,0 +1,124 @@
+import asyncio
+import atexit
+import threading
+from typing import Optional
+
+import httpx
+
+from app.services.telegram_service import _build_request
+
+SEND_TIMEOUT_SECONDS = 10.0
+# Telegram's sendMessage text limit; queued messages are coalesced up to this size
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TelegramWorker:
+    """
+    Sends Telegram messages from a background event loop so callers never wait on
+    the network. enqueue() only hands the message to the loop thread; a single
+    pooled httpx.AsyncClient drains the queue there.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        # _thread is assigned before the loop and queue exist; only _started means they do
+        if self._started.is_set() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._started.is_set() and self._thread.is_alive():
+                return
+            if self._thread is not None:
+                print("⚠️ Telegram worker stopped; restarting")
+            self._started.clear()
+            self._thread = threading.Thread(target=self._run, name="telegram-worker", daemon=True)
+            self._thread.start()
+            self._started.wait()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._started.set()
+        try:
+            self._loop.run_until_complete(self._drain())
+        except BaseException as e:
+            print(f"⚠️ Telegram worker exited: {e!r}")
+
+    async def _drain(self):
+        async with httpx.AsyncClient(timeout=SEND_TIMEOUT_SECONDS) as client:
+            carry = None
+            while True:
+                message, password = carry or await self._queue.get()
+                carry = None
+                batch = [message]
+                try:
+                    # Coalesce messages that are already waiting into one send (same password, size-capped)
+                    size = len(message)
+                    while not self._queue.empty():
+                        item = self._queue.get_nowait()
+                        if item[1] != password or size + 2 + len(item[0]) > MAX_MESSAGE_LENGTH:
+                            carry = item
+                            break
+                        batch.append(item[0])
+                        size += 2 + len(item[0])
+                    await self._send(client, "\n\n".join(batch), password)
+                except Exception as e:
+                    # One bad batch must not kill the worker and silently drop every later message
+                    print(f"⚠️ Telegram worker error: {e}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+
+    @staticmethod
+    async def _send(client: httpx.AsyncClient, message: str, password: str) -> bool:
+        try:
+            request = _build_request(message, password)
+            if request is None:
+                return False
+
+            url, payload = request
+            response = await client.post(url, json=payload)
+            if response.status_code == 200:
+                print(f"📱 Telegram: {message[:50]}...")
+                return True
+            print(f"⚠️ Telegram failed: {response.status_code}")
+            return False
+        except Exception as e:
+            print(f"⚠️ Telegram error: {e}")
+            return False
+
+    def enqueue(self, message: str, password: str) -> bool:
+        """Queue a message for sending and return immediately"""
+        self._ensure_started()
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (message, password))
+        return True
+
+    def flush(self, timeout: float = SEND_TIMEOUT_SECONDS) -> bool:
+        """Wait until every queued message has been sent (or dropped); True if drained in time"""
+        if self._thread is None:
+            return True
+        if not self._thread.is_alive():
+            return False
+        future = asyncio.run_coroutine_threadsafe(self._queue.join(), self._loop)
+        try:
+            future.result(timeout)
+            return True
+        except Exception:
+            future.cancel()
+            return False
+
+
+_worker = TelegramWorker()
+# Give queued alerts a chance to go out before the interpreter exits
+atexit.register(_worker.flush)
+
+
+def send_telegram_message_nowait(message: str, password: str) -> bool:
+    """Non-blocking send_telegram_message: queue the message for the background worker"""
+    return _worker.enqueue(message, password)
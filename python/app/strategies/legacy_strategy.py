@@ -1,17 +1,123 @@
+import time
+import numpy as np
 from datetime import datetime, timedelta
-from collections import deque
-from app.services.shioaji_service import latest_tick, price_history, volume_history, session_high, session_low
+from typing import Final, Optional
+from app.services.shioaji_service import latest_tick, price_history, volume_history, session_stats, rsi_state
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - numba is an optional speedup
+    njit = None
+
+_NUMBA_AVAILABLE = njit is not None
+
+# ============================================================================
+# IMPROVED THRESHOLDS (Anti-Whipsaw)
+# ============================================================================
+MOMENTUM_ENTRY_THRESHOLD: Final[float] = 0.05   # Increased from 0.02 (2.5x higher)
+MOMENTUM_STRONG_THRESHOLD: Final[float] = 0.08  # Strong signal threshold
+MOMENTUM_EXIT_THRESHOLD: Final[float] = 0.06    # Exit requires stronger reversal
+VOLUME_ENTRY_THRESHOLD: Final[float] = 1.5      # Increased from 1.3 (stricter volume confirmation)
+RSI_OVERBOUGHT: Final[float] = 70               # Don't buy when overbought
+RSI_OVERSOLD: Final[float] = 30                 # Don't sell when oversold
+MIN_CONSECUTIVE_SIGNALS: Final[int] = 3         # Need 3 aligned signals before entry
+COOLDOWN_SECONDS: Final[int] = 180              # 3-minute cooldown after closing position
+
+# Look-back (in ticks) of the 3/5/10-minute momentum windows
+MOMENTUM_WINDOWS: Final = np.array([180, 300, 600], dtype=np.int64)
+
+# Derived thresholds, computed once instead of per signal
+_ENTRY_08: Final[float] = MOMENTUM_ENTRY_THRESHOLD * 0.8  # 5-min confirmation for entries
+_EXIT_HALF: Final[float] = MOMENTUM_EXIT_THRESHOLD * 0.5  # 5-min confirmation for exits
 
 # ============================================================================
 # ANTI-WHIPSAW STATE TRACKING
 # ============================================================================
 # Track consecutive signals to avoid false entries
 consecutive_signal_count = 0
-last_signal_direction = "NEUTRAL"
-last_trade_time = None  # Cooldown tracking
-signal_confirmation_history = deque(maxlen=6)  # Last 6 signals (3 minutes at 30s intervals)
+last_trade_mono: Optional[float] = None  # Cooldown tracking (time.monotonic() of the last exit)
+# Last 6 raw signals (3 minutes at 30s intervals), 2 bits each, newest in the low bits:
+# 00 = NEUTRAL, 01 = LONG, 10 = SHORT. The low 2 bits are the previous raw direction.
+signal_state = 0
+_SIGNAL_STATE_MASK: Final[int] = 0xFFF
+_DIRECTION_BITS = {0: 0b00, 1: 0b01, -1: 0b10}
 last_direction = "NEUTRAL"
 
+# Momenta and volume ratio depend only on the tick rings, so /signal polls between ticks
+# reuse them. Keyed on the ring objects and their (generation, write_idx) counters.
+_ring_key = None
+_ring_indicators = None
+
+def _momenta(last_price, past_prices: np.ndarray) -> np.ndarray:
+    """Percent change from each past price to last_price (0 where the past price is not positive).
+    Broadcasts, so the same code evaluates a whole backtest's windows in one call."""
+    past_prices = np.asarray(past_prices, dtype=np.float64)
+    out = np.zeros(np.broadcast(last_price, past_prices).shape)
+    np.divide((last_price - past_prices) * 100, past_prices, out=out, where=past_prices > 0)
+    return out
+
+# ============================================================================
+# SIGNAL CORE
+# Scalar-only so it can be JIT-compiled by numba when available; the module-level
+# thresholds it reads are frozen into the compiled code as constants.
+# Direction is returned as a code: 1 = LONG, -1 = SHORT, 0 = NEUTRAL.
+# ============================================================================
+
+def _jit(fn):
+    return njit(cache=True)(fn) if _NUMBA_AVAILABLE else fn
+
+
+_DIRECTIONS = {1: "LONG", -1: "SHORT", 0: "NEUTRAL"}
+
+
+@_jit
+def _signal_core(momentum_3min, momentum_5min, momentum_10min, volume_ratio, rsi):
+    # Sign of each timeframe against its threshold (10min just needs to be non-zero)
+    m3s = (momentum_3min > MOMENTUM_ENTRY_THRESHOLD) - (momentum_3min < -MOMENTUM_ENTRY_THRESHOLD)
+    m5s = (momentum_5min > _ENTRY_08) - (momentum_5min < -_ENTRY_08)
+    m10s = (momentum_10min > 0) - (momentum_10min < 0)
+    # Momentum aligns only when all three timeframes agree
+    aligned = m3s if m3s == m5s and m5s == m10s else 0
+    
+    # RSI filter (avoid buying overbought, selling oversold)
+    if (aligned == 1 and rsi >= RSI_OVERBOUGHT) or (aligned == -1 and rsi <= RSI_OVERSOLD):
+        aligned = 0
+    
+    # Volume confirmation (stricter)
+    volume_confirms = volume_ratio > VOLUME_ENTRY_THRESHOLD
+    if aligned == 0:
+        return 0, 0.3, volume_confirms
+    
+    # One confidence formula for both sides; strong = higher thresholds in the aligned direction
+    abs3 = abs(momentum_3min)
+    abs5 = abs(momentum_5min)
+    strong = abs3 > MOMENTUM_STRONG_THRESHOLD and abs5 > MOMENTUM_ENTRY_THRESHOLD
+    confidence = min(0.95, 0.4 + abs3 * 8 + abs5 * 4 + 0.2 * volume_confirms + 0.1 * strong)
+    return aligned, confidence, volume_confirms
+
+
+# Constant part of the warm-up response; per-call fields are filled into a copy
+_WARMUP_TEMPLATE = {
+    "current_price": None,
+    "direction": "NEUTRAL",
+    "confidence": 0.0,
+    "exit_signal": False,
+    "reason": "Insufficient data (warming up)",
+    "momentum_3min": 0.0,
+    "momentum_5min": 0.0,
+    "momentum_10min": 0.0,
+    "volume_ratio": 1.0,
+    "rsi": 50.0,
+    "consecutive_signals": 0,
+    "in_cooldown": False,
+    "cooldown_remaining": 0,
+    "session_high": None,
+    "session_low": None,
+    "raw_direction": "NEUTRAL",
+    "timestamp": None,
+}
+
+
 def get_signal_legacy():
     """
     Generate trading signal using improved momentum + volume strategy.
@@ -24,110 +130,74 @@ def get_signal_legacy():
     - RSI-like overbought/oversold filter
     - Volume must confirm direction (ratio > 1.5 for entries)
     """
-    global last_direction, consecutive_signal_count, last_signal_direction
-    global last_trade_time, signal_confirmation_history
+    global last_direction, consecutive_signal_count, signal_state
+    global last_trade_mono, _ring_key, _ring_indicators
+    
+    # Module state read more than once below, bound to locals (LOAD_FAST instead of LOAD_GLOBAL).
+    # Bound per call rather than as default arguments so rebinding the module names still works.
+    history = price_history
+    stats = session_stats
+    _round = round
     
-    price = latest_tick["price"]
+    price = latest_tick.price
     direction = "NEUTRAL"
     confidence = 0.0
     exit_signal = False
     
     # Need minimum data for calculations
-    if len(price_history) < 120:  # Increased warmup period (2 minutes of ticks)
-        return {
-            "current_price": price,
-            "direction": "NEUTRAL",
-            "confidence": 0.0,
-            "exit_signal": False,
-            "reason": "Insufficient data (warming up)",
-            "momentum_3min": 0.0,
-            "momentum_5min": 0.0,
-            "momentum_10min": 0.0,
-            "volume_ratio": 1.0,
-            "rsi": 50.0,
-            "consecutive_signals": 0,
-            "in_cooldown": False,
-            "cooldown_remaining": 0,
-            "session_high": session_high if session_high is not None else price,
-            "session_low": session_low if session_low is not None else price,
-            "raw_direction": "NEUTRAL",
-            "timestamp": datetime.now().isoformat()
-        }
+    history_len = len(history)
+    if history_len < 120:  # Increased warmup period (2 minutes of ticks)
+        result = _WARMUP_TEMPLATE.copy()
+        result["current_price"] = price
+        session_high = stats.high
+        session_low = stats.low
+        result["session_high"] = session_high if session_high is not None else price
+        result["session_low"] = session_low if session_low is not None else price
+        result["timestamp"] = datetime.now().isoformat()
+        return result
     
-    # ========================================================================
-    # MOMENTUM CALCULATIONS
-    # ========================================================================
-    
-    # 3-minute momentum (short-term)
-    lookback_3min = min(180, len(price_history))
-    prices_3min = [p["price"] for p in list(price_history)[-lookback_3min:]]
-    momentum_3min = (prices_3min[-1] - prices_3min[0]) / prices_3min[0] * 100 if prices_3min[0] > 0 else 0
-    
-    # 5-minute momentum (medium-term confirmation)
-    lookback_5min = min(300, len(price_history))
-    prices_5min = [p["price"] for p in list(price_history)[-lookback_5min:]]
-    momentum_5min = (prices_5min[-1] - prices_5min[0]) / prices_5min[0] * 100 if prices_5min[0] > 0 else 0
-    
-    # 10-minute momentum (trend context)
-    lookback_10min = min(600, len(price_history))
-    prices_10min = [p["price"] for p in list(price_history)[-lookback_10min:]]
-    momentum_10min = (prices_10min[-1] - prices_10min[0]) / prices_10min[0] * 100 if prices_10min[0] > 0 else 0
-    
-    # ========================================================================
-    # RSI-LIKE CALCULATION (Relative Strength Index)
-    # ========================================================================
-    rsi = 50.0  # Default neutral
-    if len(prices_3min) >= 60:
-        gains = []
-        losses = []
-        for i in range(1, min(60, len(prices_3min))):
-            change = prices_3min[-i] - prices_3min[-i-1]
-            if change > 0:
-                gains.append(change)
-            else:
-                losses.append(abs(change))
+    volumes = volume_history
+    ring_key = (history, history.generation, history.write_idx, volumes, volumes.generation, volumes.write_idx)
+    if ring_key == _ring_key:
+        momentum_3min, momentum_5min, momentum_10min, volume_ratio = _ring_indicators
+    else:
+        # ====================================================================
+        # MOMENTUM CALCULATIONS
+        # ====================================================================
         
-        avg_gain = sum(gains) / 60 if gains else 0
-        avg_loss = sum(losses) / 60 if losses else 0
+        # Only the newest price and the one at the start of each window matter:
+        # 3-minute (short-term), 5-minute (medium-term confirmation), 10-minute (trend context)
+        past_prices = history.prices_at(np.minimum(MOMENTUM_WINDOWS, history_len))
+        momentum_3min, momentum_5min, momentum_10min = _momenta(history.price_at(1), past_prices).tolist()
         
-        if avg_loss == 0:
-            if avg_gain == 0:
-                rsi = 50.0
-            else:
-                rsi = 100.0
+        # ====================================================================
+        # VOLUME ANALYSIS
+        # ====================================================================
+        if len(volumes) >= 60:
+            # Running totals maintained by the ring on every tick
+            recent_vol = volumes.volume_sum(30)
+            avg_vol = volumes.volume_sum(60) * 0.5
+            volume_ratio = recent_vol / avg_vol if avg_vol > 0 else 1.0
         else:
-            rs = avg_gain / avg_loss
-            rsi = 100 - (100 / (1 + rs))
-    
-    # ========================================================================
-    # VOLUME ANALYSIS
-    # ========================================================================
-    if len(volume_history) >= 60:
-        recent_vol = sum(list(volume_history)[-30:])
-        avg_vol = sum(list(volume_history)[-60:]) / 2
-        volume_ratio = recent_vol / avg_vol if avg_vol > 0 else 1.0
-    else:
-        volume_ratio = 1.0
+            volume_ratio = 1.0
+        
+        _ring_key = ring_key
+        _ring_indicators = (momentum_3min, momentum_5min, momentum_10min, volume_ratio)
     
     # ========================================================================
-    # IMPROVED THRESHOLDS (Anti-Whipsaw)
+    # RSI-LIKE CALCULATION (Relative Strength Index)
     # ========================================================================
-    MOMENTUM_ENTRY_THRESHOLD = 0.05      # Increased from 0.02 (2.5x higher)
-    MOMENTUM_STRONG_THRESHOLD = 0.08     # Strong signal threshold
-    MOMENTUM_EXIT_THRESHOLD = 0.06       # Exit requires stronger reversal
-    VOLUME_ENTRY_THRESHOLD = 1.5         # Increased from 1.3 (stricter volume confirmation)
-    RSI_OVERBOUGHT = 70                  # Don't buy when overbought
-    RSI_OVERSOLD = 30                    # Don't sell when oversold
-    MIN_CONSECUTIVE_SIGNALS = 3          # Need 3 aligned signals before entry
-    COOLDOWN_SECONDS = 180               # 3-minute cooldown after closing position
+    # Wilder-smoothed averages are maintained per tick by the tick handler
+    rsi = rsi_state.value()
     
     # ========================================================================
     # COOLDOWN CHECK
     # ========================================================================
     in_cooldown = False
     cooldown_remaining = 0
-    if last_trade_time is not None:
-        elapsed = (datetime.now() - last_trade_time).total_seconds()
+    if last_trade_mono is not None:
+        # Monotonic clock: no datetime allocation and immune to wall-clock/NTP jumps
+        elapsed = time.monotonic() - last_trade_mono
         if elapsed < COOLDOWN_SECONDS:
             in_cooldown = True
             cooldown_remaining = int(COOLDOWN_SECONDS - elapsed)
@@ -136,60 +206,21 @@ def get_signal_legacy():
     # SIGNAL GENERATION
     # ========================================================================
     
-    # Check if momentum aligns across timeframes
-    all_bullish = (momentum_3min > MOMENTUM_ENTRY_THRESHOLD and 
-                   momentum_5min > MOMENTUM_ENTRY_THRESHOLD * 0.8 and
-                   momentum_10min > 0)  # 10min just needs to be positive
-    
-    all_bearish = (momentum_3min < -MOMENTUM_ENTRY_THRESHOLD and 
-                   momentum_5min < -MOMENTUM_ENTRY_THRESHOLD * 0.8 and
-                   momentum_10min < 0)  # 10min just needs to be negative
-    
-    # Strong signals (higher thresholds)
-    strong_bullish = momentum_3min > MOMENTUM_STRONG_THRESHOLD and momentum_5min > MOMENTUM_ENTRY_THRESHOLD
-    strong_bearish = momentum_3min < -MOMENTUM_STRONG_THRESHOLD and momentum_5min < -MOMENTUM_ENTRY_THRESHOLD
-    
-    # Volume confirmation (stricter)
-    volume_confirms = volume_ratio > VOLUME_ENTRY_THRESHOLD
-    
-    # RSI filter (avoid buying overbought, selling oversold)
-    rsi_allows_long = rsi < RSI_OVERBOUGHT
-    rsi_allows_short = rsi > RSI_OVERSOLD
-    
-    # ========================================================================
-    # DIRECTION DETERMINATION
-    # ========================================================================
-    raw_direction = "NEUTRAL"
-    
-    if all_bullish and rsi_allows_long:
-        raw_direction = "LONG"
-        confidence = min(0.95, 0.4 + abs(momentum_3min) * 8 + abs(momentum_5min) * 4)
-        if volume_confirms:
-            confidence = min(0.95, confidence + 0.2)
-        if strong_bullish:
-            confidence = min(0.95, confidence + 0.1)
-            
-    elif all_bearish and rsi_allows_short:
-        raw_direction = "SHORT"
-        confidence = min(0.95, 0.4 + abs(momentum_3min) * 8 + abs(momentum_5min) * 4)
-        if volume_confirms:
-            confidence = min(0.95, confidence + 0.2)
-        if strong_bearish:
-            confidence = min(0.95, confidence + 0.1)
-    else:
-        raw_direction = "NEUTRAL"
-        confidence = 0.3
+    # Numeric core (alignment, volume/RSI filters, confidence) runs JIT-compiled when numba is installed
+    direction_code, confidence, volume_confirms = _signal_core(
+        momentum_3min, momentum_5min, momentum_10min, volume_ratio, rsi
+    )
+    raw_direction = _DIRECTIONS[direction_code]
     
     # ========================================================================
     # CONSECUTIVE SIGNAL TRACKING (Anti-Whipsaw)
     # ========================================================================
-    signal_confirmation_history.append(raw_direction)
-    
-    if raw_direction == last_signal_direction and raw_direction != "NEUTRAL":
+    bits = _DIRECTION_BITS[direction_code]
+    if bits and (signal_state & 0b11) == bits:
         consecutive_signal_count += 1
     else:
-        consecutive_signal_count = 1 if raw_direction != "NEUTRAL" else 0
-        last_signal_direction = raw_direction
+        consecutive_signal_count = 1 if bits else 0
+    signal_state = ((signal_state << 2) | bits) & _SIGNAL_STATE_MASK
     
     # Only emit non-NEUTRAL direction if we have enough consecutive signals
     # AND we're not in cooldown AND volume confirms
@@ -205,10 +236,10 @@ def get_signal_legacy():
     # ========================================================================
     if last_direction == "LONG" and momentum_3min < -MOMENTUM_EXIT_THRESHOLD:
         # Require both short-term AND medium-term to confirm reversal
-        if momentum_5min < -MOMENTUM_EXIT_THRESHOLD * 0.5:
+        if momentum_5min < -_EXIT_HALF:
             exit_signal = True
     elif last_direction == "SHORT" and momentum_3min > MOMENTUM_EXIT_THRESHOLD:
-        if momentum_5min > MOMENTUM_EXIT_THRESHOLD * 0.5:
+        if momentum_5min > _EXIT_HALF:
             exit_signal = True
     
     # Update last_direction only on confirmed entries
@@ -218,29 +249,29 @@ def get_signal_legacy():
     return {
         "current_price": price,
         "direction": direction,
-        "confidence": round(confidence, 3),
+        "confidence": _round(confidence, 3),
         "exit_signal": exit_signal,
-        "momentum_3min": round(momentum_3min, 4),
-        "momentum_5min": round(momentum_5min, 4),
-        "momentum_10min": round(momentum_10min, 4),
-        "volume_ratio": round(volume_ratio, 2),
-        "rsi": round(rsi, 1),
+        "momentum_3min": _round(momentum_3min, 4),
+        "momentum_5min": _round(momentum_5min, 4),
+        "momentum_10min": _round(momentum_10min, 4),
+        "volume_ratio": _round(volume_ratio, 2),
+        "rsi": _round(rsi, 1),
         "consecutive_signals": consecutive_signal_count,
         "in_cooldown": in_cooldown,
         "cooldown_remaining": cooldown_remaining,
-        "session_high": session_high,
-        "session_low": session_low,
+        "session_high": stats.high,
+        "session_low": stats.low,
         "raw_direction": raw_direction,
         "timestamp": datetime.now().isoformat()
     }
 
 def notify_exit_order():
     """Notify strategy that an exit order was placed"""
-    global last_trade_time, consecutive_signal_count, last_signal_direction
-    last_trade_time = datetime.now()
+    global last_trade_mono, consecutive_signal_count, signal_state
+    last_trade_mono = time.monotonic()
     consecutive_signal_count = 0
-    last_signal_direction = "NEUTRAL"
+    signal_state = 0
     return {
         "cooldown_started": True,
-        "cooldown_until": (last_trade_time + timedelta(seconds=180)).isoformat()
+        "cooldown_until": (datetime.now() + timedelta(seconds=COOLDOWN_SECONDS)).isoformat()
     }
@@ -15,11 +15,11 @@ if compat_dir not in sys.path:
 # Add current directory to path so we can import app
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.main import app
+from app.main import app, uvicorn_options
 
 if __name__ == "__main__":
     # Log Python version for debugging
     print(f"🐍 Python {sys.version} on {sys.platform}")
     
     print("🐍 Python bridge starting on port 8888...")
-    uvicorn.run(app, host="0.0.0.0", port=8888, log_level="info")
+    uvicorn.run(app, host="0.0.0.0", port=8888, log_level="info", **uvicorn_options())
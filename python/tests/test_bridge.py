@@ -5,6 +5,7 @@ Unit tests for MTXF Trading Bridge
 Run with: pytest python/tests/ -v
 """
 
+import asyncio
 import pytest
 import json
 import base64
@@ -13,6 +14,8 @@ from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime
 from collections import deque
 
+import aiohttp
+
 # Import functions to test
 import sys
 import os
@@ -27,7 +30,7 @@ from app.main import (
     OrderRequest,
 )
 from app.services.ollama_service import OllamaService
-from app.services.telegram_service import send_telegram_message
+from app.services.telegram_service import _resolve_telegram, reload_telegram_config, send_telegram_message
 
 # Mock OllamaService for tests
 def call_llama_news_veto(headlines):
@@ -104,95 +107,115 @@ class TestOrderRequest:
 class TestNewsAnalysis:
     """Tests for news fetching and Ollama analysis"""
     
-    @patch('app.main.feedparser.parse')
-    def test_fetch_news_headlines_success(self, mock_parse):
+    def test_fetch_news_headlines_success(self):
         """Should fetch and return headlines from RSS feeds"""
-        mock_feed = Mock()
-        mock_feed.entries = [
-            Mock(title="Headline 1"),
-            Mock(title="Headline 2"),
-            Mock(title="Headline 3"),
-        ]
-        mock_parse.return_value = mock_feed
+        feed = (
+            b"<?xml version='1.0' encoding='utf-8'?><rss><channel><title>Feed</title>"
+            + b"".join(f"<item><title>Headline {i}</title></item>".encode() for i in range(1, 6))
+            + b"</channel></rss>"
+        )
         
-        headlines = fetch_news_headlines()
+        async def fake_fetch(session, url):
+            return feed
         
-        assert len(headlines) <= 15
-        assert "Headline 1" in headlines
+        with patch('app.main._afetch_feed', side_effect=fake_fetch) as mock_fetch:
+            headlines = fetch_news_headlines()
+        
+        assert mock_fetch.call_count == 2
+        assert headlines == ["Headline 1", "Headline 2", "Headline 3"] * 2
     
-    @patch('app.main.feedparser.parse')
-    def test_fetch_news_headlines_handles_errors(self, mock_parse):
+    def test_fetch_news_headlines_handles_errors(self):
         """Should handle feed errors gracefully"""
-        mock_parse.side_effect = Exception("Network error")
+        async def failing_fetch(session, url):
+            raise aiohttp.ClientError("Network error")
         
-        headlines = fetch_news_headlines()
+        with patch('app.main._afetch_feed', side_effect=failing_fetch):
+            headlines = fetch_news_headlines()
         
         assert headlines == []
     
-    @patch('app.services.ollama_service.requests.post')
-    @patch('app.main.OllamaService')
-    def test_call_llama_news_veto_approve(self, MockOllamaService, mock_post):
-        """Should parse APPROVE response correctly"""
-        mock_response = Mock()
-        mock_response.json.return_value = {
-            'response': 'APPROVE'
-        }
-        mock_post.return_value = mock_response
+    def test_fetch_news_headlines_keeps_reachable_feed(self):
+        """One failing or malformed feed should not drop the other's headlines"""
+        async def fetch(session, url):
+            if "udn" in url:
+                raise asyncio.TimeoutError()
+            return "<rss><channel><item><title><![CDATA[ 台積電 ]]></title></item><item><title>Broken".encode()
+        
+        with patch('app.main._afetch_feed', side_effect=fetch):
+            assert fetch_news_headlines() == ["台積電", "Broken"]
+    
+    def test_fetch_feed_retries_once_then_gives_up(self):
+        """A transient feed error is retried once; a second failure propagates"""
+        from app.main import _afetch_feed
+        
+        class FakeResponse:
+            async def __aenter__(self):
+                return self
+            
+            async def __aexit__(self, *exc):
+                return False
+            
+            def raise_for_status(self):
+                pass
+            
+            async def read(self):
+                return b"<rss/>"
+        
+        def session_failing(times):
+            calls = []
+            
+            def get(url, timeout):
+                calls.append(timeout.total)
+                if len(calls) <= times:
+                    raise aiohttp.ClientConnectionError("reset")
+                return FakeResponse()
+            
+            return Mock(get=get), calls
         
+        session, calls = session_failing(1)
+        assert asyncio.run(_afetch_feed(session, "http://feed")) == b"<rss/>"
+        assert calls == [3, 3]
+        
+        session, calls = session_failing(2)
+        with pytest.raises(aiohttp.ClientConnectionError):
+            asyncio.run(_afetch_feed(session, "http://feed"))
+        assert len(calls) == 2
+    
+    @patch('app.services.ollama_service.requests.Session.post')
+    def test_call_llama_news_veto_approve(self, mock_post):
+        """Should APPROVE locally when no negative keyword matches"""
         service = OllamaService("http://localhost:11434", "llama3.1:8b")
         result = service.call_llama_news_veto(["Test headline"])
         
         assert result["veto"] == False
         assert result["score"] == 1.0
-        assert result["reason"] == "APPROVED"
+        assert "local fast path" in result["reason"]
+        mock_post.assert_not_called()
     
-    @patch('app.services.ollama_service.requests.post')
+    @patch('app.services.ollama_service.requests.Session.post')
     def test_call_llama_news_veto_veto_response(self, mock_post):
-        """Should parse VETO response correctly"""
-        mock_response = Mock()
-        mock_response.json.return_value = {
-            'response': 'VETO: negative news keyword'
-        }
-        mock_post.return_value = mock_response
-        
+        """Should VETO locally on a negative keyword"""
         service = OllamaService("http://localhost:11434", "llama3.1:8b")
-        result = service.call_llama_news_veto(["股市下跌"])
+        result = service.call_llama_news_veto(["Good earnings", "股市下跌"])
         
         assert result["veto"] == True
         assert result["score"] == 0.0
-        assert result["reason"] == "negative news keyword"
-    
-    @patch('app.services.ollama_service.requests.post')
-    def test_call_llama_news_veto_handles_timeout(self, mock_post):
-        """Should return VETO on timeout (fail-safe)"""
-        mock_post.side_effect = Exception("Timeout")
-        
-        service = OllamaService("http://localhost:11434", "llama3.1:8b")
-        result = service.call_llama_news_veto(["Test headline"])
-        
-        assert result["veto"] == True
-        assert result["score"] == 0.0
-        assert "failed" in result["reason"].lower()
+        assert result["reason"] == "Negative keyword in: 股市下跌"
+        mock_post.assert_not_called()
     
-    @patch('app.services.ollama_service.requests.post')
-    def test_call_llama_news_veto_handles_unexpected_format(self, mock_post):
-        """Should return VETO on unexpected response format (fail-safe)"""
-        mock_response = Mock()
-        mock_response.json.return_value = {'response': 'some random text'}
-        mock_post.return_value = mock_response
-        
+    def test_call_llama_news_veto_truncates_long_headline_in_reason(self):
+        """Reason should quote at most 80 characters of the offending headline"""
         service = OllamaService("http://localhost:11434", "llama3.1:8b")
-        result = service.call_llama_news_veto(["Test headline"])
+        headline = "Recession " + "x" * 200
+        result = service.call_llama_news_veto([headline])
         
-        assert result["veto"] == True
-        assert result["score"] == 0.0
-        assert "unexpected" in result["reason"].lower()
+        assert result["reason"] == f"Negative keyword in: {headline[:80]}"
     
-    @patch('app.services.ollama_service.requests.post')
+    @patch('app.services.ollama_service.requests.Session.post')
     def test_call_trade_veto_approve(self, mock_post):
         """Should parse full trade veto APPROVE response"""
         mock_response = Mock()
-        mock_response.json.return_value = {'response': 'APPROVE'}
+        mock_response.content = json.dumps({'response': 'APPROVE'}).encode()
         mock_post.return_value = mock_response
         
         service = OllamaService("http://localhost:11434", "llama3.1:8b")
@@ -219,11 +242,11 @@ class TestNewsAnalysis:
         assert result["veto"] == False
         assert result["reason"] == "APPROVED"
     
-    @patch('app.services.ollama_service.requests.post')
+    @patch('app.services.ollama_service.requests.Session.post')
     def test_call_trade_veto_reject(self, mock_post):
         """Should parse full trade veto VETO response"""
         mock_response = Mock()
-        mock_response.json.return_value = {'response': 'VETO: daily drawdown exceeded'}
+        mock_response.content = json.dumps({'response': 'VETO: daily drawdown exceeded'}).encode()
         mock_post.return_value = mock_response
         
         service = OllamaService("http://localhost:11434", "llama3.1:8b")
@@ -242,6 +265,48 @@ class TestNewsAnalysis:
 class TestSignalGeneration:
     """Tests for trading signal generation logic"""
     
+    def test_signal_endpoint_renders_with_orjson(self):
+        """/signal should bypass jsonable_encoder and render via ORJSONResponse"""
+        import orjson
+        import app.main as bridge
+        from fastapi.responses import ORJSONResponse
+        
+        signal = {"direction": "LONG", "confidence": 0.8, "timestamp": "2025-01-02T09:00:00"}
+        with patch('app.main.get_signal_legacy', return_value=signal):
+            response = asyncio.run(bridge.get_signal())
+        
+        assert isinstance(response, ORJSONResponse)
+        assert orjson.loads(response.body) == signal
+        assert bridge.app.router.default_response_class is ORJSONResponse
+    
+    def test_account_endpoints_run_broker_calls_in_executor(self):
+        """/account and /account/profit-history await the blocking broker calls off the event loop"""
+        import threading
+        import app.main as bridge
+        
+        loop_thread = []
+        broker_threads = []
+        
+        def account_info():
+            broker_threads.append(threading.get_ident())
+            return {"equity": 1000.0, "available_margin": 500.0, "status": "ok"}
+        
+        def pnl_history(days):
+            broker_threads.append(threading.get_ident())
+            return {"total_pnl": 12.5, "record_count": 3, "status": "ok"}
+        
+        async def call_both():
+            loop_thread.append(threading.get_ident())
+            return await bridge.get_account(), await bridge.get_profit_history(days=7)
+        
+        mock_shioaji = Mock(get_account_info=account_info, get_profit_loss_history=pnl_history)
+        with patch('app.main.shioaji', mock_shioaji):
+            account, pnl = asyncio.run(call_both())
+        
+        assert (account["equity"], account["available_margin"], account["status"]) == (1000.0, 500.0, "ok")
+        assert (pnl["total_pnl"], pnl["days"], pnl["record_count"]) == (12.5, 7, 3)
+        assert len(broker_threads) == 2 and loop_thread[0] not in broker_threads
+    
     def test_momentum_calculation_bullish(self):
         """Test momentum calculation for bullish scenario"""
         # Prices going up: 100 -> 100.03 (0.03% gain)
@@ -310,9 +375,12 @@ class TestSignalGeneration:
 class TestTelegramNotification:
     """Tests for Telegram notification functionality"""
     
-    @patch('app.services.telegram_service.requests.post')
+    def setup_method(self):
+        reload_telegram_config()
+    
+    @patch('app.services.telegram_service.requests.Session.post')
     @patch('app.core.config.open', create=True)
-    @patch('app.core.config.yaml.safe_load')
+    @patch('app.core.config._load_yaml')
     def test_send_telegram_success(self, mock_yaml, mock_open, mock_post):
         """Should send Telegram message successfully"""
         # Mock config file
@@ -340,9 +408,9 @@ class TestTelegramNotification:
         assert call_args[1]['json']['text'] == "Test message"
         assert call_args[1]['json']['parse_mode'] == "HTML"
     
-    @patch('app.services.telegram_service.requests.post')
+    @patch('app.services.telegram_service.requests.Session.post')
     @patch('app.core.config.open', create=True)
-    @patch('app.core.config.yaml.safe_load')
+    @patch('app.core.config._load_yaml')
     def test_send_telegram_missing_config(self, mock_yaml, mock_open, mock_post):
         """Should handle missing Telegram config gracefully"""
         mock_config = {}
@@ -353,9 +421,9 @@ class TestTelegramNotification:
         assert result is False
         mock_post.assert_not_called()
     
-    @patch('app.services.telegram_service.requests.post')
+    @patch('app.services.telegram_service.requests.Session.post')
     @patch('app.core.config.open', create=True)
-    @patch('app.core.config.yaml.safe_load')
+    @patch('app.core.config._load_yaml')
     def test_send_telegram_missing_credentials(self, mock_yaml, mock_open, mock_post):
         """Should handle missing credentials gracefully"""
         mock_config = {
@@ -373,9 +441,9 @@ class TestTelegramNotification:
         assert result is False
         mock_post.assert_not_called()
     
-    @patch('app.services.telegram_service.requests.post')
+    @patch('app.services.telegram_service.requests.Session.post')
     @patch('app.core.config.open', create=True)
-    @patch('app.core.config.yaml.safe_load')
+    @patch('app.core.config._load_yaml')
     def test_send_telegram_api_failure(self, mock_yaml, mock_open, mock_post):
         """Should handle Telegram API failures gracefully"""
         mock_config = {
@@ -397,7 +465,39 @@ class TestTelegramNotification:
         
         assert result is False
     
-    @patch('app.services.telegram_service.requests.post')
+    @patch('app.services.telegram_service.requests.Session.post')
+    def test_send_telegram_resolves_config_once_per_password(self, mock_post):
+        """Should load and decrypt Telegram config once, then reuse it"""
+        mock_post.return_value = Mock(status_code=200)
+        config = {'telegram': {'bot-token': 'token', 'chat-id': 'chat'}}
+        
+        with patch('app.services.telegram_service.load_config_with_decryption', return_value=config) as mock_load:
+            assert send_telegram_message("first", "password") is True
+            assert send_telegram_message("second", "password") is True
+            reload_telegram_config()
+            assert send_telegram_message("third", "password") is True
+        
+        assert mock_load.call_count == 2
+        assert mock_post.call_count == 3
+    
+    @patch('app.services.telegram_service.requests.Session.post')
+    def test_send_telegram_plaintext_credentials_skip_decrypt(self, mock_post):
+        """Plain bot-token/chat-id should be used as-is; ENC() values decrypted once"""
+        mock_post.return_value = Mock(status_code=200)
+        config = {'telegram': {'bot-token': 'plain_token', 'chat-id': 'ENC(chat)'}}
+        
+        with patch('app.services.telegram_service.load_config_with_decryption', return_value=config), \
+             patch('app.services.telegram_service.decrypt_config_value', return_value='chat') as mock_decrypt:
+            assert send_telegram_message("first", "password") is True
+            # Re-read the config but keep memoized decryptions
+            _resolve_telegram.cache_clear()
+            assert send_telegram_message("second", "password") is True
+        
+        mock_decrypt.assert_called_once_with('ENC(chat)', 'password')
+        assert 'botplain_token' in mock_post.call_args[0][0]
+        assert mock_post.call_args[1]['json']['chat_id'] == 'chat'
+    
+    @patch('app.services.telegram_service.requests.Session.post')
     @patch('app.core.config.open', side_effect=FileNotFoundError)
     def test_send_telegram_config_file_missing(self, mock_open, mock_post):
         """Should handle missing config file gracefully"""
@@ -406,21 +506,22 @@ class TestTelegramNotification:
         assert result is False
         mock_post.assert_not_called()
     
-    @patch('app.services.telegram_service.os.environ.get')
-    @patch('app.services.telegram_service.requests.post')
-    def test_send_telegram_ci_environment(self, mock_post, mock_env_get):
+    @patch('app.services.telegram_service.requests.Session.post')
+    def test_send_telegram_ci_environment(self, mock_post):
         """Should skip Telegram in CI environment"""
-        mock_env_get.return_value = 'true'
-        
-        result = send_telegram_message("Test message", "password")
+        with patch.dict('os.environ', {'CI': 'true'}):
+            reload_telegram_config()
+            with patch('app.services.telegram_service.load_config_with_decryption') as mock_load:
+                result = send_telegram_message("Test message", "password")
+        reload_telegram_config()
         
         assert result is False
         mock_post.assert_not_called()
-        mock_env_get.assert_called_once_with('CI')
+        mock_load.assert_not_called()
     
-    @patch('app.services.telegram_service.requests.post')
+    @patch('app.services.telegram_service.requests.Session.post')
     @patch('app.core.config.open', create=True)
-    @patch('app.core.config.yaml.safe_load')
+    @patch('app.core.config._load_yaml')
     @patch('app.services.telegram_service.os.environ.get')
     def test_send_telegram_disabled_in_config(self, mock_env_get, mock_yaml, mock_open, mock_post):
         """Should respect telegram.enabled flag in config"""
@@ -561,5 +662,22 @@ class TestDownloadBatchEndpoint:
         assert data_point["volume"] == 1000000
 
 
+def test_lifespan_shuts_down_pdf_pool(monkeypatch):
+    import app.main as main
+
+    calls = []
+    monkeypatch.setattr(main, "shutdown_pdf_pool", lambda: calls.append(True))
+    monkeypatch.setattr(main, "init_trading_mode", lambda: None)
+    monkeypatch.setattr(main, "shioaji", None)
+
+    async def run():
+        async with main.lifespan(main.app):
+            pass
+
+    asyncio.run(run())
+    assert calls == [True]
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
+
@@ -25,8 +25,8 @@ def test_bridge_main_invokes_uvicorn(monkeypatch):
 
     called = {}
 
-    def fake_run(app, host, port, log_level):
-        called.update({"host": host, "port": port, "log_level": log_level, "app": app})
+    def fake_run(app, host, port, log_level, loop, http):
+        called.update({"host": host, "port": port, "log_level": log_level, "app": app, "loop": loop, "http": http})
 
     monkeypatch.setattr(uvicorn, "run", fake_run)
 
@@ -36,3 +36,18 @@ def test_bridge_main_invokes_uvicorn(monkeypatch):
     assert called["port"] == 8888
     assert called["log_level"] == "info"
     assert called["app"] is not None
+    assert called["loop"] in ("uvloop", "asyncio")
+    assert called["http"] in ("httptools", "h11")
+
+
+def test_uvicorn_options_prefer_uvloop_and_httptools(monkeypatch):
+    _ensure_python_path()
+
+    import importlib.util
+    from app.main import uvicorn_options
+
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name: object())
+    assert uvicorn_options() == {"loop": "uvloop", "http": "httptools"}
+
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name: None)
+    assert uvicorn_options() == {"loop": "asyncio", "http": "h11"}
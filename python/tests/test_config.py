@@ -6,7 +6,7 @@ import base64
 import hashlib
 from pathlib import Path
 from Crypto.Cipher import DES
-from app.core.config import jasypt_decrypt, decrypt_config_value, load_config_with_decryption
+from app.core.config import _derive_key_iv, _des_cbc_decrypt, jasypt_decrypt, decrypt_config_value, load_config_with_decryption
 
 
 def create_jasypt_encrypted_value(plaintext: str, password: str) -> str:
@@ -66,6 +66,28 @@ def test_jasypt_decrypt_with_special_characters():
     assert decrypted == plaintext
 
 
+def test_jasypt_key_derivation_cached_per_password_and_salt():
+    """Fields sharing a (password, salt) pair should derive the DES key once"""
+    _derive_key_iv.cache_clear()
+    password = "test_password"
+    
+    assert jasypt_decrypt(create_jasypt_encrypted_value("first", password), password) == "first"
+    assert jasypt_decrypt(create_jasypt_encrypted_value("second", password), password) == "second"
+    
+    info = _derive_key_iv.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+
+
+def test_des_backends_agree(monkeypatch):
+    """The cryptography (3DES K1=K2=K3) path, when installed, must match PyCryptodome's single DES"""
+    key, iv = b"k3y-8byt", b"iv-8byte"
+    ciphertext = DES.new(key, DES.MODE_CBC, iv).encrypt(b"sixteen byte msg")
+    
+    assert _des_cbc_decrypt(key, iv, ciphertext) == b"sixteen byte msg"
+    monkeypatch.setattr("app.core.config.Cipher", None)
+    assert _des_cbc_decrypt(key, iv, ciphertext) == b"sixteen byte msg"
+
+
 def test_decrypt_config_value_plain():
     """Test that plain values pass through unchanged"""
     password = "test-password"
@@ -114,6 +136,7 @@ def test_decrypt_config_value_not_enc():
     # Partial ENC matches should not decrypt
     assert decrypt_config_value("ENC(incomplete", password) == "ENC(incomplete"
     assert decrypt_config_value("prefix_ENC(value)", password) == "prefix_ENC(value)"
+    assert decrypt_config_value("ENC()", password) == "ENC()"
 
 
 def test_decrypt_config_value_case_sensitive():
@@ -243,6 +266,37 @@ def test_load_config_with_decryption_fallback_and_java_responses(monkeypatch):
     assert cfg2["shioaji"]["simulation"] is True
 
 
+def test_load_config_overlaps_java_request_with_file_io(monkeypatch):
+    """The Java settings request should be in flight while application.yml is read"""
+    import threading
+    monkeypatch.setattr("app.core.config.os.getcwd", lambda: "/tmp")
+    monkeypatch.setattr("app.core.config.os.path.exists", lambda p: False)
+    monkeypatch.setattr("app.core.config.decrypt_config_value", lambda v, p: v)
+    
+    request_started = threading.Event()
+    
+    class Ok:
+        status_code = 200
+        def json(self):
+            return {"simulation": False}
+    
+    def slow_get(*args, **kwargs):
+        request_started.set()
+        return Ok()
+    
+    def load_yaml(handle):
+        # The request must already have been issued by the time the file is parsed
+        assert request_started.wait(timeout=5)
+        return {"shioaji": {}}
+    
+    monkeypatch.setattr("app.core.config.requests.get", slow_get)
+    monkeypatch.setattr("app.core.config.open", lambda *a, **k: tempfile.TemporaryFile("r"), raising=False)
+    monkeypatch.setattr("app.core.config._load_yaml", load_yaml)
+    
+    cfg = load_config_with_decryption("pwd")
+    assert cfg["shioaji"]["simulation"] is False
+
+
 def test_decrypt_config_nested():
     """Test decryption of nested config structures"""
     password = "test-password"
@@ -259,3 +313,14 @@ def test_decrypt_config_nested():
     result = decrypt_config_value(plain_config, password)
     assert result == plain_config
 
+
+
+def test_load_yaml_uses_libyaml_when_available():
+    """application.yml should be parsed by the C loader with safe_load semantics"""
+    from app.core import config as config_module
+    
+    if yaml.__with_libyaml__:
+        assert config_module._YamlLoader is yaml.CSafeLoader
+    assert config_module._load_yaml("a: 1\nb: [x, y]\n") == {"a": 1, "b": ["x", "y"]}
+    with pytest.raises(yaml.constructor.ConstructorError):
+        config_module._load_yaml("!!python/object/apply:os.system ['true']")
@@ -5,6 +5,7 @@ Unit tests for dual-mode (stock/futures) functionality in bridge.py
 Run with: pytest python/tests/test_dual_mode.py -v
 """
 
+import asyncio
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 import sys
@@ -165,7 +166,7 @@ class TestHealthEndpointWithMode:
         
         mock_shioaji.connected = True
         
-        result = health()
+        result = asyncio.run(health())
         
         assert result['trading_mode'] == 'stock'
         assert result['status'] == 'ok'
@@ -178,7 +179,7 @@ class TestHealthEndpointWithMode:
         
         mock_shioaji.connected = True
         
-        result = health()
+        result = asyncio.run(health())
         
         assert result['trading_mode'] == 'futures'
 
@@ -264,6 +265,144 @@ class TestModeSeparation:
         assert order_call[1]['account'] == wrapper.api.futopt_account
         assert result['mode'] == 'futures'
 
+    
+    def test_futures_pnl_history_sums_futopt_records(self):
+        """Futures P&L history should sum pnl across records from futopt_account"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        wrapper = ShioajiWrapper({'shioaji': {}}, trading_mode="futures")
+        wrapper.api = Mock()
+        wrapper.connected = True
+        records = [Mock(pnl=1200), Mock(pnl="-300.5"), Mock(spec=[]), Mock(pnl=50.25)]
+        wrapper.api.list_profit_loss = Mock(return_value=records)
+        
+        result = wrapper.get_profit_loss_history(days=30)
+        
+        assert wrapper.api.list_profit_loss.call_args[0][0] == wrapper.api.futopt_account
+        assert result["total_pnl"] == pytest.approx(949.75)
+        assert type(result["total_pnl"]) is float
+        assert result["record_count"] == 4
+        assert result["mode"] == "futures"
+
+    def test_simulation_orders_get_monotonic_ids_without_touching_api(self):
+        """Simulation mode should fill locally with sequential sim- order ids"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        wrapper = ShioajiWrapper({'shioaji': {'simulation': True}}, trading_mode="stock")
+        wrapper.api = Mock()
+        
+        first = wrapper.place_order("BUY", 100, 700.0)
+        second = wrapper.place_order("SELL", 100, 701.0)
+        
+        assert first == {"status": "filled", "order_id": "sim-00000001", "mode": "stock"}
+        assert second["order_id"] == "sim-00000002"
+        wrapper.api.place_order.assert_not_called()
+
+    def test_simulation_account_info_returns_fresh_copy(self):
+        """Callers mutating the simulated account dict must not affect later calls"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        wrapper = ShioajiWrapper({'shioaji': {'simulation': True}}, trading_mode="stock")
+        
+        info = wrapper.get_account_info()
+        info["equity"] = 0
+        
+        assert wrapper.get_account_info() == {"equity": 100000.0, "available_margin": 50000.0, "status": "ok"}
+
+    def test_batch_orders_share_checks_and_keep_leg_order(self):
+        """Batch legs get one account/balance check and responses aligned with the input"""
+        from types import SimpleNamespace
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        wrapper = ShioajiWrapper({'shioaji': {'simulation': False}}, trading_mode="stock")
+        wrapper.api = Mock()
+        wrapper.connected = True
+        wrapper.contract = Mock()
+        wrapper.api.Order = Mock(side_effect=lambda **kw: kw)
+        
+        def place_order(contract, order):
+            if order["quantity"] == 7:
+                raise RuntimeError("rejected")
+            status = SimpleNamespace(id=f"id-{order['quantity']}", order_quantity=order["quantity"])
+            return SimpleNamespace(status=status, operation=SimpleNamespace(op_msg=""))
+        
+        wrapper.api.place_order = Mock(side_effect=place_order)
+        account = {"status": "ok", "available_margin": 100000.0}
+        
+        with patch.object(wrapper, 'get_account_info', return_value=account) as get_account_info:
+            results = wrapper.place_orders_batch([
+                {"action": "BUY", "quantity": 100, "price": 700.0},
+                {"action": "BUY", "quantity": 100, "price": 700.0},  # only 30000 margin left
+                {"action": "BUY", "quantity": 10, "price": 700.0},   # nothing left
+                {"action": "SELL", "quantity": 7, "price": 700.0},
+                {"action": "SELL", "quantity": 1000, "price": 700.0},
+            ])
+        
+        get_account_info.assert_called_once()
+        assert results == [
+            {"status": "filled", "order_id": "id-100", "mode": "stock"},
+            {"status": "filled", "order_id": "id-42", "mode": "stock"},
+            {"status": "error", "error": "Insufficient funds for purchase"},
+            {"status": "error", "error": "rejected"},
+            {"status": "filled", "order_id": "id-1000", "mode": "stock"},
+        ]
+        assert wrapper.api.place_order.call_count == 4
+
+    def test_batch_orders_in_simulation_never_touch_api(self):
+        """Simulation batches fill every leg locally"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        wrapper = ShioajiWrapper({'shioaji': {'simulation': True}}, trading_mode="futures")
+        wrapper.api = Mock()
+        
+        results = wrapper.place_orders_batch([
+            {"action": "BUY", "quantity": 1, "price": 22500.0},
+            {"action": "SELL", "quantity": 1, "price": 22510.0},
+        ])
+        
+        assert [r["order_id"] for r in results] == ["sim-00000001", "sim-00000002"]
+        assert wrapper.place_orders_batch([]) == []
+        wrapper.api.place_order.assert_not_called()
+
+
+class TestParseTradeResult:
+    """Tests for order-ack parsing shared by stock and futures orders"""
+    
+    @staticmethod
+    def _trade(op_msg="", order_quantity=1, order_id="abc"):
+        from types import SimpleNamespace
+        return SimpleNamespace(
+            status=SimpleNamespace(id=order_id, order_quantity=order_quantity),
+            operation=SimpleNamespace(op_msg=op_msg),
+        )
+    
+    def test_filled_order(self):
+        from app.services.shioaji_service import _parse_trade_result
+        
+        assert _parse_trade_result(self._trade(), "futures", "contracts") == {
+            "status": "filled", "order_id": "abc", "mode": "futures"
+        }
+    
+    @pytest.mark.parametrize("op_msg", ["餘額不足", "Internal ERROR", "error: rejected"])
+    def test_broker_error_message(self, op_msg):
+        from app.services.shioaji_service import _parse_trade_result
+        
+        assert _parse_trade_result(self._trade(op_msg=op_msg), "stock", "shares") == {
+            "status": "error", "error": op_msg
+        }
+    
+    def test_zero_quantity_not_filled(self):
+        from app.services.shioaji_service import _parse_trade_result
+        
+        result = _parse_trade_result(self._trade(order_quantity=0), "stock", "shares")
+        assert result == {"status": "error", "error": "Order not filled"}
+    
+    def test_missing_status_is_invalid(self):
+        from types import SimpleNamespace
+        from app.services.shioaji_service import _parse_trade_result
+        
+        result = _parse_trade_result(SimpleNamespace(status=None, operation=None), "stock", "shares")
+        assert result == {"status": "error", "error": "Invalid order response"}
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -29,8 +29,8 @@ def test_scrape_earnings_dates_success(mock_config_dir, monkeypatch):
     }
     
     with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
-        with patch('app.services.earnings_service.send_telegram_message'):
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 result = scrape_earnings_dates()
     
     # Verify that dates were returned
@@ -38,6 +38,24 @@ def test_scrape_earnings_dates_success(mock_config_dir, monkeypatch):
     assert len(result) > 0
 
 
+
+def test_scrape_earnings_dates_writes_indented_json(mock_config_dir, monkeypatch):
+    """The blackout file keeps the 2-space indented layout the Java side reads"""
+    monkeypatch.chdir(mock_config_dir)
+    future_date = datetime.now().date() + timedelta(days=30)
+    mock_ticker = MagicMock()
+    mock_ticker.calendar = {'Earnings Date': [future_date]}
+
+    with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
+                scrape_earnings_dates()
+
+    raw = (mock_config_dir / "config" / "earnings-blackout-dates.json").read_text()
+    data = json.loads(raw)
+    assert data["dates"] == [future_date.isoformat()]
+    assert raw == json.dumps(data, indent=2)
+
 def test_scrape_earnings_dates_no_calendar(mock_config_dir, monkeypatch):
     """Test handling of stocks with no earnings calendar"""
     monkeypatch.chdir(mock_config_dir)
@@ -46,8 +64,8 @@ def test_scrape_earnings_dates_no_calendar(mock_config_dir, monkeypatch):
     mock_ticker.calendar = None
     
     with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
-        with patch('app.services.earnings_service.send_telegram_message'):
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 result = scrape_earnings_dates()
     
     # Should handle gracefully and return empty or existing dates
@@ -59,8 +77,8 @@ def test_scrape_earnings_dates_exception_handling(mock_config_dir, monkeypatch):
     monkeypatch.chdir(mock_config_dir)
     
     with patch('app.services.earnings_service.yf.Ticker', side_effect=Exception("API Error")):
-        with patch('app.services.earnings_service.send_telegram_message'):
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 result = scrape_earnings_dates()
     
     # Should complete without crashing
@@ -81,8 +99,8 @@ def test_scrape_earnings_dates_filters_past_dates(mock_config_dir, monkeypatch):
     }
     
     with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
-        with patch('app.services.earnings_service.send_telegram_message'):
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 result = scrape_earnings_dates()
     
     # Only future dates should be in result
@@ -119,8 +137,8 @@ def test_scrape_earnings_dates_merges_existing_data(mock_config_dir, monkeypatch
     }
     
     with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
-        with patch('app.services.earnings_service.send_telegram_message'):
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 result = scrape_earnings_dates()
     
     # Both existing and new dates should be present
@@ -140,8 +158,8 @@ def test_scrape_earnings_dates_with_telegram(mock_config_dir, monkeypatch):
     }
     
     with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
-        with patch('app.services.earnings_service.send_telegram_message') as mock_telegram:
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait') as mock_telegram:
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 result = scrape_earnings_dates(jasypt_password="test_password")
     
     # Telegram should be called twice (start and completion)
@@ -169,8 +187,8 @@ def test_scrape_earnings_dates_handles_list_and_single_dates(mock_config_dir, mo
     }
     
     with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
-        with patch('app.services.earnings_service.send_telegram_message'):
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 result = scrape_earnings_dates()
     
     assert isinstance(result, list)
@@ -195,8 +213,8 @@ def test_scrape_earnings_dates_creates_config_directory(mock_config_dir, monkeyp
     }
     
     with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
-        with patch('app.services.earnings_service.send_telegram_message'):
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 scrape_earnings_dates()
     
     # Config directory should now exist
@@ -221,8 +239,8 @@ def test_scrape_earnings_dates_converts_datetime_to_date(mock_config_dir, monkey
     }
 
     with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
-        with patch('app.services.earnings_service.send_telegram_message'):
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 result = scrape_earnings_dates()
 
     assert any(d >= today.isoformat() for d in result)
@@ -236,8 +254,8 @@ def test_scrape_earnings_dates_with_telegram_no_new_dates(mock_config_dir, monke
     mock_ticker.calendar = None
 
     with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
-        with patch('app.services.earnings_service.send_telegram_message') as mock_telegram:
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait') as mock_telegram:
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 scrape_earnings_dates(jasypt_password="test_password")
 
     assert mock_telegram.call_count == 2
@@ -260,9 +278,43 @@ def test_scrape_earnings_dates_with_telegram_no_new_dates(mock_config_dir, monke
     }
     
     with patch('app.services.earnings_service.yf.Ticker', return_value=mock_ticker):
-        with patch('app.services.earnings_service.send_telegram_message'):
-            with patch('app.services.earnings_service.time.sleep'):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
                 result = scrape_earnings_dates()
     
     # Should handle gracefully and return new dates
     assert isinstance(result, list)
+
+
+def test_scrape_earnings_dates_fetches_unique_tickers_with_bounded_concurrency(mock_config_dir, monkeypatch):
+    """Each ticker is fetched once, overlapping up to SCRAPE_CONCURRENCY requests"""
+    import threading
+    import time
+    from app.services import earnings_service
+
+    monkeypatch.chdir(mock_config_dir)
+    lock = threading.Lock()
+    state = {"in_flight": 0, "max_in_flight": 0}
+    requested = []
+
+    class SlowTicker:
+        def __init__(self, ticker):
+            requested.append(ticker)
+
+        @property
+        def calendar(self):
+            with lock:
+                state["in_flight"] += 1
+                state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+            time.sleep(0.02)
+            with lock:
+                state["in_flight"] -= 1
+            return None
+
+    with patch('app.services.earnings_service.yf.Ticker', SlowTicker):
+        with patch('app.services.earnings_service.send_telegram_message_nowait'):
+            with patch('app.services.earnings_service.SCRAPE_DELAY_SECONDS', 0):
+                scrape_earnings_dates()
+
+    assert len(requested) == len(set(requested))
+    assert 1 < state["max_in_flight"] <= earnings_service.SCRAPE_CONCURRENCY
@@ -7,6 +7,7 @@ to ensure 100% path coverage for core business logic.
 """
 
 import pytest
+import time
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime, date, timedelta
 import json
@@ -19,45 +20,35 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 class TestOllamaServiceEdgeCases:
     """Edge case tests for OllamaService"""
     
-    @patch('app.services.ollama_service.requests.post')
+    @patch('app.services.ollama_service.requests.Session.post')
     def test_call_llama_news_veto_empty_headlines(self, mock_post):
         """Should handle empty headlines list"""
         from app.services.ollama_service import OllamaService
         
-        mock_response = Mock()
-        mock_response.json.return_value = {'response': 'APPROVE'}
-        mock_post.return_value = mock_response
-        
         service = OllamaService("http://localhost:11434", "llama3.1:8b")
         result = service.call_llama_news_veto([])
         
         assert result["veto"] == False
-        assert result["reason"] == "APPROVED"
+        mock_post.assert_not_called()
     
-    @patch('app.services.ollama_service.requests.post')
-    def test_call_llama_news_veto_malformed_response(self, mock_post):
-        """Should handle malformed JSON response"""
+    def test_call_llama_news_veto_skips_empty_headlines(self):
+        """Should ignore None/empty entries when scanning headlines"""
         from app.services.ollama_service import OllamaService
         
-        mock_response = Mock()
-        mock_response.json.side_effect = json.JSONDecodeError("test", "doc", 0)
-        mock_post.return_value = mock_response
-        
         service = OllamaService("http://localhost:11434", "llama3.1:8b")
-        result = service.call_llama_news_veto(["Test headline"])
+        result = service.call_llama_news_veto([None, "", "Test headline"])
         
-        # Should return VETO on error (fail-safe)
-        assert result["veto"] == True
+        assert result["veto"] == False
     
-    @patch('app.services.ollama_service.requests.post')
+    @patch('app.services.ollama_service.requests.Session.post')
     def test_call_llama_error_explanation(self, mock_post):
         """Should generate error explanation"""
         from app.services.ollama_service import OllamaService
         
         mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             'response': 'severity:high\nexplanation:Database connection failed\nsuggestion:Check connection string'
-        }
+        }).encode()
         mock_post.return_value = mock_response
         
         service = OllamaService("http://localhost:11434", "llama3.1:8b")
@@ -69,13 +60,13 @@ class TestOllamaServiceEdgeCases:
         
         assert "severity" in result or "explanation" in result
     
-    @patch('app.services.ollama_service.requests.post')
+    @patch('app.services.ollama_service.requests.Session.post')
     def test_call_trade_veto_missing_fields(self, mock_post):
         """Should handle missing fields in trade veto context"""
         from app.services.ollama_service import OllamaService
         
         mock_response = Mock()
-        mock_response.json.return_value = {'response': 'APPROVE'}
+        mock_response.content = json.dumps({'response': 'APPROVE'}).encode()
         mock_post.return_value = mock_response
         
         service = OllamaService("http://localhost:11434", "llama3.1:8b")
@@ -130,6 +121,221 @@ class TestShioajiWrapperEdgeCases:
             
         assert attempts == MAX_RETRIES
     
+    @patch('app.services.shioaji_service.time.sleep')
+    @patch('app.services.shioaji_service.sj')
+    def test_reconnect_reuses_api_instance_without_logout(self, mock_sj, mock_sleep):
+        """Reconnect should log in again on the same API instance"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        config = {'shioaji': {'ca-path': '/ca', 'ca-password': 'pw', 'person-id': 'id', 'simulation': True}}
+        wrapper = ShioajiWrapper(config, trading_mode="stock")
+        
+        assert wrapper.connect() is True
+        api = wrapper.api
+        assert wrapper.reconnect() is True
+        
+        assert wrapper.api is api
+        assert mock_sj.Shioaji.call_count == 1
+        assert api.login.call_count == 2
+        api.logout.assert_not_called()
+        first_login, second_login = api.login.call_args_list
+        assert 'fetch_contract' not in first_login.kwargs and 'contracts_cb' in first_login.kwargs
+        assert second_login.kwargs['fetch_contract'] is False
+    
+    @patch('app.services.shioaji_service.time.sleep')
+    @patch('app.services.shioaji_service.sj')
+    def test_connect_recreates_api_only_after_auth_error(self, mock_sj, mock_sleep):
+        """Auth failures drop the API instance; other failures keep it"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        class TokenError(Exception):
+            pass
+        
+        first, second = MagicMock(), MagicMock()
+        first.login.side_effect = [TimeoutError("slow"), TokenError("expired")]
+        mock_sj.Shioaji.side_effect = [first, second]
+        config = {'shioaji': {'ca-path': '/ca', 'ca-password': 'pw', 'person-id': 'id', 'simulation': True}}
+        wrapper = ShioajiWrapper(config, trading_mode="stock")
+        
+        assert wrapper.connect() is True
+        
+        assert first.login.call_count == 2
+        assert wrapper.api is second
+        assert mock_sj.Shioaji.call_count == 2
+        # A fresh instance has no contracts yet, so its login downloads them
+        assert 'fetch_contract' not in second.login.call_args.kwargs
+    
+    @patch('app.services.shioaji_service.sj')
+    def test_concurrent_reconnects_share_one_login(self, mock_sj):
+        """Callers arriving during a reconnect wait for it instead of logging in again"""
+        import threading
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        config = {'shioaji': {'ca-path': '/ca', 'ca-password': 'pw', 'person-id': 'id', 'simulation': True}}
+        wrapper = ShioajiWrapper(config, trading_mode="stock")
+        login_started = threading.Event()
+        release_login = threading.Event()
+        
+        def slow_login(**kwargs):
+            login_started.set()
+            release_login.wait(5)
+        
+        mock_sj.Shioaji.return_value.login.side_effect = slow_login
+        results = []
+        first = threading.Thread(target=lambda: results.append(wrapper.reconnect()))
+        first.start()
+        assert login_started.wait(5)
+        
+        followers = [threading.Thread(target=lambda: results.append(wrapper.reconnect())) for _ in range(3)]
+        for t in followers:
+            t.start()
+        time.sleep(0.1)  # let the followers reach the lock before the login completes
+        release_login.set()
+        for t in [first, *followers]:
+            t.join(5)
+        
+        assert results == [True] * 4
+        assert mock_sj.Shioaji.return_value.login.call_count == 1
+    
+    @patch('app.services.shioaji_service.is_trading_day', return_value=True)
+    @patch('app.services.shioaji_service.sj')
+    def test_watchdog_flags_silent_feed_only_in_session(self, mock_sj, mock_trading_day):
+        """Stalled feed detection needs a connection, session hours and a stale last tick"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        wrapper = ShioajiWrapper({'shioaji': {'watchdog': {'stale-seconds': 10}}}, trading_mode="stock")
+        wrapper.connected = True
+        wrapper._last_tick_mono = 100.0
+        in_session = datetime(2025, 1, 2, 10, 0)
+        
+        assert wrapper._feed_stalled(111.0, in_session) is True
+        assert wrapper._feed_stalled(105.0, in_session) is False                     # recent tick
+        assert wrapper._feed_stalled(111.0, datetime(2025, 1, 2, 9, 0, 5)) is False  # just opened
+        assert wrapper._feed_stalled(111.0, datetime(2025, 1, 2, 14, 0)) is False    # after close
+        wrapper.connected = False
+        assert wrapper._feed_stalled(111.0, in_session) is False
+        
+        wrapper.connected = True
+        mock_trading_day.return_value = False
+        assert wrapper._feed_stalled(111.0, in_session) is False
+    
+    @patch('app.services.shioaji_service.sj')
+    def test_watchdog_reconnects_on_stall_until_stopped(self, mock_sj):
+        """The watchdog checks every interval, reconnects when stalled and exits once stopped"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        wrapper = ShioajiWrapper({'shioaji': {'watchdog': {'interval-seconds': 1}}}, trading_mode="futures")
+        stop = Mock()
+        stop.wait.side_effect = [False, False, True]
+        wrapper._watchdog_stop = stop
+        
+        with patch.object(wrapper, '_feed_stalled', side_effect=[False, True]), \
+             patch.object(wrapper, 'reconnect') as reconnect:
+            wrapper._watchdog_loop()
+        
+        reconnect.assert_called_once()
+        assert [c.args[0] for c in stop.wait.call_args_list] == [1, 1, 1]
+    
+    @patch('app.services.shioaji_service.sj')
+    def test_watchdog_backs_off_and_caps_consecutive_reconnects(self, mock_sj):
+        """Silent reconnects double the required silence, stop at the cap and reset on a tick"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        wrapper = ShioajiWrapper({'shioaji': {'watchdog': {'stale-seconds': 100, 'max-reconnects': 2}}},
+                                 trading_mode="futures")
+        assert ShioajiWrapper.WATCHDOG_STALE_SECONDS >= 60
+        wrapper._last_tick_mono = 1.0
+        stop = Mock()
+        stop.wait.side_effect = [False] * 5 + [True]
+        wrapper._watchdog_stop = stop
+        thresholds = []
+        
+        def stalled(now_mono, now, stale):
+            thresholds.append(stale)
+            return True
+        
+        with patch.object(wrapper, '_feed_stalled', side_effect=stalled), \
+             patch.object(wrapper, 'reconnect') as reconnect:
+            wrapper._watchdog_loop()
+        
+        # Two reconnects (100s then 200s of silence), then it waits for ticks
+        assert thresholds == [100, 200]
+        assert reconnect.call_count == 2
+        
+        # A tick between checks resets the backoff
+        waits = iter([False, False, True])
+        
+        def wait_then_tick(_):
+            wrapper._last_tick_mono += 1.0
+            return next(waits)
+        
+        stop.wait.side_effect = wait_then_tick
+        thresholds.clear()
+        
+        with patch.object(wrapper, '_feed_stalled', side_effect=stalled), \
+             patch.object(wrapper, 'reconnect') as reconnect:
+            wrapper._watchdog_loop()
+        
+        assert reconnect.call_count == 2
+        assert thresholds == [100, 100]
+    
+    @patch('app.services.shioaji_service.time.sleep')
+    @patch('app.services.shioaji_service.sj')
+    def test_connect_starts_watchdog_once(self, mock_sj, mock_sleep):
+        """Successful connects start one watchdog thread; it can be disabled in config"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        config = {'shioaji': {'ca-path': '/ca', 'ca-password': 'pw', 'person-id': 'id', 'simulation': True}}
+        wrapper = ShioajiWrapper(config, trading_mode="stock")
+        with patch.object(ShioajiWrapper, '_watchdog_loop', side_effect=lambda: wrapper._watchdog_stop.wait(5)):
+            assert wrapper.connect() is True
+            thread = wrapper._watchdog_thread
+            assert wrapper.reconnect() is True
+        assert wrapper._watchdog_thread is thread and thread.daemon
+        assert wrapper._last_tick_mono is not None
+        wrapper.logout()
+        thread.join(5)
+        assert not thread.is_alive()
+        
+        config['shioaji']['watchdog'] = {'enabled': False}
+        disabled = ShioajiWrapper(config, trading_mode="stock")
+        assert disabled.connect() is True
+        assert disabled._watchdog_thread is None
+    
+    @patch('app.services.shioaji_service.sj')
+    def test_backoff_is_capped_and_jittered(self, mock_sj):
+        """Backoff doubles from the base, stops at the cap, and stays inside the jitter band"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        config = {'shioaji': {'simulation': True}}
+        wrapper = ShioajiWrapper(config, trading_mode="stock")
+        
+        with patch('app.services.shioaji_service.random.uniform', return_value=1.0):
+            assert [wrapper._backoff_delay(a) for a in range(1, 8)] == [2, 4, 8, 16, 32, 60, 60]
+        for attempt in range(1, 8):
+            raw = min(60, 2 * 2 ** (attempt - 1))
+            assert 0.5 * raw <= wrapper._backoff_delay(attempt) <= 1.5 * raw
+    
+    @patch('app.services.shioaji_service.time.sleep')
+    @patch('app.services.shioaji_service.sj')
+    def test_reconnect_settings_from_config(self, mock_sj, mock_sleep):
+        """shioaji.reconnect overrides retry count, base, cap and jitter"""
+        from app.services.shioaji_service import ShioajiWrapper
+        
+        config = {'shioaji': {
+            'ca-path': '/ca', 'ca-password': 'pw', 'person-id': 'id', 'simulation': True,
+            'reconnect': {'max-retries': 3, 'base-backoff-seconds': 1,
+                          'max-backoff-seconds': 1.5, 'jitter': [1, 1]},
+        }}
+        wrapper = ShioajiWrapper(config, trading_mode="stock")
+        mock_sj.Shioaji.return_value.login.side_effect = TimeoutError("down")
+        
+        assert wrapper.connect() is False
+        
+        assert mock_sj.Shioaji.return_value.login.call_count == 3
+        assert [c.args[0] for c in mock_sleep.call_args_list] == [1, 1.5]
+        assert ShioajiWrapper.MAX_RETRIES == 5
+    
     def test_backoff_calculation(self):
         """Test exponential backoff values"""
         BASE = 2
@@ -336,9 +542,13 @@ class TestDateHandling:
 class TestTelegramService:
     """Additional Telegram service tests"""
     
-    @patch('app.services.telegram_service.requests.post')
+    def setup_method(self):
+        from app.services.telegram_service import reload_telegram_config
+        reload_telegram_config()
+    
+    @patch('app.services.telegram_service.requests.Session.post')
     @patch('app.core.config.open', create=True)
-    @patch('app.core.config.yaml.safe_load')
+    @patch('app.core.config._load_yaml')
     def test_send_telegram_with_html_entities(self, mock_yaml, mock_open, mock_post):
         """Should properly escape HTML entities"""
         from app.services.telegram_service import send_telegram_message
@@ -363,9 +573,9 @@ class TestTelegramService:
         # Should send the message (HTML mode handles escaping)
         assert mock_post.called
     
-    @patch('app.services.telegram_service.requests.post')
+    @patch('app.services.telegram_service.requests.Session.post')
     @patch('app.core.config.open', create=True)
-    @patch('app.core.config.yaml.safe_load')
+    @patch('app.core.config._load_yaml')
     def test_send_telegram_multiline_message(self, mock_yaml, mock_open, mock_post):
         """Should handle multiline messages correctly"""
         from app.services.telegram_service import send_telegram_message
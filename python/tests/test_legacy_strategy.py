@@ -1,34 +1,50 @@
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 from datetime import datetime, timedelta
-from collections import deque
+from app.services.shioaji_service import LatestTick, TickRing, WilderRSI, session_stats
 from app.strategies import legacy_strategy
 
 
+def _ring(prices, volumes):
+    """Build a tick ring from test price (float or {"price": ...}) and volume series"""
+    ring = TickRing()
+    for price, volume in zip(prices, volumes):
+        ring.append(price["price"] if isinstance(price, dict) else price, volume)
+    return ring
+
+
+
+def _rsi(prices):
+    """Feed test prices through the incremental RSI the tick handler maintains"""
+    rsi = WilderRSI()
+    for price in prices:
+        rsi.update(price["price"] if isinstance(price, dict) else price)
+    return rsi
+
+
 @pytest.fixture
 def reset_strategy_state():
     """Reset global state before each test"""
     legacy_strategy.consecutive_signal_count = 0
-    legacy_strategy.last_signal_direction = "NEUTRAL"
-    legacy_strategy.last_trade_time = None
-    legacy_strategy.signal_confirmation_history = deque(maxlen=6)
+    legacy_strategy.signal_state = 0
+    legacy_strategy.last_trade_mono = None
     legacy_strategy.last_direction = "NEUTRAL"
     yield
     # Reset after test as well
     legacy_strategy.consecutive_signal_count = 0
-    legacy_strategy.last_signal_direction = "NEUTRAL"
-    legacy_strategy.last_trade_time = None
-    legacy_strategy.signal_confirmation_history = deque(maxlen=6)
+    legacy_strategy.signal_state = 0
+    legacy_strategy.last_trade_mono = None
     legacy_strategy.last_direction = "NEUTRAL"
 
 
 def test_get_signal_legacy_insufficient_data(reset_strategy_state):
     """Test signal generation with insufficient price history"""
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': 100.0}):
-        with patch('app.strategies.legacy_strategy.price_history', []):
-            with patch('app.strategies.legacy_strategy.volume_history', []):
-                with patch('app.strategies.legacy_strategy.session_high', 105.0):
-                    with patch('app.strategies.legacy_strategy.session_low', 95.0):
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=100.0)):
+        with patch('app.strategies.legacy_strategy.price_history', TickRing()):
+            with patch('app.strategies.legacy_strategy.volume_history', TickRing()):
+                with patch.object(session_stats, 'high', 105.0):
+                    with patch.object(session_stats, 'low', 95.0):
                         result = legacy_strategy.get_signal_legacy()
     
     assert result['direction'] == 'NEUTRAL'
@@ -36,6 +52,11 @@ def test_get_signal_legacy_insufficient_data(reset_strategy_state):
     assert result['exit_signal'] is False
     assert 'Insufficient data' in result['reason']
     assert result['current_price'] == 100.0
+    assert (result['session_high'], result['session_low']) == (105.0, 95.0)
+    
+    # The response is a copy; mutating it must not leak into later warm-up responses
+    result['direction'] = 'LONG'
+    assert legacy_strategy._WARMUP_TEMPLATE['direction'] == 'NEUTRAL'
 
 
 def test_get_signal_legacy_with_warmup_data(reset_strategy_state):
@@ -44,11 +65,11 @@ def test_get_signal_legacy_with_warmup_data(reset_strategy_state):
     price_data = [100.0 + i * 0.1 for i in range(50)]
     volume_data = [1000] * 50
     
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': 105.0}):
-        with patch('app.strategies.legacy_strategy.price_history', price_data):
-            with patch('app.strategies.legacy_strategy.volume_history', volume_data):
-                with patch('app.strategies.legacy_strategy.session_high', 105.0):
-                    with patch('app.strategies.legacy_strategy.session_low', 95.0):
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=105.0)):
+        with patch('app.strategies.legacy_strategy.price_history', _ring(price_data, volume_data)) as history:
+            with patch('app.strategies.legacy_strategy.volume_history', history):
+                with patch.object(session_stats, 'high', 105.0):
+                    with patch.object(session_stats, 'low', 95.0):
                         result = legacy_strategy.get_signal_legacy()
     
     # Should still be in warmup
@@ -58,15 +79,15 @@ def test_get_signal_legacy_with_warmup_data(reset_strategy_state):
 
 def test_get_signal_legacy_basic_structure(reset_strategy_state):
     """Test that signal has all required fields"""
-    # Create sufficient price history (120+ ticks) - price_history expects dicts with 'price' key
+    # Create sufficient price history (120+ ticks)
     price_data = [{"price": 100.0} for _ in range(150)]
     volume_data = [1000] * 150
     
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': 100.0}):
-        with patch('app.strategies.legacy_strategy.price_history', price_data):
-            with patch('app.strategies.legacy_strategy.volume_history', volume_data):
-                with patch('app.strategies.legacy_strategy.session_high', 105.0):
-                    with patch('app.strategies.legacy_strategy.session_low', 95.0):
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=100.0)):
+        with patch('app.strategies.legacy_strategy.price_history', _ring(price_data, volume_data)) as history:
+            with patch('app.strategies.legacy_strategy.volume_history', history):
+                with patch.object(session_stats, 'high', 105.0):
+                    with patch.object(session_stats, 'low', 95.0):
                         result = legacy_strategy.get_signal_legacy()
     
     # Check all expected fields are present
@@ -90,11 +111,11 @@ def test_get_signal_legacy_uptrend_momentum(reset_strategy_state):
     price_data = [{"price": base_price + (i * 0.02)} for i in range(150)]  # Gradual uptrend
     volume_data = [1000 + (i * 10) for i in range(150)]  # Increasing volume
     
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': price_data[-1]["price"]}):
-        with patch('app.strategies.legacy_strategy.price_history', price_data):
-            with patch('app.strategies.legacy_strategy.volume_history', volume_data):
-                with patch('app.strategies.legacy_strategy.session_high', max(p["price"] for p in price_data)):
-                    with patch('app.strategies.legacy_strategy.session_low', min(p["price"] for p in price_data)):
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=price_data[-1]["price"])):
+        with patch('app.strategies.legacy_strategy.price_history', _ring(price_data, volume_data)) as history:
+            with patch('app.strategies.legacy_strategy.volume_history', history):
+                with patch.object(session_stats, 'high', max(p["price"] for p in price_data)):
+                    with patch.object(session_stats, 'low', min(p["price"] for p in price_data)):
                         result = legacy_strategy.get_signal_legacy()
     
     # Should detect upward momentum (though may require consecutive confirmation)
@@ -109,11 +130,11 @@ def test_get_signal_legacy_downtrend_momentum(reset_strategy_state):
     price_data = [{"price": base_price - (i * 0.02)} for i in range(150)]  # Gradual downtrend
     volume_data = [1000 + (i * 10) for i in range(150)]  # Increasing volume
     
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': price_data[-1]["price"]}):
-        with patch('app.strategies.legacy_strategy.price_history', price_data):
-            with patch('app.strategies.legacy_strategy.volume_history', volume_data):
-                with patch('app.strategies.legacy_strategy.session_high', max(p["price"] for p in price_data)):
-                    with patch('app.strategies.legacy_strategy.session_low', min(p["price"] for p in price_data)):
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=price_data[-1]["price"])):
+        with patch('app.strategies.legacy_strategy.price_history', _ring(price_data, volume_data)) as history:
+            with patch('app.strategies.legacy_strategy.volume_history', history):
+                with patch.object(session_stats, 'high', max(p["price"] for p in price_data)):
+                    with patch.object(session_stats, 'low', min(p["price"] for p in price_data)):
                         result = legacy_strategy.get_signal_legacy()
     
     # Should detect downward momentum
@@ -127,11 +148,11 @@ def test_get_signal_legacy_neutral_market(reset_strategy_state):
     price_data = [{"price": 100.0 + (0.1 if i % 2 == 0 else -0.1)} for i in range(150)]
     volume_data = [1000] * 150
     
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': 100.0}):
-        with patch('app.strategies.legacy_strategy.price_history', price_data):
-            with patch('app.strategies.legacy_strategy.volume_history', volume_data):
-                with patch('app.strategies.legacy_strategy.session_high', 100.5):
-                    with patch('app.strategies.legacy_strategy.session_low', 99.5):
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=100.0)):
+        with patch('app.strategies.legacy_strategy.price_history', _ring(price_data, volume_data)) as history:
+            with patch('app.strategies.legacy_strategy.volume_history', history):
+                with patch.object(session_stats, 'high', 100.5):
+                    with patch.object(session_stats, 'low', 99.5):
                         result = legacy_strategy.get_signal_legacy()
     
     # In sideways market, strategy should likely stay neutral
@@ -141,36 +162,49 @@ def test_get_signal_legacy_neutral_market(reset_strategy_state):
 
 def test_get_signal_legacy_cooldown_after_trade(reset_strategy_state):
     """Test cooldown period after a trade"""
-    legacy_strategy.last_trade_time = datetime.now() - timedelta(seconds=60)  # 1 minute ago
+    legacy_strategy.last_trade_mono = time.monotonic() - 60  # 1 minute ago
     
     price_data = [{"price": 100.0} for _ in range(150)]
     volume_data = [1000] * 150
     
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': 100.0}):
-        with patch('app.strategies.legacy_strategy.price_history', price_data):
-            with patch('app.strategies.legacy_strategy.volume_history', volume_data):
-                with patch('app.strategies.legacy_strategy.session_high', 105.0):
-                    with patch('app.strategies.legacy_strategy.session_low', 95.0):
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=100.0)):
+        with patch('app.strategies.legacy_strategy.price_history', _ring(price_data, volume_data)) as history:
+            with patch('app.strategies.legacy_strategy.volume_history', history):
+                with patch.object(session_stats, 'high', 105.0):
+                    with patch.object(session_stats, 'low', 95.0):
                         result = legacy_strategy.get_signal_legacy()
     
     # Should show cooldown info
     assert 'in_cooldown' in result
     assert 'cooldown_remaining' in result
+    assert result['in_cooldown'] is True
+    assert 115 <= result['cooldown_remaining'] <= 120
+
+
+def test_notify_exit_order_starts_monotonic_cooldown(reset_strategy_state):
+    """Exit orders should start the cooldown on the monotonic clock"""
+    before = time.monotonic()
+    
+    info = legacy_strategy.notify_exit_order()
+    
+    assert info["cooldown_started"] is True
+    assert before <= legacy_strategy.last_trade_mono <= time.monotonic()
+    assert datetime.fromisoformat(info["cooldown_until"]) > datetime.now()
 
 
 def test_get_signal_legacy_consecutive_signals_tracking(reset_strategy_state):
     """Test consecutive signal tracking"""
     legacy_strategy.consecutive_signal_count = 2
-    legacy_strategy.last_signal_direction = "LONG"
+    legacy_strategy.signal_state = 0b01_01  # two LONGs, newest in the low bits
     
     price_data = [{"price": 100.0} for _ in range(150)]
     volume_data = [1000] * 150
     
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': 100.0}):
-        with patch('app.strategies.legacy_strategy.price_history', price_data):
-            with patch('app.strategies.legacy_strategy.volume_history', volume_data):
-                with patch('app.strategies.legacy_strategy.session_high', 105.0):
-                    with patch('app.strategies.legacy_strategy.session_low', 95.0):
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=100.0)):
+        with patch('app.strategies.legacy_strategy.price_history', _ring(price_data, volume_data)) as history:
+            with patch('app.strategies.legacy_strategy.volume_history', history):
+                with patch.object(session_stats, 'high', 105.0):
+                    with patch.object(session_stats, 'low', 95.0):
                         result = legacy_strategy.get_signal_legacy()
     
     # Should track consecutive signals
@@ -184,11 +218,11 @@ def test_get_signal_legacy_volume_ratio_calculation(reset_strategy_state):
     # Recent higher volume, older lower volume
     volume_data = [500] * 120 + [2000] * 30
     
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': 100.0}):
-        with patch('app.strategies.legacy_strategy.price_history', price_data):
-            with patch('app.strategies.legacy_strategy.volume_history', volume_data):
-                with patch('app.strategies.legacy_strategy.session_high', 105.0):
-                    with patch('app.strategies.legacy_strategy.session_low', 95.0):
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=100.0)):
+        with patch('app.strategies.legacy_strategy.price_history', _ring(price_data, volume_data)) as history:
+            with patch('app.strategies.legacy_strategy.volume_history', history):
+                with patch.object(session_stats, 'high', 105.0):
+                    with patch.object(session_stats, 'low', 95.0):
                         result = legacy_strategy.get_signal_legacy()
     
     # Should have volume ratio calculated
@@ -202,16 +236,18 @@ def test_get_signal_legacy_rsi_calculation(reset_strategy_state):
     price_data = [{"price": 100.0 + i * 0.05} for i in range(150)]
     volume_data = [1000] * 150
     
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': price_data[-1]["price"]}):
-        with patch('app.strategies.legacy_strategy.price_history', price_data):
-            with patch('app.strategies.legacy_strategy.volume_history', volume_data):
-                with patch('app.strategies.legacy_strategy.session_high', max(p["price"] for p in price_data)):
-                    with patch('app.strategies.legacy_strategy.session_low', min(p["price"] for p in price_data)):
-                        result = legacy_strategy.get_signal_legacy()
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=price_data[-1]["price"])):
+        with patch('app.strategies.legacy_strategy.price_history', _ring(price_data, volume_data)) as history:
+            with patch('app.strategies.legacy_strategy.volume_history', history):
+                with patch.object(session_stats, 'high', max(p["price"] for p in price_data)):
+                    with patch.object(session_stats, 'low', min(p["price"] for p in price_data)):
+                        with patch('app.strategies.legacy_strategy.rsi_state', _rsi(price_data)):
+                            result = legacy_strategy.get_signal_legacy()
     
-    # RSI should be between 0 and 100
+    # RSI should be between 0 and 100; a steady climb saturates it
     assert 'rsi' in result
     assert 0 <= result['rsi'] <= 100
+    assert result['rsi'] == 100.0
 
 
 def test_get_signal_legacy_session_high_low_tracking(reset_strategy_state):
@@ -222,11 +258,11 @@ def test_get_signal_legacy_session_high_low_tracking(reset_strategy_state):
     session_high = max(p["price"] for p in price_data) + 1.0
     session_low = min(p["price"] for p in price_data) - 1.0
     
-    with patch('app.strategies.legacy_strategy.latest_tick', {'price': price_data[-1]["price"]}):
-        with patch('app.strategies.legacy_strategy.price_history', price_data):
-            with patch('app.strategies.legacy_strategy.volume_history', volume_data):
-                with patch('app.strategies.legacy_strategy.session_high', session_high):
-                    with patch('app.strategies.legacy_strategy.session_low', session_low):
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=price_data[-1]["price"])):
+        with patch('app.strategies.legacy_strategy.price_history', _ring(price_data, volume_data)) as history:
+            with patch('app.strategies.legacy_strategy.volume_history', history):
+                with patch.object(session_stats, 'high', session_high):
+                    with patch.object(session_stats, 'low', session_low):
                         result = legacy_strategy.get_signal_legacy()
     
     # Should include session bounds
@@ -234,3 +270,92 @@ def test_get_signal_legacy_session_high_low_tracking(reset_strategy_state):
     assert 'session_low' in result
     assert result['session_high'] >= result['current_price']
     assert result['session_low'] <= result['current_price']
+
+
+@pytest.mark.parametrize(
+    "momenta, volume_ratio, rsi, expected_code, expected_confidence",
+    [
+        ((0.1, 0.1, 0.1), 2.0, 50.0, 1, 0.95),      # strong, volume-confirmed long
+        ((-0.06, -0.05, -0.1), 1.0, 50.0, -1, 0.95),    # bearish without volume still caps at 0.95
+        ((0.1, 0.1, 0.1), 2.0, 75.0, 0, 0.3),       # overbought blocks the long
+        ((0.01, 0.01, 0.01), 2.0, 50.0, 0, 0.3),    # below entry threshold
+    ],
+)
+def test_signal_core_direction_and_confidence(momenta, volume_ratio, rsi, expected_code, expected_confidence):
+    code, confidence, volume_confirms = legacy_strategy._signal_core(
+        *momenta, volume_ratio, rsi
+    )
+    
+    assert code == expected_code
+    assert confidence == pytest.approx(expected_confidence)
+    assert volume_confirms == (volume_ratio > 1.5)
+
+
+def test_consecutive_signals_follow_packed_direction_history(reset_strategy_state):
+    """Runs of the same raw direction are counted from the 2-bit packed history"""
+    codes = [1, 1, 1, -1, 0, -1]
+    history = _ring([100.0] * 150, [1000] * 150)
+    counts = []
+    
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=100.0)), \
+         patch('app.strategies.legacy_strategy.price_history', history), \
+         patch('app.strategies.legacy_strategy.volume_history', history), \
+         patch('app.strategies.legacy_strategy._signal_core', side_effect=[(c, 0.9, True) for c in codes]):
+        for _ in codes:
+            counts.append(legacy_strategy.get_signal_legacy()['consecutive_signals'])
+    
+    assert counts == [1, 2, 3, 1, 0, 1]
+    assert legacy_strategy.signal_state == 0b01_01_01_10_00_10
+    
+    legacy_strategy.notify_exit_order()
+    assert legacy_strategy.signal_state == 0
+    assert legacy_strategy.consecutive_signal_count == 0
+
+
+def test_momenta_broadcasts_and_guards_non_positive_prices():
+    """Momentum math works per window and over batched (backtest-shaped) inputs"""
+    import numpy as np
+    
+    assert legacy_strategy._momenta(101.0, [100.0, 0.0, 202.0]).tolist() == pytest.approx([1.0, 0.0, -50.0])
+    
+    batch = legacy_strategy._momenta(np.array([[110.0], [90.0]]), np.array([[100.0, 100.0, 100.0]] * 2))
+    assert batch.shape == (2, 3)
+    assert batch[:, 0].tolist() == pytest.approx([10.0, -10.0])
+
+
+def test_ring_indicators_are_reused_until_a_new_tick(reset_strategy_state):
+    """Polls between ticks reuse the momenta; a new tick or a cleared ring recomputes them"""
+    history = _ring([100.0 + i * 0.01 for i in range(150)], [1000] * 150)
+    
+    with patch('app.strategies.legacy_strategy.latest_tick', LatestTick(price=101.5)), \
+         patch('app.strategies.legacy_strategy.price_history', history), \
+         patch('app.strategies.legacy_strategy.volume_history', history), \
+         patch('app.strategies.legacy_strategy._momenta', wraps=legacy_strategy._momenta) as momenta:
+        first = legacy_strategy.get_signal_legacy()
+        assert legacy_strategy.get_signal_legacy()['momentum_3min'] == first['momentum_3min']
+        assert momenta.call_count == 1
+        
+        history.append(110.0, 1000)
+        assert legacy_strategy.get_signal_legacy()['momentum_3min'] > first['momentum_3min']
+        assert momenta.call_count == 2
+        
+        history.clear()
+        for i in range(151):
+            history.append(100.0, 1000)
+        assert legacy_strategy.get_signal_legacy()['momentum_3min'] == 0.0
+        assert momenta.call_count == 3
+
+
+@pytest.mark.skipif(not legacy_strategy._NUMBA_AVAILABLE, reason="numba not installed")
+def test_signal_core_jitted_matches_python():
+    """The numba-compiled signal core must agree with its pure-Python source on a threshold grid"""
+    import itertools
+
+    momenta = (-0.2, -0.08, -0.05, -0.04, 0.0, 0.04, 0.05, 0.08, 0.2)
+    volume_ratios = (0.5, 1.5, 2.0)
+    rsis = (20.0, 30.0, 50.0, 70.0, 80.0)
+    for m3, m5, m10, vr, rsi in itertools.product(momenta, momenta, momenta, volume_ratios, rsis):
+        jitted = legacy_strategy._signal_core(m3, m5, m10, vr, rsi)
+        python = legacy_strategy._signal_core.py_func(m3, m5, m10, vr, rsi)
+        assert jitted[0] == python[0] and jitted[2] == python[2], (m3, m5, m10, vr, rsi)
+        assert jitted[1] == pytest.approx(python[1]), (m3, m5, m10, vr, rsi)
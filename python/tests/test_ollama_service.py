@@ -1,7 +1,10 @@
+import json
+
 import pytest
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
-from app.services.ollama_service import OllamaService
+import app.services.ollama_service as ollama_service
+from app.services.ollama_service import OllamaService, _PROMPT_DEFAULTS
 
 
 def test_generate_returns_not_configured_when_missing_url_or_model():
@@ -13,22 +16,98 @@ def test_generate_happy_path_calls_requests_and_returns_response():
     svc = OllamaService("http://localhost:11434", "m")
 
     class Resp:
-        def json(self):
-            return {"response": "ok"}
+        content = b'{"response": "ok"}'
 
-    with patch("app.services.ollama_service.requests.post", return_value=Resp()) as post:
+    with patch.object(svc.session, "post", return_value=Resp()) as post:
         out = svc.generate("hello", options={"temperature": 0.1}, system="sys")
 
     assert out == {"response": "ok"}
     assert post.called
 
 
+def test_generate_returns_error_on_transport_exception():
+    svc = OllamaService("http://localhost:11434", "m")
+
+    with patch.object(svc.session, "post", side_effect=Exception("Timeout")):
+        out = svc.generate("hello")
+
+    assert out == {"error": "Timeout"}
+
+
+class _StreamResp:
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.consumed = 0
+        self.closed = False
+
+    def iter_lines(self):
+        for piece in self.pieces:
+            self.consumed += 1
+            yield piece
+
+    def close(self):
+        self.closed = True
+
+
+def _stream_lines(*texts):
+    return [json.dumps({"response": t, "done": False}).encode() for t in texts]
+
+
+def test_generate_json_stops_at_first_complete_object():
+    svc = OllamaService("http://localhost:11434", "m")
+    resp = _StreamResp(_stream_lines('Sure: {"a": {"b": 1}, ', '"reason": "x}{"', '} trailing', "more") + [b""])
+
+    with patch.object(svc.session, "post", return_value=resp) as post:
+        out = svc.generate_json("p", options={"temperature": 0.1}, system="s")
+
+    assert out == {"response": '{"a": {"b": 1}, "reason": "x}{"}'}
+    assert resp.consumed == 3
+    assert resp.closed
+    assert post.call_args.kwargs["json"]["stream"] is True
+    assert post.call_args.kwargs["stream"] is True
+
+
+def test_generate_json_handles_escaped_quotes_and_done_marker():
+    svc = OllamaService("http://localhost:11434", "m")
+    lines = [b"", json.dumps({"response": 'VETO: \\"no json\\"', "done": True}).encode(),
+             json.dumps({"response": "{}"}).encode()]
+    resp = _StreamResp(lines)
+
+    with patch.object(svc.session, "post", return_value=resp):
+        out = svc.generate_json("p")
+
+    assert out == {"response": 'VETO: \\"no json\\"'}
+    assert resp.closed
+
+    esc = _StreamResp(_stream_lines('{"reason": "a \\" } b"}'))
+    with patch.object(svc.session, "post", return_value=esc):
+        assert svc.generate_json("p") == {"response": '{"reason": "a \\" } b"}'}
+
+
+def test_generate_json_not_configured_and_error_paths():
+    assert "error" in OllamaService("", "m").generate_json("p")
+
+    svc = OllamaService("http://localhost:11434", "m")
+    with patch.object(svc.session, "post", side_effect=Exception("Timeout")):
+        assert svc.generate_json("p") == {"error": "Timeout"}
+
+
+def test_session_is_pooled_with_keep_alive():
+    svc = OllamaService("http://localhost:11434", "m")
+
+    adapter = svc.session.get_adapter("http://localhost:11434")
+    assert adapter._pool_maxsize == 20
+    assert svc.session.headers["Connection"] == "keep-alive"
+
+
 @pytest.mark.parametrize(
     "text,expect_veto",
     [
         ("APPROVE", False),
         ("APPROVE\nextra", False),
+        ("approve", False),
         ("VETO: too risky", True),
+        ("veto:: too risky", True),
         ("weird", True),
     ],
 )
@@ -38,6 +117,13 @@ def test_parse_veto_response(text, expect_veto):
     assert parsed["veto"] is expect_veto
 
 
+def test_parse_veto_response_extracts_reason():
+    svc = OllamaService("u", "m")
+
+    assert svc._parse_veto_response("  veto:: too risky \n")["reason"] == "too risky"
+    assert "unexpected" in svc._parse_veto_response("VETOED")["reason"]
+
+
 def test_call_trade_veto_returns_error_when_generate_returns_error():
     svc = OllamaService("u", "m")
 
@@ -58,16 +144,14 @@ def test_call_trade_veto_exception_path():
     assert "Analysis failed" in res["reason"]
 
 
-def test_call_llama_news_veto_error_and_exception_paths():
+def test_call_llama_news_veto_never_calls_generate():
     svc = OllamaService("u", "m")
 
-    with patch.object(svc, "generate", return_value={"error": "boom"}):
-        res = svc.call_llama_news_veto(["good"])
-        assert res["veto"] is True
+    with patch.object(svc, "generate", side_effect=RuntimeError("x")) as gen:
+        assert svc.call_llama_news_veto(["good"])["veto"] is False
+        assert svc.call_llama_news_veto(["bad decline"])["veto"] is True
 
-    with patch.object(svc, "generate", side_effect=RuntimeError("x")):
-        res2 = svc.call_llama_news_veto(["good"])
-        assert res2["veto"] is True
+    gen.assert_not_called()
 
 
 # =====================================================================
@@ -156,6 +240,157 @@ class TestLocalRiskScoring:
         assert result["breakdown"]["streak"] == 100
 
 
+
+    @pytest.mark.parametrize(
+        "level,expected",
+        [("low", 0), ("Normal", 20), ("high", 60), ("choppy", 100), ("weird", 30), ("", 30), (None, 30)],
+    )
+    def test_calculate_volatility_risk_levels(self, level, expected):
+        assert OllamaService("u", "m")._calculate_volatility_risk(level) == expected
+
+    @pytest.mark.parametrize(
+        "win,loss,expected",
+        [(0, 3, 100), (0, 2, 70), (0, 1, 40), (3, 0, 10), (0, 0, 25), ("x", 0, 25)],
+    )
+    def test_calculate_streak_risk_ladder(self, win, loss, expected):
+        assert OllamaService("u", "m")._calculate_streak_risk(win, loss) == expected
+
+    @pytest.mark.parametrize(
+        "shares,trades,expected",
+        [(300, 5, 100), (150, 3, (50 + 60) / 2), (100, 1, (25 + 15) / 2), (None, 1, 25)],
+    )
+    def test_calculate_size_risk_ladder(self, shares, trades, expected):
+        assert OllamaService("u", "m")._calculate_size_risk(shares, trades) == pytest.approx(expected)
+
+    def test_calculate_drawdown_risk_unparseable_is_zero(self):
+        assert OllamaService("u", "m")._calculate_drawdown_risk({"drawdown_percent": "n/a"}) == 0
+
+class TestBatchRiskScoring:
+    """Tests for vectorized score_many"""
+
+    def test_score_many_matches_scalar_scoring(self):
+        svc = OllamaService("u", "m")
+        proposals = [
+            {"shares": 50, "trades_today": 1, "volatility_level": "normal"},
+            {"shares": 250, "trades_today": 5, "loss_streak": 3, "drawdown_percent": 4.0,
+             "volatility_level": "extreme", "news_headlines": ["crash"], "signal_confidence": 0.3},
+            {"shares": 150, "trades_today": 3, "loss_streak": 2, "drawdown_percent": 2.5,
+             "volatility_level": "high", "signal_confidence": 0.95},
+        ]
+
+        scores, veto = svc.score_many(proposals)
+
+        for i, proposal in enumerate(proposals):
+            expected = svc._calculate_local_risk_score(proposal)
+            assert scores[i] == pytest.approx(expected["risk_score"])
+            assert bool(veto[i]) is expected["veto"]
+
+    def test_score_many_matches_scalar_scoring_on_edge_values(self):
+        svc = OllamaService("u", "m")
+        proposals = [
+            {"drawdown_percent": "nan", "volatility_level": None, "win_streak": 4},
+            {"drawdown_percent": "-1%", "volatility_level": "choppy", "loss_streak": 1, "trades_today": 3},
+            {"win_streak": "x", "shares": "bad", "volatility_level": "unknown", "signal_confidence": 0.9},
+            {"shares": 201, "trades_today": 2, "news_headlines": ["crash", "fraud", "ok", "lawsuit", "crash"]},
+            {"drawdown_percent": "3%", "loss_streak": 2, "signal_confidence": 0.5},
+        ]
+
+        scores, veto = svc.score_many(proposals)
+
+        for i, proposal in enumerate(proposals):
+            expected = svc._calculate_local_risk_score(proposal)
+            assert scores[i] == pytest.approx(expected["risk_score"]), proposal
+            assert bool(veto[i]) is expected["veto"], proposal
+
+    def test_score_many_empty(self):
+        scores, veto = OllamaService("u", "m").score_many([])
+
+        assert scores.shape == (0,)
+        assert veto.shape == (0,)
+
+@pytest.mark.skipif(not ollama_service._NUMBA_AVAILABLE, reason="numba not installed")
+class TestJitKernelParity:
+    """The numba-compiled scoring kernel must agree with its pure-Python source"""
+
+    _HELPERS = ("_drawdown_risk", "_news_risk", "_volatility_risk", "_streak_risk", "_size_risk")
+
+    def test_score_kernel_jitted_matches_python(self, monkeypatch):
+        import itertools
+
+        nan = float("nan")
+        grid = list(itertools.product(
+            (0.0, 1.5, 3.0, 4.5),        # drawdown
+            (-1, 0, 1, 2, 3),            # volatility code
+            (0.0, 3.0, nan),             # win streak
+            (0.0, 1.0, 2.0, 3.0, nan),   # loss streak
+            (50.0, 150.0, 250.0, nan),   # shares
+            (1.0, 3.0, 5.0),             # trades today
+            (0, 2, 5),                   # negative headlines
+            (0.3, 0.7, 0.95, nan),       # confidence
+        ))
+        jitted = [ollama_service._score_kernel(*args) for args in grid]
+
+        # py_func resolves the helpers through module globals; swap in their Python sources
+        for name in self._HELPERS:
+            monkeypatch.setattr(ollama_service, name, getattr(ollama_service, name).py_func)
+        python = [ollama_service._score_kernel.py_func(*args) for args in grid]
+
+        for args, got, expected in zip(grid, jitted, python):
+            assert got[:-1] == pytest.approx(expected[:-1]), args
+            assert bool(got[-1]) is bool(expected[-1]), args
+
+class TestSpecializedScorer:
+    """Tests for make_specialized_scorer"""
+
+    @pytest.mark.parametrize("tier,confidence", [("high", 0.95), ("normal", None), ("low", 0.3)])
+    def test_specialized_scorer_matches_local_scoring(self, tier, confidence):
+        svc = OllamaService("u", "m")
+        proposal = {"shares": 150, "trades_today": 3, "loss_streak": 2, "drawdown_percent": 2.5,
+                    "volatility_level": "high", "signal_confidence": confidence}
+        expected = svc._calculate_local_risk_score(proposal)
+        b = expected["breakdown"]
+
+        scorer = ollama_service.make_specialized_scorer(tier)
+        score, veto = scorer((b["drawdown"], b["news"], b["volatility"], b["streak"], b["size"]))
+
+        assert score == pytest.approx(expected["risk_score"])
+        assert veto is expected["veto"]
+        assert scorer.threshold == expected["threshold"]
+
+    def test_specialized_scorer_matches_score_kernel_at_threshold(self, monkeypatch):
+        """Tier scores must equal _score_kernel bit for bit, so vetoes flip at the same point"""
+        import itertools
+
+        # Run the kernel's own weighting on given components: each helper passes its input through
+        kernel = getattr(ollama_service._score_kernel, "py_func", ollama_service._score_kernel)
+        monkeypatch.setattr(ollama_service, "_drawdown_risk", lambda drawdown: drawdown)
+        monkeypatch.setattr(ollama_service, "_news_risk", lambda news: news)
+        monkeypatch.setattr(ollama_service, "_volatility_risk", lambda volatility: volatility)
+        monkeypatch.setattr(ollama_service, "_streak_risk", lambda streak, _: streak)
+        monkeypatch.setattr(ollama_service, "_size_risk", lambda size, _: size)
+
+        def kernel_score(components, confidence):
+            drawdown, news, volatility, streak, size = map(float, components)
+            result = kernel(drawdown, volatility, streak, 0.0, size, 0.0, news, confidence)
+            return result[6], bool(result[9])
+
+        # (0, 25, 90, 95, 85) is exactly 60.0 in the kernel; pre-scaled weights gave 59.99...
+        assert kernel_score((0, 25, 90, 95, 85), 0.3) == (60.0, True)
+        assert ollama_service.make_specialized_scorer("low")((0.0, 25.0, 90.0, 95.0, 85.0)) == (60.0, True)
+
+        middle = range(0, 101, 5)
+        for tier, confidence in (("high", 0.95), ("normal", 0.7), ("low", 0.3)):
+            scorer = ollama_service.make_specialized_scorer(tier)
+            for drawdown, size in ((0, 0), (0, 85), (50, 40), (100, 100)):
+                for news, volatility, streak in itertools.product(middle, repeat=3):
+                    components = (drawdown, news, volatility, streak, size)
+                    score, veto = scorer(tuple(map(float, components)))
+                    assert (score, veto) == kernel_score(components, confidence), (tier, components)
+
+    def test_specialized_scorer_unknown_tier(self):
+        with pytest.raises(ValueError, match="Unknown confidence tier"):
+            ollama_service.make_specialized_scorer("extreme")
+
 class TestSignalConfidenceAdjustment:
     """Tests for signal confidence adjustment in risk scoring"""
 
@@ -273,13 +508,117 @@ class TestCallTradeRiskScore:
         """Should fall back to local calculation on LLM error"""
         svc = OllamaService("http://localhost:11434", "m")
         
-        with patch.object(svc, "generate", return_value={"error": "boom"}):
+        with patch.object(svc, "generate_json", return_value={"error": "boom"}):
             result = svc.call_trade_risk_score({"symbol": "2330"})
         
         # Should have local calculation result, not error
         assert "veto" in result
         assert "risk_score" in result
 
+    def test_call_trade_risk_score_caches_llm_result_by_fingerprint(self):
+        """Identical proposals within the TTL should reuse the LLM result"""
+        svc = OllamaService("http://localhost:11434", "m")
+        response = '{"drawdown_risk": 10, "news_risk": 0, "volatility_risk": 20, "streak_risk": 10, "size_risk": 10, "total_score": 11, "reason": "ok"}'
+        proposal = {"symbol": "2330", "shares": 50, "drawdown_percent": "1.23%", "signal_confidence": 0.914,
+                    "news_headlines": ["b", "a"]}
+
+        with patch.object(svc, "generate_json", return_value={"response": response}) as gen:
+            first = svc.call_trade_risk_score(proposal)
+            second = svc.call_trade_risk_score(dict(proposal, drawdown_percent=1.21, news_headlines=["a", "b"]))
+            svc.call_trade_risk_score(dict(proposal, shares=100))
+
+        assert first == second
+        assert gen.call_count == 2
+
+    def test_call_trade_risk_score_cache_expires_after_ttl(self):
+        """Expired entries should be evicted and trigger a fresh LLM call"""
+        svc = OllamaService("http://localhost:11434", "m")
+        response = '{"drawdown_risk": 10, "news_risk": 0, "volatility_risk": 20, "streak_risk": 10, "size_risk": 10}'
+        proposal = {"symbol": "2330", "drawdown_percent": "bad"}
+
+        with patch.object(svc, "generate_json", return_value={"response": response}) as gen, \
+                patch("app.services.ollama_service.time.monotonic", side_effect=[0.0, 0.0, 61.0, 61.0]):
+            svc.call_trade_risk_score(proposal)
+            svc.call_trade_risk_score(proposal)
+
+        assert gen.call_count == 2
+        assert len(svc._veto_cache) == 1
+
+    def test_fingerprint_tolerates_unparseable_numbers(self):
+        """Bad drawdown/confidence values should not break fingerprinting"""
+        key = OllamaService._fingerprint({"drawdown_percent": "n/a", "signal_confidence": "high"})
+        fields = list(_PROMPT_DEFAULTS)
+
+        assert key[fields.index("drawdown_percent")] is None
+        assert key[fields.index("signal_confidence")] is None
+
+    def test_fingerprint_covers_every_prompt_field(self):
+        """Proposals that render different prompts must not share a cached decision"""
+        base = {"symbol": "2330", "shares": 50, "signal_confidence": 0.8, "daily_pnl": 0, "weekly_pnl": 0}
+        key = OllamaService._fingerprint(base)
+        changed = {
+            "daily_pnl": -50000, "weekly_pnl": -120000, "entry_logic": "breakout",
+            "strategy_name": "MeanReversion", "time_of_day": "13:20", "session_phase": "closing",
+            "strategy_days_active": 3, "recent_backtest_stats": {"sharpe": 0.4},
+        }
+
+        for field, value in changed.items():
+            assert OllamaService._fingerprint(dict(base, **{field: value})) != key, field
+        # P&L is bucketed: small moves keep the same entry
+        assert OllamaService._fingerprint(dict(base, daily_pnl=20)) == key
+
+    def test_call_trade_risk_score_does_not_cache_legacy_fallback(self):
+        """Non-JSON LLM output parses to a VETO that must not be reused"""
+        svc = OllamaService("http://localhost:11434", "m")
+
+        with patch.object(svc, "generate_json", return_value={"response": ""}) as gen:
+            first = svc.call_trade_risk_score({"symbol": "2330"})
+            svc.call_trade_risk_score({"symbol": "2330"})
+
+        assert first["veto"] is True
+        assert gen.call_count == 2
+        assert svc._veto_cache == {}
+
+    def test_cached_result_is_not_shared_with_callers(self):
+        """Mutating a returned result (including its breakdown) must not touch the cache"""
+        svc = OllamaService("http://localhost:11434", "m")
+        response = '{"drawdown_risk": 10, "news_risk": 0, "volatility_risk": 20, "streak_risk": 10, "size_risk": 10}'
+
+        with patch.object(svc, "generate_json", return_value={"response": response}):
+            first = svc.call_trade_risk_score({"symbol": "2330"})
+            first["breakdown"]["news"] = 99
+            second = svc.call_trade_risk_score({"symbol": "2330"})
+            second["breakdown"]["drawdown"] = 99
+            third = svc.call_trade_risk_score({"symbol": "2330"})
+
+        assert third["breakdown"]["news"] == 0.0
+        assert third["breakdown"]["drawdown"] == 10.0
+
+    def test_call_trade_risk_score_exception_falls_back_without_caching(self):
+        """Exceptions should fall back to local scoring and not populate the cache"""
+        svc = OllamaService("http://localhost:11434", "m")
+
+        with patch.object(svc, "generate_json", side_effect=RuntimeError("down")):
+            result = svc.call_trade_risk_score({"symbol": "2330"})
+
+        assert result["fallback_reason"] == "down"
+        assert svc._veto_cache == {}
+
+    def test_call_trade_risk_score_prompt_fills_template(self):
+        """Prompt should include proposal fields, N/A defaults and the JSON instruction"""
+        svc = OllamaService("http://localhost:11434", "m")
+
+        with patch.object(svc, "generate_json", return_value={"error": "boom"}) as gen:
+            svc.call_trade_risk_score({"symbol": "2330", "signal_confidence": None,
+                                       "news_headlines": ["h1", "h2"]})
+
+        prompt = gen.call_args.kwargs["prompt"]
+        assert "- Symbol: 2330" in prompt
+        assert "- Signal Confidence: N/A" in prompt
+        assert "- Direction: N/A" in prompt
+        assert "News Headlines:\n- h1\n- h2\n" in prompt
+        assert prompt.endswith("Provide risk assessment as JSON with scores 0-100 for each factor.")
+
 
 def test_call_llama_error_explanation_not_configured_path():
     svc = OllamaService("", "")
@@ -297,3 +636,28 @@ def test_call_llama_error_explanation_generate_error_and_json_parse_fail():
     with patch.object(svc, "generate", return_value={"response": "not json"}):
         out2 = svc.call_llama_error_explanation("E", "msg")
         assert out2["explanation"] == "msg"
+
+
+
+def test_call_llama_error_explanation_requests_json_format():
+    svc = OllamaService("http://localhost:11434", "m")
+    explanation = {"explanation": "x", "suggestion": "y", "severity": "low"}
+    response = Mock(content=json.dumps({"response": json.dumps(explanation)}).encode())
+
+    with patch.object(svc.session, "post", return_value=response) as post:
+        out = svc.call_llama_error_explanation("E", "msg")
+
+    assert post.call_args.kwargs["json"]["format"] == "json"
+    assert out == explanation
+
+    with patch.object(svc, "generate", return_value={"response": "[1, 2]"}):
+        assert svc.call_llama_error_explanation("E", "msg")["explanation"] == "msg"
+
+@pytest.mark.parametrize("use_automaton", [True, False])
+def test_calculate_news_risk_counts_each_matching_headline_once(use_automaton, monkeypatch):
+    if not use_automaton:
+        monkeypatch.setattr(ollama_service, "_NEGATIVE_NEWS_AC", None)
+    svc = OllamaService("u", "m")
+    headlines = ["Market CRASH and Recession fears", "台股下跌", "Earnings beat", None, ""]
+
+    assert svc._calculate_news_risk(headlines) == 50.0
@@ -1,14 +1,27 @@
+import asyncio
 import os
+import time
+from datetime import datetime
 from unittest.mock import MagicMock
 
 import pytest
+import requests
 
+import app.services.quarterly_report_service as quarterly_service
 from app.services.quarterly_report_service import (
     QuarterlyReportDownloadError,
+    QuarterlyReportRequest,
     download_quarterly_financial_report,
 )
 
 
+@pytest.fixture(autouse=True)
+def _clear_step1_cache():
+    quarterly_service._STEP1_CACHE.clear()
+    yield
+    quarterly_service._STEP1_CACHE.clear()
+
+
 def _make_response(content: bytes, headers=None, chunks=None):
     response = MagicMock()
     response.content = content
@@ -48,6 +61,9 @@ def test_download_quarterly_report_success(tmp_path):
     assert result.roc_year == 112
     assert os.path.exists(result.file_path)
     assert result.size_bytes == 6
+    assert datetime.fromisoformat(result.timestamp)
+    with open(result.file_path, "rb") as handle:
+        assert handle.read() == b"abcdef"
 
     first_call = session.post.call_args_list[0]
     assert first_call.kwargs["data"]["season"] == "1"
@@ -59,6 +75,14 @@ def test_download_quarterly_report_invalid_ticker():
         download_quarterly_financial_report(ticker="AAPL", report_year=2023, report_quarter=1)
 
 
+@pytest.mark.parametrize(
+    "ticker,expected",
+    [("2330", "2330"), (" 2330 ", "2330"), ("2330.tw", "2330"), ("00-50", "0050")],
+)
+def test_normalize_co_id(ticker, expected):
+    assert quarterly_service._normalize_co_id(ticker) == expected
+
+
 def test_download_quarterly_report_missing_result(tmp_path):
     session = MagicMock()
     session.post.side_effect = [
@@ -73,3 +97,322 @@ def test_download_quarterly_report_missing_result(tmp_path):
             destination_dir=str(tmp_path),
             session=session,
         )
+
+
+def test_download_quarterly_report_reuses_shared_session(tmp_path, monkeypatch):
+    session = MagicMock()
+    session.post.side_effect = [
+        _make_response(_sample_html()),
+        _make_response(b"", chunks=[b"abc"]),
+    ]
+    monkeypatch.setattr(quarterly_service, "_SESSION", session)
+
+    download_quarterly_financial_report(
+        ticker="2330",
+        report_year=2023,
+        report_quarter=1,
+        destination_dir=str(tmp_path),
+    )
+
+    assert session.post.call_count == 2
+    assert quarterly_service._shared_session() is session
+
+
+def test_download_quarterly_report_streams_in_large_chunks(tmp_path):
+    report = _make_response(b"", chunks=[b"x" * 10, b"", b"y"])
+    session = MagicMock()
+    session.post.side_effect = [_make_response(_sample_html()), report]
+
+    result = download_quarterly_financial_report(
+        ticker="2330",
+        report_year=2023,
+        report_quarter=1,
+        destination_dir=str(tmp_path),
+        session=session,
+    )
+
+    report.iter_content.assert_called_once_with(chunk_size=1 << 20)
+    assert result.size_bytes == 11
+    assert not os.path.exists(f"{result.file_path}.part")
+
+
+def test_forced_redownload_reuses_cached_step1_lookup(tmp_path):
+    session = MagicMock()
+    session.post.side_effect = [
+        _make_response(_sample_html()),
+        _make_response(b"", chunks=[b"abc"]),
+        _make_response(b"", chunks=[b"abcd"]),
+    ]
+    kwargs = dict(ticker="2330", report_year=2023, report_quarter=1, destination_dir=str(tmp_path), session=session)
+
+    download_quarterly_financial_report(**kwargs)
+    result = download_quarterly_financial_report(force=True, **kwargs)
+
+    assert session.post.call_count == 3
+    assert session.post.call_args_list[2].kwargs["data"]["step"] == "9"
+    assert result.size_bytes == 4
+
+
+def test_stale_step1_lookup_is_refreshed_when_download_fails(tmp_path):
+    failing = _make_response(b"")
+    failing.raise_for_status.side_effect = requests.HTTPError("404")
+    session = MagicMock()
+    session.post.side_effect = [
+        failing,
+        _make_response(_sample_html()),
+        _make_response(b"", chunks=[b"fresh"]),
+    ]
+    quarterly_service._STEP1_CACHE[("2330", 112, 1, "F01")] = ("F", "2330", "old.pdf", time.time())
+
+    result = download_quarterly_financial_report(
+        ticker="2330", report_year=2023, report_quarter=1, force=True,
+        destination_dir=str(tmp_path), session=session,
+    )
+
+    steps = [c.kwargs["data"]["step"] for c in session.post.call_args_list]
+    assert steps == ["9", "1", "9"]
+    assert session.post.call_args_list[2].kwargs["data"]["filename"] == "2023Q1_2330.pdf"
+    assert result.size_bytes == 5
+
+
+def test_cached_lookup_answered_with_html_page_is_requeried(tmp_path):
+    error_page = _make_response(b"", headers={"Content-Type": "text/html; charset=utf-8"})
+    session = MagicMock()
+    session.post.side_effect = [
+        error_page,
+        _make_response(_sample_html()),
+        _make_response(b"", chunks=[b"fresh"]),
+    ]
+    quarterly_service._STEP1_CACHE[("2330", 112, 1, "F01")] = ("F", "2330", "old.pdf", time.time())
+
+    result = download_quarterly_financial_report(
+        ticker="2330", report_year=2023, report_quarter=1, force=True,
+        destination_dir=str(tmp_path), session=session,
+    )
+
+    assert [c.kwargs["data"]["step"] for c in session.post.call_args_list] == ["9", "1", "9"]
+    assert quarterly_service._STEP1_CACHE[("2330", 112, 1, "F01")][2] == "2023Q1_2330.pdf"
+    error_page.close.assert_called_once()
+    error_page.iter_content.assert_not_called()
+    assert result.size_bytes == 5
+
+
+def test_html_page_for_fresh_lookup_is_an_error(tmp_path):
+    session = MagicMock()
+    session.post.side_effect = [
+        _make_response(_sample_html()),
+        _make_response(b"", headers={"Content-Type": "text/html"}),
+    ]
+
+    with pytest.raises(QuarterlyReportDownloadError) as exc:
+        download_quarterly_financial_report(
+            ticker="2330", report_year=2023, report_quarter=1,
+            destination_dir=str(tmp_path), session=session,
+        )
+
+    assert exc.value.status_code == 502
+    assert not os.path.exists(tmp_path / "2330") or not os.listdir(tmp_path / "2330")
+
+
+def test_expired_step1_lookup_is_ignored_and_errors_propagate(tmp_path):
+    failing = _make_response(b"")
+    failing.raise_for_status.side_effect = requests.HTTPError("500")
+    session = MagicMock()
+    session.post.side_effect = [_make_response(_sample_html()), failing]
+    quarterly_service._STEP1_CACHE[("2330", 112, 1, "F01")] = ("F", "2330", "old.pdf", 0.0)
+
+    with pytest.raises(QuarterlyReportDownloadError) as exc:
+        download_quarterly_financial_report(
+            ticker="2330", report_year=2023, report_quarter=1, force=True,
+            destination_dir=str(tmp_path), session=session,
+        )
+
+    assert exc.value.status_code == 502
+    assert session.post.call_args_list[0].kwargs["data"]["step"] == "1"
+
+
+class _FakeAsyncContent:
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def iter_chunked(self, size):
+        for chunk in self._chunks:
+            await asyncio.sleep(0)  # hand control back like a real socket read
+            yield chunk
+
+
+class _FakeAsyncResponse:
+    def __init__(self, session, body=b"", chunks=(), status_error=None, content_type="application/pdf"):
+        self._session = session
+        self._body = body
+        self._status_error = status_error
+        self.content = _FakeAsyncContent(list(chunks))
+        self.headers = {"Content-Type": content_type}
+
+    async def __aenter__(self):
+        self._session.in_flight += 1
+        self._session.max_in_flight = max(self._session.max_in_flight, self._session.in_flight)
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._session.in_flight -= 1
+        return False
+
+    def raise_for_status(self):
+        if self._status_error:
+            raise self._status_error
+
+    async def read(self):
+        return self._body
+
+
+class _FakeAsyncSession:
+    def __init__(self, step9_errors=(), step9_html_pages=0):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._step9_errors = list(step9_errors)
+        self._step9_html_pages = step9_html_pages
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        self.calls.append(dict(data))
+        if data["step"] == "1":
+            html = f"<a href='javascript:readfile2(\"F\",\"{data['co_id']}\",\"{data['co_id']}.pdf\");'>"
+            return _FakeAsyncResponse(self, body=html.encode("utf-8"))
+        if self._step9_errors:
+            return _FakeAsyncResponse(self, status_error=self._step9_errors.pop(0))
+        if self._step9_html_pages:
+            self._step9_html_pages -= 1
+            return _FakeAsyncResponse(self, chunks=[b"<html>error</html>"], content_type="text/html")
+        return _FakeAsyncResponse(self, chunks=[data["co_id"].encode(), b"", b"-pdf"])
+
+
+def test_download_quarterly_batch_downloads_concurrently_and_keeps_order(tmp_path):
+    session = _FakeAsyncSession()
+    batch = [
+        QuarterlyReportRequest(ticker="2330", report_year=2023, report_quarter=1),
+        QuarterlyReportRequest(ticker="AAPL", report_year=2023, report_quarter=1),
+        QuarterlyReportRequest(ticker="2454.TW", report_year=2023, report_quarter=2),
+    ]
+
+    results = asyncio.run(quarterly_service.adownload_quarterly_batch(
+        batch, concurrency=1, destination_dir=str(tmp_path), session=session,
+    ))
+
+    assert results[0].ticker == "2330"
+    assert isinstance(results[1], QuarterlyReportDownloadError)
+    assert results[2].ticker == "2454"
+    assert results[2].size_bytes == len(b"2454-pdf")
+    with open(results[0].file_path, "rb") as handle:
+        assert handle.read() == b"2330-pdf"
+    assert session.max_in_flight == 1
+
+
+def test_download_quarterly_batch_uses_disk_and_step1_caches(tmp_path):
+    import aiohttp
+
+    session = _FakeAsyncSession(step9_errors=[aiohttp.ClientError("gone")])
+    request = QuarterlyReportRequest(ticker="2330", report_year=2023, report_quarter=1)
+    quarterly_service._STEP1_CACHE[("2330", 112, 1, "F01")] = ("F", "2330", "stale.pdf", time.time())
+
+    first = asyncio.run(quarterly_service.adownload_quarterly_batch(
+        [request], destination_dir=str(tmp_path), session=session,
+    ))
+    second = asyncio.run(quarterly_service.adownload_quarterly_batch(
+        [request], destination_dir=str(tmp_path), session=session,
+    ))
+
+    assert [c["step"] for c in session.calls] == ["9", "1", "9"]
+    assert second[0].file_path == first[0].file_path
+
+
+def test_download_quarterly_batch_requeries_when_cached_lookup_gets_html(tmp_path):
+    session = _FakeAsyncSession(step9_html_pages=1)
+    request = QuarterlyReportRequest(ticker="2330", report_year=2023, report_quarter=1)
+    quarterly_service._STEP1_CACHE[("2330", 112, 1, "F01")] = ("F", "2330", "stale.pdf", time.time())
+
+    results = asyncio.run(quarterly_service.adownload_quarterly_batch(
+        [request], destination_dir=str(tmp_path), session=session,
+    ))
+
+    assert [c["step"] for c in session.calls] == ["9", "1", "9"]
+    with open(results[0].file_path, "rb") as handle:
+        assert handle.read() == b"2330-pdf"
+
+
+def test_download_quarterly_batch_serializes_rows_sharing_a_file(tmp_path):
+    session = _FakeAsyncSession()
+    request = QuarterlyReportRequest(ticker="2330", report_year=2023, report_quarter=1)
+    other_type = QuarterlyReportRequest(ticker="2330", report_year=2023, report_quarter=1, report_type="F02")
+
+    results = asyncio.run(quarterly_service.adownload_quarterly_batch(
+        [request, request, other_type], destination_dir=str(tmp_path), session=session,
+    ))
+
+    assert all(isinstance(r, quarterly_service.QuarterlyReportResponse) for r in results)
+    assert results[0] is results[1]
+    assert results[2].file_path == results[0].file_path
+    # The repeated row is fetched once; F01 and F02 each do a lookup and a download
+    assert sorted(c["step"] for c in session.calls) == ["1", "1", "9", "9"]
+    with open(results[0].file_path, "rb") as handle:
+        assert handle.read() == b"2330-pdf"
+    assert not os.path.exists(f"{results[0].file_path}.part")
+
+
+def test_download_quarterly_batch_validates_plain_rows(tmp_path):
+    session = _FakeAsyncSession()
+    rows = [{"ticker": " 2330 ", "report_year": 2023, "report_quarter": 1, "report_type": "f01"}]
+
+    results = asyncio.run(quarterly_service.adownload_quarterly_batch(
+        rows, destination_dir=str(tmp_path), session=session,
+    ))
+
+    assert results[0].ticker == "2330"
+    assert results[0].report_type == "F01"
+
+
+def test_download_quarterly_batch_rejects_invalid_rows_before_downloading(tmp_path):
+    from pydantic import ValidationError
+
+    session = _FakeAsyncSession()
+
+    with pytest.raises(ValidationError):
+        asyncio.run(quarterly_service.adownload_quarterly_batch(
+            [{"ticker": "2330", "report_quarter": 5}], destination_dir=str(tmp_path), session=session,
+        ))
+    assert session.calls == []
+
+
+def test_quarterly_report_request_is_frozen_and_hashable():
+    from pydantic import ValidationError
+
+    request = QuarterlyReportRequest(ticker="2330", report_year=2023, report_quarter=1)
+
+    assert {request: 1}[QuarterlyReportRequest(ticker="2330", report_year=2023, report_quarter=1)] == 1
+    with pytest.raises(ValidationError):
+        request.force = True
+
+
+def test_download_quarterly_batch_sync_wrapper_reports_query_errors(tmp_path, monkeypatch):
+    import aiohttp
+
+    class FailingSession(_FakeAsyncSession):
+        def post(self, url, headers=None, data=None, timeout=None):
+            return _FakeAsyncResponse(self, status_error=aiohttp.ClientError("down"))
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(quarterly_service.aiohttp, "ClientSession", FailingSession)
+
+    results = quarterly_service.download_quarterly_batch(
+        [QuarterlyReportRequest(ticker="2330", report_year=2023, report_quarter=1, force=True)],
+        destination_dir=str(tmp_path),
+    )
+
+    assert isinstance(results[0], QuarterlyReportDownloadError)
+    assert results[0].status_code == 502
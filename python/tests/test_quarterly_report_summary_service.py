@@ -1,8 +1,48 @@
+import asyncio
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from types import SimpleNamespace
 
+import pytest
+
 import app.services.quarterly_report_summary_service as summary_service
 
 
+@pytest.fixture(autouse=True)
+def clear_chunk_cache():
+    summary_service.clear_chunk_cache()
+    yield
+    summary_service.clear_chunk_cache()
+
+
+class DummyLLM:
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        self.batches = []
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def ainvoke(self, prompt):
+        self.calls.append(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return "Summary output"
+
+    async def abatch(self, prompts, config=None):
+        # Mirrors Runnable.abatch: concurrent ainvoke calls capped by max_concurrency
+        self.batches.append(len(prompts))
+        semaphore = asyncio.Semaphore((config or {}).get("max_concurrency") or len(prompts))
+
+        async def run(prompt):
+            async with semaphore:
+                return await self.ainvoke(prompt)
+
+        return await asyncio.gather(*(run(p) for p in prompts))
+
+
 def test_summarize_quarterly_report_success(tmp_path, monkeypatch):
     report_path = tmp_path / "report.txt"
     report_path.write_text("Quarterly report content", encoding="utf-8")
@@ -18,27 +58,12 @@ def test_summarize_quarterly_report_success(tmp_path, monkeypatch):
     def fake_download(**_):
         return mock_report
 
-    class DummyLLM:
-        def __init__(self):
-            self.calls = []
-
-    class DummyChain:
-        def __init__(self):
-            self.runs = []
-
-        def run(self, docs):
-            self.runs.append(docs)
-            return "Summary output"
-
-    def fake_load_chain(llm, chain_type="map_reduce"):
-        assert chain_type == "map_reduce"
-        return DummyChain()
+    llm = DummyLLM()
 
     monkeypatch.setattr(summary_service, "download_quarterly_financial_report", fake_download)
     monkeypatch.setattr(summary_service, "_load_documents", lambda _: [SimpleNamespace(page_content="doc", metadata={})])
     monkeypatch.setattr(summary_service, "_chunk_documents", lambda docs: docs)
-    monkeypatch.setattr(summary_service, "_llm_from_env", lambda model: DummyLLM())
-    monkeypatch.setattr(summary_service, "load_summarize_chain", fake_load_chain)
+    monkeypatch.setattr(summary_service, "_llm_from_env", lambda model: llm)
 
     result = summary_service.summarize_quarterly_report(
         ticker="2330",
@@ -48,6 +73,177 @@ def test_summarize_quarterly_report_success(tmp_path, monkeypatch):
         force=False,
     )
 
+    assert isinstance(result, summary_service.QuarterlyReportSummaryResponse)
     assert result.status == "ok"
     assert result.summary == "Summary output"
     assert result.chunk_count == 1
+    assert dataclasses.asdict(result)["ticker"] == "2330"
+    assert len(llm.calls) == 2  # one map + one reduce
+    assert '"doc"' in llm.calls[0]
+
+
+def test_map_phase_runs_chunks_concurrently_with_bound():
+    llm = DummyLLM(delay=0.01)
+    chunks = [SimpleNamespace(page_content=f"chunk {i}") for i in range(5)]
+
+    summary = asyncio.run(summary_service._amap_reduce(llm, chunks, concurrency=3, dedup=False))
+
+    assert summary == "Summary output"
+    assert len(llm.calls) == 6
+    assert llm.max_in_flight == 3
+    assert "Summary output\n\nSummary output" in llm.calls[-1]
+
+
+def test_map_outputs_over_budget_are_collapsed_before_reduce():
+    llm = DummyLLM()
+    chunks = [SimpleNamespace(page_content=f"chunk {i}") for i in range(4)]
+
+    # 4 map outputs of 14 chars exceed a 30-char budget -> collapsed into 2 groups, then reduce
+    asyncio.run(summary_service._amap_reduce(llm, chunks, max_chars=30, dedup=False))
+
+    assert len(llm.calls) == 4 + 2 + 1
+    assert llm.batches == [4, 2]
+
+
+def test_group_by_size_keeps_oversized_texts_alone():
+    assert summary_service._group_by_size(["aaaa", "bb", "cc", "dddddd"], 4) == [["aaaa"], ["bb", "cc"], ["dddddd"]]
+
+
+def test_dedupe_sentences_drops_near_duplicates_across_summaries():
+    summaries = [
+        "Revenue rose 12% year over year on strong AI demand. Margins held at 53%.",
+        "Revenue rose 12% year over year on strong AI demand! Capex guidance was raised.",
+        "Margins held at 53%.",
+    ]
+
+    assert summary_service._dedupe_sentences(summaries) == [
+        "Revenue rose 12% year over year on strong AI demand. Margins held at 53%.",
+        "Capex guidance was raised.",
+    ]
+
+
+def test_duplicate_map_outputs_are_reduced_once():
+    llm = DummyLLM()
+    chunks = [SimpleNamespace(page_content=f"chunk {i}") for i in range(3)]
+
+    asyncio.run(summary_service._amap_reduce(llm, chunks))
+
+    assert "Summary output\n\nSummary output" not in llm.calls[-1]
+    assert '"Summary output"' in llm.calls[-1]
+
+
+def test_load_chunks_is_cached_by_content_hash(tmp_path, monkeypatch):
+    first = tmp_path / "a.txt"
+    second = tmp_path / "b.txt"
+    first.write_text("same bytes", encoding="utf-8")
+    second.write_text("same bytes", encoding="utf-8")
+    loads = []
+
+    def fake_load(path):
+        loads.append(path)
+        return [SimpleNamespace(page_content="doc", metadata={})]
+
+    monkeypatch.setattr(summary_service, "_load_documents", fake_load)
+    monkeypatch.setattr(summary_service, "_chunk_documents", lambda docs: docs)
+
+    chunks = asyncio.run(summary_service._aload_chunks(str(first)))
+    again = asyncio.run(summary_service._aload_chunks(str(second)))
+
+    assert again is chunks
+    assert loads == [str(first)]
+
+
+def test_unchanged_file_is_not_rehashed(tmp_path, monkeypatch):
+    report_path = tmp_path / "report.txt"
+    report_path.write_text("content", encoding="utf-8")
+    digests = []
+    real_digest = summary_service._file_digest
+
+    def counting_digest(path):
+        digests.append(path)
+        return real_digest(path)
+
+    monkeypatch.setattr(summary_service, "_file_digest", counting_digest)
+    monkeypatch.setattr(summary_service, "_load_documents", lambda _: [SimpleNamespace(page_content="doc", metadata={})])
+    monkeypatch.setattr(summary_service, "_chunk_documents", lambda docs: docs)
+
+    asyncio.run(summary_service._aload_chunks(str(report_path)))
+    asyncio.run(summary_service._aload_chunks(str(report_path)))
+    assert len(digests) == 1
+
+    report_path.write_text("rewritten content", encoding="utf-8")
+    asyncio.run(summary_service._aload_chunks(str(report_path)))
+    assert len(digests) == 2
+
+
+def test_force_clears_chunk_cache(tmp_path, monkeypatch):
+    report_path = tmp_path / "report.txt"
+    report_path.write_text("Quarterly report content", encoding="utf-8")
+    mock_report = SimpleNamespace(
+        ticker="2330", report_year=2023, report_quarter=1, roc_year=112, file_path=str(report_path)
+    )
+    loads = []
+
+    def fake_load(path):
+        loads.append(path)
+        return [SimpleNamespace(page_content="doc", metadata={})]
+
+    monkeypatch.setattr(summary_service, "download_quarterly_financial_report", lambda **_: mock_report)
+    monkeypatch.setattr(summary_service, "_load_documents", fake_load)
+    monkeypatch.setattr(summary_service, "_chunk_documents", lambda docs: docs)
+    monkeypatch.setattr(summary_service, "_llm_from_env", lambda model: DummyLLM())
+
+    for force in (False, False, True):
+        summary_service.summarize_quarterly_report(
+            ticker="2330", report_year=2023, report_quarter=1, force=force
+        )
+
+    assert len(loads) == 2
+
+
+def test_pdf_parsing_runs_in_executor(tmp_path, monkeypatch):
+    report_path = tmp_path / "report.pdf"
+    report_path.write_bytes(b"%PDF-1.4 fake")
+    pool = ThreadPoolExecutor(max_workers=1)
+    calls = []
+
+    def fake_load_and_chunk(path):
+        calls.append(path)
+        return ["chunk"]
+
+    monkeypatch.setattr(summary_service, "_pdf_pool", lambda: pool)
+    monkeypatch.setattr(summary_service, "_load_and_chunk", fake_load_and_chunk)
+
+    try:
+        assert asyncio.run(summary_service._aload_chunks(str(report_path))) == ["chunk"]
+    finally:
+        pool.shutdown()
+    assert calls == [str(report_path)]
+
+
+def test_load_and_chunk_runs_in_worker_process(tmp_path):
+    report_path = tmp_path / "report.txt"
+    report_path.write_text("Quarterly report content", encoding="utf-8")
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        chunks = pool.submit(summary_service._load_and_chunk, str(report_path)).result(timeout=60)
+
+    assert [chunk.page_content for chunk in chunks] == ["Quarterly report content"]
+
+
+def test_pdf_pool_avoids_fork_and_is_bounded(tmp_path):
+    report_path = tmp_path / "report.txt"
+    report_path.write_text("Quarterly report content", encoding="utf-8")
+
+    pool = summary_service._pdf_pool()
+    try:
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+        assert pool._max_workers == summary_service.PDF_POOL_MAX_WORKERS <= 4
+        chunks = pool.submit(summary_service._load_and_chunk, str(report_path)).result(timeout=60)
+        assert [chunk.page_content for chunk in chunks] == ["Quarterly report content"]
+    finally:
+        summary_service.shutdown_pdf_pool()
+
+    assert summary_service._PDF_POOL is None
+    summary_service.shutdown_pdf_pool()  # idempotent
+
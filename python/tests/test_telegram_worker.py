@@ -0,0 +1,109 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+import app.services.telegram_worker as telegram_worker
+
+
+def _request(message, password):
+    return "https://api.telegram.org/bottoken/sendMessage", {"chat_id": "chat", "text": message}
+
+
+def test_enqueue_returns_immediately_and_worker_delivers_in_order():
+    worker = telegram_worker.TelegramWorker()
+    post = AsyncMock(return_value=Mock(status_code=200))
+
+    with patch.object(telegram_worker, "_build_request", side_effect=_request), \
+         patch.object(telegram_worker.httpx.AsyncClient, "post", post):
+        assert worker.enqueue("first", "pw") is True
+        assert worker.enqueue("second", "pw") is True
+        assert worker.enqueue("third", "other-pw") is True
+        assert worker.flush(timeout=5) is True
+
+    texts = [call.kwargs["json"]["text"] for call in post.call_args_list]
+    assert "\n\n".join(texts) == "first\n\nsecond\n\nthird"
+    # Messages for different passwords are never merged into one send
+    assert texts[-1] == "third"
+
+
+def test_worker_skips_messages_rejected_by_checks_and_survives_errors():
+    worker = telegram_worker.TelegramWorker()
+    post = AsyncMock(side_effect=[RuntimeError("network down"), Mock(status_code=500)])
+
+    with patch.object(telegram_worker, "_build_request", side_effect=[None, _request("a", "pw"), _request("b", "pw")]), \
+         patch.object(telegram_worker.httpx.AsyncClient, "post", post):
+        for message in ("skipped", "a", "b"):
+            worker.enqueue(message, "pw")
+            assert worker.flush(timeout=5) is True
+
+    assert post.call_count == 2
+
+
+def test_flush_without_messages_is_a_no_op():
+    assert telegram_worker.TelegramWorker().flush() is True
+
+
+def test_send_telegram_message_nowait_uses_shared_worker():
+    with patch.object(telegram_worker._worker, "enqueue", return_value=True) as enqueue:
+        assert telegram_worker.send_telegram_message_nowait("hello", "pw") is True
+    enqueue.assert_called_once_with("hello", "pw")
+
+
+def test_concurrent_first_enqueues_wait_for_the_loop():
+    import threading
+
+    worker = telegram_worker.TelegramWorker()
+    post = AsyncMock(return_value=Mock(status_code=200))
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def enqueue(i):
+        barrier.wait()
+        try:
+            worker.enqueue(f"m{i}", "pw")
+        except Exception as e:
+            errors.append(e)
+
+    with patch.object(telegram_worker, "_build_request", side_effect=_request), \
+         patch.object(telegram_worker.httpx.AsyncClient, "post", post):
+        threads = [threading.Thread(target=enqueue, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert worker.flush(timeout=5) is True
+
+    assert errors == []
+    sent = "\n\n".join(call.kwargs["json"]["text"] for call in post.call_args_list)
+    assert sorted(sent.split("\n\n")) == sorted(f"m{i}" for i in range(8))
+
+
+def test_worker_survives_batch_errors():
+    worker = telegram_worker.TelegramWorker()
+    send = AsyncMock(side_effect=[RuntimeError("boom"), True])
+
+    with patch.object(worker, "_send", send):
+        worker.enqueue("a", "pw")
+        assert worker.flush(timeout=5) is True
+        worker.enqueue("b", "pw")
+        assert worker.flush(timeout=5) is True
+
+    assert send.call_count == 2
+    assert worker._thread.is_alive()
+
+
+def test_dead_worker_thread_is_restarted_on_enqueue():
+    worker = telegram_worker.TelegramWorker()
+    post = AsyncMock(return_value=Mock(status_code=200))
+
+    with patch.object(telegram_worker, "_build_request", side_effect=_request), \
+         patch.object(telegram_worker.httpx.AsyncClient, "post", post):
+        worker._ensure_started()
+        dead = worker._thread
+        worker._loop.call_soon_threadsafe(worker._loop.stop)
+        dead.join(timeout=5)
+        assert worker.flush() is False
+
+        worker.enqueue("after restart", "pw")
+        assert worker.flush(timeout=5) is True
+
+    assert worker._thread is not dead
+    assert post.call_args.kwargs["json"]["text"] == "after restart"